@@ -14,6 +14,9 @@ python manage.py collectstatic --no-input
 # 4. Apply Migrations
 python manage.py migrate
 
+# 4b. Create the shared AI cache table (no-op if it exists)
+python manage.py createcachetable
+
 # 5. Auto-Create Superuser (The Fix)
 # This reads the Env Vars you just set.
 # The "|| true" ensures the build doesn't fail if the user already exists.
@@ -0,0 +1,420 @@
+import copy
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from apps.core.metrics import REGISTRY, add_totals, delete_totals, read_totals
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def normalize_text(value):
+    """Case-folds and collapses whitespace so trivially different inputs share a key."""
+    return " ".join(str(value or "").split()).casefold()
+
+
+def make_key(namespace, **params):
+    """
+    Builds a content-addressed cache key: a SHA-256 over the normalized,
+    sorted parameters. Keeps keys short and safe for every cache backend.
+    """
+    normalized = {
+        name: normalize_text(value) if isinstance(value, str) else value
+        for name, value in params.items()
+    }
+    payload = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with a per-entry TTL.
+    Used as the first tier in front of the shared Django cache.
+    """
+
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CacheStats:
+    """
+    Named counters (hits, misses, ...) for a cache namespace. Counts are
+    batched per process; when shared, the metrics flusher thread adds them
+    to MetricTotal so totals aggregate across gunicorn workers without a
+    write on the lookup path.
+    """
+
+    def __init__(self, namespace, shared=True):
+        self.namespace = namespace
+        self.shared = shared
+        self.local = Counter()
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        if shared:
+            REGISTRY.on_flush(self.flush)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.local[name] += amount
+            if self.shared:
+                self._pending[name] += amount
+        if self.shared:
+            REGISTRY.start_flusher()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        add_totals({(self.namespace, (name,), "value"): amount for name, amount in pending.items()})
+
+    def snapshot(self, names=("hits", "misses")):
+        """Returns shared totals (plus this process's unflushed counts) when shared, else this process's counts."""
+        counts = {name: self.local[name] for name in names}
+        if self.shared:
+            try:
+                shared = read_totals([self.namespace])
+                with self._lock:
+                    counts = {n: shared.get((self.namespace, (n,), "value"), 0) + self._pending[n] for n in names}
+            except Exception as e:
+                logger.warning(f"Cache stats unavailable for {self.namespace}: {e}")
+
+        lookups = counts.get("hits", 0) + counts.get("misses", 0)
+        counts["hit_rate"] = round(counts.get("hits", 0) / lookups, 3) if lookups else 0.0
+        return counts
+
+    def reset(self, names=("hits", "misses")):
+        with self._lock:
+            for name in names:
+                self.local.pop(name, None)
+                self._pending.pop(name, None)
+        if self.shared:
+            try:
+                delete_totals([self.namespace], labels=[(name,) for name in names])
+            except Exception as e:
+                logger.warning(f"Cache stats unavailable for {self.namespace}: {e}")
+
+
+class TieredCache:
+    """
+    Two-tier cache: a per-process LRU/TTL in front of a shared Django cache
+    alias (database or file backed). Shared-tier failures degrade to the
+    local tier instead of breaking the request.
+    """
+
+    def __init__(self, namespace, alias=None, ttl=3600, local_max_entries=256, local_ttl=300):
+        self.namespace = namespace
+        self.alias = alias
+        self.ttl = ttl
+        self.local = LRUCache(max_entries=local_max_entries, ttl=local_ttl)
+        self.stats = CacheStats(namespace, shared=bool(alias))
+
+    def get(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        if self.alias:
+            try:
+                value = caches[self.alias].get(key, _MISSING)
+            except Exception as e:
+                logger.warning(f"Shared cache read failed ({self.namespace}): {e}")
+                value = _MISSING
+
+            if value is not _MISSING:
+                self.local.set(key, value)
+                return value
+
+        return default
+
+    def get_many(self, keys):
+        """{key: value} for the keys found: the local tier first, the rest in one shared-tier read."""
+        found = {}
+        for key in keys:
+            value = self.local.get(key, _MISSING)
+            if value is not _MISSING:
+                found[key] = value
+
+        missing = [key for key in keys if key not in found]
+        if missing and self.alias:
+            try:
+                shared = caches[self.alias].get_many(missing)
+            except Exception as e:
+                logger.warning(f"Shared cache read failed ({self.namespace}): {e}")
+                shared = {}
+            for key, value in shared.items():
+                self.local.set(key, value)
+                found[key] = value
+        return found
+
+    def add(self, key, value):
+        """
+        Stores the value only if the key is unset, deciding in the shared
+        tier (where add is an atomic insert), so concurrent workers can't
+        overwrite each other. Returns whether it was stored.
+        """
+        if self.alias:
+            try:
+                added = caches[self.alias].add(key, value, timeout=self.ttl)
+            except Exception as e:
+                logger.warning(f"Shared cache write failed ({self.namespace}): {e}")
+                return False
+        else:
+            added = self.local.get(key, _MISSING) is _MISSING
+        if added:
+            self.local.set(key, value)
+        return added
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.alias:
+            try:
+                caches[self.alias].set(key, value, timeout=self.ttl)
+            except Exception as e:
+                logger.warning(f"Shared cache write failed ({self.namespace}): {e}")
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.alias:
+            try:
+                caches[self.alias].delete(key)
+            except Exception as e:
+                logger.warning(f"Shared cache delete failed ({self.namespace}): {e}")
+
+
+# ==========================================
+# QUIZ GENERATION CACHE
+# ==========================================
+
+QUIZ_CACHE_DEFAULTS = {
+    "ENABLED": True,
+    "ALIAS": "ai",
+    "VARIANTS": 3,
+    "TTL": 60 * 60 * 6,
+    "LOCAL_MAX_ENTRIES": 256,
+    "LOCAL_TTL": 300,
+}
+
+
+def get_cache_config(name, defaults):
+    """Merges a dict-style setting (e.g. AI_QUIZ_CACHE) over its defaults."""
+    return {**defaults, **getattr(settings, name, {})}
+
+
+class QuizCache:
+    """
+    Caches generated quizzes keyed on a hash of the prompt parameters and
+    model name. Each key holds a pool of up to VARIANTS distinct generations:
+    while the pool is filling, lookups miss so fresh content is generated;
+    once full, a random variant is served with questions and options shuffled.
+    Every variant has its own slot in the shared tier, claimed with an atomic
+    add, so workers filling the same pool never overwrite each other.
+    """
+
+    namespace = "quizgen:v2"
+
+    def __init__(self, config=None):
+        self.config = config or get_cache_config("AI_QUIZ_CACHE", QUIZ_CACHE_DEFAULTS)
+        self.enabled = self.config["ENABLED"]
+        self.variants = max(1, int(self.config["VARIANTS"]))
+        self.store = TieredCache(
+            self.namespace,
+            alias=self.config["ALIAS"],
+            ttl=self.config["TTL"],
+            local_max_entries=self.config["LOCAL_MAX_ENTRIES"],
+            local_ttl=self.config["LOCAL_TTL"],
+        )
+
+    @property
+    def stats(self):
+        return self.store.stats
+
+    def key_for(self, model_name, language, topic, level, num_questions, include_code):
+        return make_key(
+            self.namespace,
+            model=model_name,
+            language=language,
+            topic=topic,
+            level=level,
+            num_questions=int(num_questions),
+            include_code=bool(include_code),
+        )
+
+    def get(self, key):
+        """Returns a shuffled copy of a cached variant, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        pool = self._pool(key)
+        if len(pool) < self.variants:
+            self.stats.incr("misses")
+            return None
+
+        self.stats.incr("hits")
+        return self._shuffled(random.choice(pool))
+
+    def get_stale(self, key):
+        """Any cached variant, even from a pool still filling (used when Gemini is unavailable)."""
+        if not self.enabled:
+            return None
+        pool = self._pool(key)
+        return self._shuffled(random.choice(pool)) if pool else None
+
+    def add(self, key, questions):
+        """Adds a fresh generation to the key's variant pool, in the first free slot."""
+        if not self.enabled or not questions:
+            return
+
+        slots = self._slots(key)
+        for slot in slots:
+            if self.store.add(slot, questions):
+                return
+        # Pool already full (e.g. filled by another worker meanwhile): replace a variant
+        self.store.set(random.choice(slots), questions)
+
+    def _slots(self, key):
+        return [f"{key}:{index}" for index in range(self.variants)]
+
+    def _pool(self, key):
+        found = self.store.get_many(self._slots(key))
+        return list(found.values())
+
+    @staticmethod
+    def _shuffled(questions):
+        questions = copy.deepcopy(questions)
+        random.shuffle(questions)
+        for q_data in questions:
+            if isinstance(q_data.get("options"), list):
+                random.shuffle(q_data["options"])
+        return questions
+
+
+_quiz_cache = None
+
+
+def get_quiz_cache():
+    """Process-wide QuizCache (the local tier only helps if it is shared)."""
+    global _quiz_cache
+    if _quiz_cache is None:
+        _quiz_cache = QuizCache()
+    return _quiz_cache
+
+
+# ==========================================
+# INTENT MEMO
+# ==========================================
+
+INTENT_MEMO_DEFAULTS = {
+    "ENABLED": True,
+    "ALIAS": "ai",
+    "TTL": 60 * 60 * 24,
+    "LOCAL_MAX_ENTRIES": 1024,
+    "LOCAL_TTL": 600,
+}
+
+# Everything but word characters, whitespace and the + / # of "C++" and "C#"
+PUNCTUATION_RE = re.compile(r"[^\w\s+#]")
+
+
+def normalize_message(message):
+    """Case-folds, strips punctuation and collapses whitespace: "Quiz me on React hooks!" == "quiz me on react hooks"."""
+    return normalize_text(PUNCTUATION_RE.sub(" ", str(message or "")))
+
+
+class IntentMemo:
+    """
+    Memoizes Gemini's intent parses keyed on the normalized chat message,
+    so near-identical requests skip the round-trip. Fallback defaults
+    (failed parses) are never stored.
+    """
+
+    namespace = "intentmemo:v1"
+
+    def __init__(self, config=None):
+        self.config = config or get_cache_config("AI_INTENT_MEMO", INTENT_MEMO_DEFAULTS)
+        self.enabled = self.config["ENABLED"]
+        self.store = TieredCache(
+            self.namespace,
+            alias=self.config["ALIAS"],
+            ttl=self.config["TTL"],
+            local_max_entries=self.config["LOCAL_MAX_ENTRIES"],
+            local_ttl=self.config["LOCAL_TTL"],
+        )
+
+    @property
+    def stats(self):
+        return self.store.stats
+
+    def key_for(self, model_name, message):
+        return make_key(self.namespace, model=model_name, message=normalize_message(message))
+
+    def get(self, key):
+        """A copy of the memoized intent, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        intent = self.store.get(key)
+        self.stats.incr("hits" if intent else "misses")
+        return dict(intent) if intent else None
+
+    def set(self, key, intent):
+        if self.enabled and isinstance(intent, dict):
+            self.store.set(key, dict(intent))
+
+
+_intent_memo = None
+
+
+def get_intent_memo():
+    """Process-wide IntentMemo (the local tier only helps if it is shared)."""
+    global _intent_memo
+    if _intent_memo is None:
+        _intent_memo = IntentMemo()
+    return _intent_memo
@@ -1,11 +1,99 @@
-import google.generativeai as genai
+import os
+import threading
+
 from django.conf import settings
 
+from .cache import get_cache_config
+
+# Backends that never touch the network (safe for load tests)
+OFFLINE_BACKENDS = ('stub', 'replay')
+
+# Process-wide registry. genai.configure() throws away the SDK's cached
+# service clients (and with them the open gRPC channel), so it runs once per
+# process and every model object is built once and shared by all threads.
+_lock = threading.Lock()
+_configured = False
+_models = {}
+
+
+def _reset_after_fork():
+    # gRPC channels can't cross fork(): a gunicorn worker forked from a
+    # preloaded master must configure and connect on its own
+    global _configured, _lock
+    _lock = threading.Lock()
+    _configured = False
+    _models.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _import_sdk():
+    # Imported on first use: the SDK drags in grpc, protobuf and IPython (~1 s
+    # and tens of MB per process), which migrate, collectstatic and non-AI
+    # pages never need. See `manage.py benchmark_startup`.
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
+    return genai, genai_client
+
+
 def get_gemini_client():
+    """The configured genai module (configured once per process)."""
+    global _configured
+    genai, genai_client = _import_sdk()
+    if _configured:
+        return genai
 
     api_key = settings.GEMINI_API_KEY
     if not api_key:
         raise ValueError("GEMINI_API_KEY is not set in environment variables.")
-    
-    genai.configure(api_key=api_key)
-    return genai
\ No newline at end of file
+
+    with _lock:
+        if not _configured:
+            genai.configure(api_key=api_key)
+            # Build the shared sync client now, so threads racing on their
+            # first call don't each open a channel
+            genai_client.get_default_generative_client()
+            _configured = True
+    return genai
+
+
+def get_generative_model(model_name):
+    """
+    Returns the shared model object for the configured AI_BACKEND: 'gemini',
+    'record' (Gemini, saving every response to disk), or the offline
+    'stub' and 'replay' (serving the recordings back).
+    """
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    backend = settings.AI_BACKEND
+    if backend in OFFLINE_BACKENDS:
+        from .replay import REPLAY_DEFAULTS, ReplayGenerativeModel, get_recording_store
+        from .stub import StubGenerativeModel
+        faults = settings.AI_FAULT_INJECTION
+        if backend == 'replay':
+            config = get_cache_config("AI_REPLAY", REPLAY_DEFAULTS)
+            factory = lambda: ReplayGenerativeModel(
+                model_name, get_recording_store(), config, faults=faults, stub_latency=settings.AI_STUB_LATENCY
+            )
+        else:
+            factory = lambda: StubGenerativeModel(model_name, latency=settings.AI_STUB_LATENCY, faults=faults)
+    else:
+        client = get_gemini_client()
+        factory = lambda: client.GenerativeModel(model_name)
+        if backend == 'record':
+            from .replay import RecordingGenerativeModel, get_recording_store
+            factory = lambda: RecordingGenerativeModel(client.GenerativeModel(model_name), get_recording_store())
+
+    with _lock:
+        if model_name not in _models:
+            _models[model_name] = factory()
+        return _models[model_name]
+
+
+def reset_clients():
+    """Forgets the configured client and models (e.g. after the API key changes)."""
+    _reset_after_fork()
@@ -0,0 +1,204 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot get a rate-limit slot before its timeout."""
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token) used before the real usage is known."""
+    return max(1, len(text or "") // 4)
+
+
+class RateLimiter:
+    """
+    Sliding one-minute window enforcing requests-per-minute and
+    tokens-per-minute for one model. Limits apply per process, so size
+    them as (quota / number of workers).
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = deque()
+        self._tokens = deque()
+        self._token_total = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens=0, timeout=None):
+        """Blocks until a request costing `tokens` fits in the window."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            while True:
+                delay = self._reserve(tokens)
+                if delay <= 0:
+                    return
+                self._cond.wait(self._bounded(delay, deadline, timeout))
+
+    async def aacquire(self, tokens=0, timeout=None):
+        """Async acquire(): sleeps on the event loop instead of blocking a thread."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._cond:
+                delay = self._reserve(tokens)
+            if delay <= 0:
+                return
+            await asyncio.sleep(self._bounded(delay, deadline, timeout))
+
+    def _reserve(self, tokens):
+        # Takes a slot and returns 0, or returns how long to wait for one
+        now = time.monotonic()
+        self._expire(now)
+        delay = self._delay(now, tokens)
+        if delay <= 0:
+            self._requests.append(now)
+            self._add_tokens(now, tokens)
+        return delay
+
+    @staticmethod
+    def _bounded(delay, deadline, timeout):
+        if deadline is None:
+            return delay
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RateLimitExceeded(f"No rate-limit slot within {timeout}s")
+        return min(delay, remaining)
+
+    def record_tokens(self, tokens):
+        """Accounts for tokens only known after the call (e.g. the response)."""
+        if not tokens:
+            return
+        with self._cond:
+            self._add_tokens(time.monotonic(), tokens)
+
+    def _add_tokens(self, now, tokens):
+        if tokens:
+            self._tokens.append((now, tokens))
+            self._token_total += tokens
+
+    def _expire(self, now):
+        cutoff = now - WINDOW_SECONDS
+        while self._requests and self._requests[0] <= cutoff:
+            self._requests.popleft()
+        while self._tokens and self._tokens[0][0] <= cutoff:
+            self._token_total -= self._tokens.popleft()[1]
+
+    def _delay(self, now, tokens):
+        delays = [0]
+
+        if self.rpm and len(self._requests) >= self.rpm:
+            delays.append(self._requests[0] + WINDOW_SECONDS - now)
+
+        if self.tpm and self._tokens and self._token_total + tokens > self.tpm:
+            # Wait until enough earlier usage leaves the window
+            needed = self._token_total + tokens - self.tpm
+            freed = 0
+            for stamp, used in self._tokens:
+                freed += used
+                if freed >= needed:
+                    delays.append(stamp + WINDOW_SECONDS - now)
+                    break
+            else:
+                delays.append(self._tokens[-1][0] + WINDOW_SECONDS - now)
+
+        return max(delays)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model_name):
+    """Process-wide limiter for a model, configured from AI_RATE_LIMITS."""
+    with _limiters_lock:
+        if model_name not in _limiters:
+            limits = settings.AI_RATE_LIMITS.get(model_name) or settings.AI_RATE_LIMITS.get('default', {})
+            _limiters[model_name] = RateLimiter(rpm=limits.get('RPM'), tpm=limits.get('TPM'))
+        return _limiters[model_name]
+
+
+class LLMExecutor:
+    """
+    Bounded thread pool for running independent Gemini calls concurrently.
+    Calls submitted from inside a pool thread run inline, so nested fan-out
+    can never deadlock the pool.
+    """
+
+    def __init__(self, max_workers=8, default_timeout=60):
+        self.default_timeout = default_timeout
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='llm',
+            initializer=self._mark_worker,
+        )
+
+    def _mark_worker(self):
+        self._local.is_worker = True
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedules fn(*args, **kwargs) and returns a Future."""
+        if getattr(self._local, 'is_worker', False):
+            future = Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        # Run in the caller's context, so per-request instrumentation sees fanned-out calls
+        return self._pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+    def gather(self, futures, timeout=None, default=None):
+        """
+        Waits for all futures and returns their results in order. Failed or
+        timed-out calls yield `default` instead of raising.
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        done, not_done = wait(futures, timeout=timeout)
+
+        results = []
+        for future in futures:
+            if future in not_done:
+                future.cancel()
+                logger.error(f"LLM call timed out after {timeout}s")
+                results.append(default)
+            elif future.exception() is not None:
+                logger.error(f"LLM call failed: {future.exception()}")
+                results.append(default)
+            else:
+                results.append(future.result())
+        return results
+
+    def map(self, fn, items, timeout=None, default=None):
+        """Runs fn over items concurrently; see gather() for failure handling."""
+        return self.gather([self.submit(fn, item) for item in items], timeout=timeout, default=default)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide executor, created lazily so it is never inherited across a fork."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = LLMExecutor(
+                max_workers=settings.AI_EXECUTOR['MAX_WORKERS'],
+                default_timeout=settings.AI_EXECUTOR['TIMEOUT'],
+            )
+        return _executor
@@ -0,0 +1,230 @@
+import re
+
+from apps.quizzes.models import Topic
+from .cache import CacheStats, LRUCache, get_cache_config, normalize_text
+
+LOCAL_INTENT_DEFAULTS = {
+    "ENABLED": True,
+    "MIN_CONFIDENCE": 0.75,
+    "SHARED_STATS": True,
+}
+
+LANGUAGE_ALIASES = {
+    "Python": ("python", "python3", "py"),
+    "JavaScript": ("javascript", "js", "ecmascript", "es6"),
+    "TypeScript": ("typescript", "ts"),
+    "Java": ("java",),
+    "C#": ("c#", "csharp", "c sharp"),
+    "C++": ("c++", "cpp"),
+    "C": ("c language", "ansi c"),
+    # A bare "go" is too common a word to count
+    "Go": ("golang", "go language", "go lang"),
+    "Rust": ("rust",),
+    "Ruby": ("ruby",),
+    "PHP": ("php",),
+    "Kotlin": ("kotlin",),
+    "Swift": ("swift",),
+    "SQL": ("sql", "mysql", "postgres", "postgresql", "sqlite"),
+    "HTML": ("html", "html5"),
+    "CSS": ("css", "css3"),
+    "Bash": ("bash", "shell scripting"),
+}
+
+# Frameworks name both a language and (part of) the topic
+FRAMEWORKS = {
+    "react": ("JavaScript", "React"),
+    "vue": ("JavaScript", "Vue"),
+    "angular": ("TypeScript", "Angular"),
+    "node": ("JavaScript", "Node.js"),
+    "nodejs": ("JavaScript", "Node.js"),
+    "express": ("JavaScript", "Express"),
+    "django": ("Python", "Django"),
+    "flask": ("Python", "Flask"),
+    "fastapi": ("Python", "FastAPI"),
+    "pandas": ("Python", "Pandas"),
+    "numpy": ("Python", "NumPy"),
+    "spring": ("Java", "Spring"),
+    "rails": ("Ruby", "Rails"),
+    "laravel": ("PHP", "Laravel"),
+    "flexbox": ("CSS", "Flexbox"),
+    "tailwind": ("CSS", "Tailwind"),
+}
+
+LEVEL_ALIASES = {
+    "Beginner": ("beginner", "beginners", "easy", "basic", "basics", "simple", "intro", "introductory", "novice"),
+    "Intermediate": ("intermediate", "medium", "moderate"),
+    "Expert": ("expert", "hard", "advanced", "difficult", "tough", "challenging"),
+}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+
+# Words that carry no topic information in a quiz request
+FILLER_WORDS = frozenset("""
+    a an the me my i i'd id we us you can could would please want like to do let's lets give make create
+    generate build start test quiz quizzes exam questions question qs q items problems some few quick
+    short round level difficulty mode on about in of for with and or regarding around covering code
+    coding programming language concepts stuff topic topics something anything hi hey
+""".split())
+
+# Requests like "python but not decorators" need real understanding
+NEGATIONS = frozenset(("not", "no", "without", "except", "but", "exclude", "excluding", "instead"))
+
+DEFAULT_LEVEL = "Intermediate"
+DEFAULT_TOPIC = "General Knowledge"
+DEFAULT_COUNT = 5
+MAX_COUNT = 10
+# More unexplained words than this reads as a nuanced request, not a topic
+MAX_TOPIC_WORDS = 4
+
+
+def _alternation(phrases):
+    # Longest first, bounded so "c++" and "c#" match but "java" doesn't match inside "javascript"
+    escaped = sorted((re.escape(p) for p in phrases), key=len, reverse=True)
+    return re.compile(r"(?<![\w+#])(" + "|".join(escaped) + r")(?![\w+#])")
+
+
+ALIAS_TO_LANGUAGE = {alias: language for language, aliases in LANGUAGE_ALIASES.items() for alias in aliases}
+ALIAS_TO_LEVEL = {alias: level for level, aliases in LEVEL_ALIASES.items() for alias in aliases}
+
+LANGUAGE_RE = _alternation(ALIAS_TO_LANGUAGE)
+FRAMEWORK_RE = _alternation(FRAMEWORKS)
+LEVEL_RE = _alternation(ALIAS_TO_LEVEL)
+COUNT_RE = re.compile(
+    r"(?<![\w.])(\d{1,3}|" + "|".join(NUMBER_WORDS) + r")\s+(?:[a-z+#]+\s+){0,2}?(?:questions?|qs|items|problems)\b"
+)
+NUMBER_RE = re.compile(r"(?<![\w.])\d+(?![\w.])")
+WORD_RE = re.compile(r"[\w+#.']+")
+
+
+class LocalIntentParser:
+    """
+    Deterministic fast path for QuizGenerator.parse_intent: alias tables for
+    languages, frameworks and levels, number extraction, and topic matching
+    against Topic rows. Each parse carries a confidence score; messages
+    below MIN_CONFIDENCE are left to Gemini.
+
+    The fast path only covers a language (or framework) on its own or with
+    a topic that has a Topic row: any other topic words cost enough
+    confidence that "quiz me on react hooks" goes to Gemini until a
+    "React Hooks" row exists. Topic rows are cached for five minutes.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_cache_config("AI_LOCAL_INTENT", LOCAL_INTENT_DEFAULTS)
+        self.enabled = self.config["ENABLED"]
+        self.min_confidence = self.config["MIN_CONFIDENCE"]
+        self.stats = CacheStats("intent:v1", shared=self.config["SHARED_STATS"])
+        self._topics = LRUCache(max_entries=64, ttl=300)
+
+    def resolve(self, message):
+        """The parsed intent if it is confident enough, else None (ask Gemini)."""
+        if not self.enabled:
+            return None
+        intent, confidence = self.parse(message)
+        return intent if confidence >= self.min_confidence else None
+
+    def parse(self, message):
+        """Returns (intent dict shaped like Gemini's, confidence in [0, 1])."""
+        text = normalize_text(message)
+        spans = []
+
+        def take(pattern):
+            found = []
+            for match in pattern.finditer(text):
+                found.append(match.group(1))
+                spans.append(match.span())
+            return found
+
+        languages = {ALIAS_TO_LANGUAGE[alias] for alias in take(LANGUAGE_RE)}
+        frameworks = [FRAMEWORKS[name] for name in take(FRAMEWORK_RE)]
+        levels = {ALIAS_TO_LEVEL[alias] for alias in take(LEVEL_RE)}
+        counts = take(COUNT_RE)
+
+        rest = text
+        for start, end in spans:
+            rest = rest[:start] + " " * (end - start) + rest[end:]
+        stray_numbers = NUMBER_RE.findall(rest)
+        tokens = [w.strip(".'") for w in WORD_RE.findall(rest)]
+        tokens = [w for w in tokens if w and not w.isdigit()]
+        words = [w for w in tokens if w not in FILLER_WORDS]
+
+        inferred = {language for language, _ in frameworks}
+        candidates = languages or inferred
+        if len(candidates) != 1:
+            # No language, or several: let Gemini decide
+            return None, 0.0
+        (language,) = candidates
+
+        confidence = 1.0
+        if not languages:
+            confidence -= 0.1
+        if len(levels) > 1:
+            confidence -= 0.4
+        if len(counts) > 1 or stray_numbers:
+            confidence -= 0.3
+        if NEGATIONS.intersection(words):
+            confidence -= 0.5
+        if len(words) > MAX_TOPIC_WORDS:
+            confidence -= 0.4
+
+        topic = self._match_topic(language, text)
+        if topic is None:
+            parts = [name for lang, name in frameworks if lang == language]
+            if words:
+                # Free text rather than a known Topic: kept as the user phrased it, but
+                # only Gemini can tell "decorators" from "for an interview tomorrow"
+                parts.append(self._phrase(tokens, words))
+                confidence -= 0.3
+            topic = " ".join(dict.fromkeys(parts)) or DEFAULT_TOPIC
+
+        count = DEFAULT_COUNT
+        if counts:
+            value = counts[0].split()[0]
+            count = NUMBER_WORDS.get(value) or int(value)
+            if not 1 <= count <= MAX_COUNT:
+                # Not something to quietly clamp: let Gemini answer it
+                confidence -= 0.5
+
+        intent = {
+            "language": language,
+            "topic": topic,
+            "level": levels.pop() if len(levels) == 1 else DEFAULT_LEVEL,
+            "count": count,
+        }
+        return intent, round(max(confidence, 0.0), 2)
+
+    @staticmethod
+    def _phrase(tokens, words):
+        """The text from the first to the last topic word, filler in between included."""
+        start, end = tokens.index(words[0]), len(tokens) - tokens[::-1].index(words[-1])
+        phrase = " ".join(tokens[start:end])
+        return phrase[:1].upper() + phrase[1:]
+
+    def _match_topic(self, language, text):
+        """Longest Topic name for the language that appears in the text."""
+        for normalized, name in self._topic_names(language):
+            if re.search(r"(?<!\w)" + re.escape(normalized) + r"(?!\w)", text):
+                return name
+        return None
+
+    def _topic_names(self, language):
+        names = self._topics.get(language)
+        if names is None:
+            rows = Topic.objects.filter(language__iexact=language).values_list("name", flat=True)
+            names = sorted(((normalize_text(name), name) for name in rows), key=lambda pair: len(pair[0]), reverse=True)
+            self._topics.set(language, names)
+        return names
+
+
+_local_parser = None
+
+
+def get_local_intent_parser():
+    """Process-wide LocalIntentParser (shares the Topic lookup cache)."""
+    global _local_parser
+    if _local_parser is None:
+        _local_parser = LocalIntentParser()
+    return _local_parser
@@ -0,0 +1,45 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from apps.ai_agent.cache import get_cache_config
+from apps.ai_agent.resilience import BREAKER_DEFAULTS, CLOSED, HALF_OPEN, OPEN, get_breaker_metrics
+from apps.ai_agent.router import ROUTER_DEFAULTS
+from apps.quizzes.models import AIModel
+
+STATES = (OPEN, HALF_OPEN, CLOSED)
+COUNTERS = ("retries", "retries_denied", "fast_failures")
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows each model's circuit breaker state (as last published by any worker), "
+        "how often it changed state, and how many retries the retry budget allowed or denied."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        alias = get_cache_config("AI_CIRCUIT_BREAKER", BREAKER_DEFAULTS)["METRICS_ALIAS"]
+        names = list(AIModel.objects.order_by('-is_default', 'id').values_list('model_name', flat=True))
+        default = get_cache_config("AI_MODEL_ROUTER", ROUTER_DEFAULTS)["DEFAULT_MODEL"]
+        if default not in names:
+            names.append(default)
+
+        transitions = [f"{name}:{state}" for name in names for state in STATES]
+        counts = get_breaker_metrics().snapshot(transitions + list(COUNTERS))
+
+        self.stdout.write("Circuit breakers")
+        for name in names:
+            state = caches[alias].get(f"breaker:v1:state:{name}") if alias else None
+            changes = ", ".join(f"{state_name} x{counts[f'{name}:{state_name}']}" for state_name in STATES)
+            self.stdout.write(f"  {name:<32} {state or CLOSED:<10} ({changes})")
+
+        self.stdout.write("Retries")
+        self.stdout.write(f"  Allowed:       {counts['retries']}")
+        self.stdout.write(f"  Denied:        {counts['retries_denied']}")
+        self.stdout.write(f"  Failed fast:   {counts['fast_failures']}")
+
+        if options['reset']:
+            get_breaker_metrics().reset(transitions + list(COUNTERS))
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.ai_agent.cache import get_quiz_cache
+
+
+class Command(BaseCommand):
+    help = "Shows hit/miss counters for the quiz generation cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        cache = get_quiz_cache()
+        stats = cache.stats.snapshot()
+
+        self.stdout.write(f"Quiz generation cache ({'enabled' if cache.enabled else 'disabled'})")
+        self.stdout.write(f"  Hits:     {stats['hits']}")
+        self.stdout.write(f"  Misses:   {stats['misses']}")
+        self.stdout.write(f"  Hit rate: {stats['hit_rate'] * 100:.1f}%")
+        self.stdout.write(f"  Gemini calls saved: {stats['hits']}")
+
+        if options['reset']:
+            cache.stats.reset()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
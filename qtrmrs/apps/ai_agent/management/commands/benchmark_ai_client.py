@@ -0,0 +1,89 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from apps.ai_agent.client import get_generative_model, reset_clients
+from apps.ai_agent.management.commands.benchmark_ai_servers import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the per-request cost of getting a Gemini model object: configuring the SDK and "
+        "building a fresh model and service client every time (the old behaviour) vs the process-wide "
+        "registry. Runs offline; no requests are sent, so TLS handshakes saved on real calls come on top."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help="Lookups timed per variant.")
+        parser.add_argument('--threads', type=int, default=16, help="Threads racing for the shared model.")
+        parser.add_argument('--model', default='gemini-flash-lite-latest')
+
+    def handle(self, *args, **options):
+        api_key = settings.GEMINI_API_KEY or 'benchmark-key'
+        model_name = options['model']
+
+        with override_settings(AI_BACKEND='gemini', GEMINI_API_KEY=api_key):
+            reset_clients()
+            fresh = self.time(options['iterations'], lambda: self.fresh_model(api_key, model_name))
+
+            reset_clients()
+            started = time.perf_counter()
+            get_generative_model(model_name)
+            first = (time.perf_counter() - started) * 1000
+            shared = self.time(options['iterations'], lambda: get_generative_model(model_name))
+
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                reset_clients()
+                models = list(pool.map(lambda _: get_generative_model(model_name), range(options['threads'] * 4)))
+            distinct = len({id(model) for model in models})
+            forked = self.model_after_fork(model_name, models[0])
+            reset_clients()
+
+        self.stdout.write(f"{'':<26}{'p50 ms':>10}{'p95 ms':>10}")
+        self.stdout.write(f"{'configure + new model':<26}{percentile(fresh, 50):>10.3f}{percentile(fresh, 95):>10.3f}")
+        self.stdout.write(f"{'shared registry':<26}{percentile(shared, 50):>10.3f}{percentile(shared, 95):>10.3f}")
+        self.stdout.write(f"First registry lookup (configures once): {first:.3f} ms")
+        self.stdout.write(f"Model objects across {options['threads']} threads: {distinct}")
+        if forked is not None:
+            self.stdout.write(f"Forked child rebuilt its model: {'yes' if forked else 'NO'}")
+
+    @staticmethod
+    def fresh_model(api_key, model_name):
+        # What every QuizGenerator used to do: reconfigure (dropping the SDK's clients), then the
+        # first call on the new model built a new service client and channel
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel(model_name)
+        genai_client.get_default_generative_client()
+        return model
+
+    @staticmethod
+    def time(iterations, fn):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    @staticmethod
+    def model_after_fork(model_name, parent_model):
+        """True if a forked child gets its own model object (None where fork isn't available)."""
+        if not hasattr(os, 'fork'):
+            return None
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.write(write_fd, b'1' if get_generative_model(model_name) is not parent_model else b'0')
+            os._exit(0)
+        os.close(write_fd)
+        result = os.read(read_fd, 1)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        return result == b'1'
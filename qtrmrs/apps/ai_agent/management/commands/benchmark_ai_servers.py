@@ -0,0 +1,175 @@
+import http.client
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_agent.client import OFFLINE_BACKENDS
+
+HOST = '127.0.0.1'
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests create_quiz on sync gunicorn vs async uvicorn against the stubbed Gemini backend. "
+        "Run with DJANGO_SETTINGS_MODULE=config.settings.benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=60, help="Requests per server.")
+        parser.add_argument('--concurrency', type=int, default=30, help="Concurrent clients.")
+        parser.add_argument('--latency', type=float, default=1.0, help="Stubbed Gemini latency (seconds).")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Share of stubbed/replayed calls that fail.")
+        parser.add_argument('--gunicorn-workers', type=int, default=2, help="Sync gunicorn worker processes.")
+        parser.add_argument('--servers', default='sync,async', help="Comma-separated: sync, async.")
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        if settings.AI_BACKEND not in OFFLINE_BACKENDS:
+            raise CommandError("Refusing to load-test the real Gemini API. Use DJANGO_SETTINGS_MODULE=config.settings.benchmark.")
+
+        call_command('migrate', verbosity=0)
+        session_key = self._login_session()
+
+        servers = {
+            'sync': (
+                "gunicorn (sync)",
+                [sys.executable, '-m', 'gunicorn', 'config.wsgi:application',
+                 '--workers', str(options['gunicorn_workers']), '--bind', f"{HOST}:{options['port']}",
+                 '--timeout', '120', '--log-level', 'warning'],
+                {'AI_ASYNC_VIEWS': 'false'},
+            ),
+            'async': (
+                "uvicorn (async)",
+                [sys.executable, '-m', 'uvicorn', 'config.asgi:application',
+                 '--host', HOST, '--port', str(options['port']), '--log-level', 'warning'],
+                {'AI_ASYNC_VIEWS': 'true'},
+            ),
+        }
+
+        results = []
+        for name in options['servers'].split(','):
+            label, cmd, extra_env = servers[name.strip()]
+            env = {
+                **os.environ,
+                **extra_env,
+                'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings.benchmark'),
+                'AI_STUB_LATENCY': str(options['latency']),
+                'AI_ERROR_RATE': str(options['error_rate']),
+            }
+            self.stdout.write(f"Starting {label}...")
+            server = subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env)
+            try:
+                self._wait_for_port(options['port'])
+                results.append((label, self._load(session_key, options)))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        self._report(results, options)
+
+    def _login_session(self):
+        User = get_user_model()
+        user, created = User.objects.get_or_create(email='benchmark@example.com', defaults={'username': 'benchmark'})
+        if created:
+            user.set_unusable_password()
+            user.save()
+
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    @staticmethod
+    def _wait_for_port(port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection((HOST, port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"Server did not start on port {port}")
+
+    def _load(self, session_key, options):
+        csrf = secrets.token_hex(16)
+        headers = {
+            'Cookie': f"sessionid={session_key}; csrftoken={csrf}",
+            'X-CSRFToken': csrf,
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'HX-Request': 'true',
+        }
+        run_id = secrets.token_hex(4)
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def one_request(i):
+            # A unique topic per request, so neither the bank nor the cache can answer
+            body = urlencode({
+                'topic': f"benchmark {run_id} {i}",
+                'language_select': 'Python',
+                'level': 'intermediate',
+                'num_questions': 5,
+            })
+            started = time.monotonic()
+            conn = http.client.HTTPConnection(HOST, options['port'], timeout=300)
+            try:
+                conn.request('POST', '/quiz/create/', body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200 and response.getheader('HX-Redirect')
+            except OSError as e:
+                ok, response = False, e
+            finally:
+                conn.close()
+
+            with lock:
+                if ok:
+                    latencies.append(time.monotonic() - started)
+                else:
+                    errors.append(getattr(response, 'status', str(response)))
+
+        wall_started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(one_request, range(options['requests'])))
+        wall = time.monotonic() - wall_started
+
+        return {'latencies': latencies, 'errors': errors, 'wall': wall}
+
+    def _report(self, results, options):
+        self.stdout.write("")
+        self.stdout.write(
+            f"{options['requests']} requests, concurrency {options['concurrency']}, "
+            f"stub latency {options['latency']}s"
+        )
+        self.stdout.write(f"{'Server':<18}{'OK':>6}{'Errors':>8}{'Req/s':>9}{'p50 (s)':>10}{'p95 (s)':>10}")
+        for label, result in results:
+            ok = len(result['latencies'])
+            self.stdout.write(
+                f"{label:<18}{ok:>6}{len(result['errors']):>8}"
+                f"{ok / result['wall']:>9.2f}"
+                f"{percentile(result['latencies'], 50):>10.2f}"
+                f"{percentile(result['latencies'], 95):>10.2f}"
+            )
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_agent.management.commands.benchmark_ai_servers import percentile
+
+STARTUP_BUDGET_DEFAULTS = {
+    "IMPORT_MS": None,
+    "RSS_MB": None,
+    "FORBIDDEN_MODULES": (),
+}
+
+
+def run_cold(command):
+    """Runs `python -X importtime manage.py <command>` in a fresh process; returns (wall ms, peak RSS MB, imports)."""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', 'manage.py', *command],
+        cwd=settings.BASE_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    stderr = process.stderr.read()
+    # wait4 gives the child's own peak RSS (getrusage(RUSAGE_CHILDREN) is a running max)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if process.returncode:
+        raise CommandError(f"manage.py {' '.join(command)} exited with {process.returncode}")
+
+    # "import time: self [us] | cumulative | imported package", nested imports indented
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports[name.strip()] = (int(cumulative), len(name) - len(name.lstrip()) == 1)
+    return wall_ms, usage.ru_maxrss / 1024, imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures worker cold start: wall time, import time (python -X importtime) and peak RSS of a fresh "
+        "`manage.py check` (which loads every app and URLconf, like a gunicorn worker booting), and which "
+        "heavy modules got imported. Fails if STARTUP_BUDGET is exceeded, so regressions show up in CI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('command', nargs='*', default=['check'], help="manage.py command to start (default: check).")
+        parser.add_argument('--runs', type=int, default=3, help="Cold starts to measure.")
+        parser.add_argument('--top', type=int, default=10, help="Slowest top-level imports to list.")
+
+    def handle(self, *args, **options):
+        budget = {**STARTUP_BUDGET_DEFAULTS, **getattr(settings, 'STARTUP_BUDGET', {})}
+        command = options['command']
+
+        walls, import_totals, rss = [], [], []
+        for _ in range(options['runs']):
+            wall_ms, rss_mb, imports = run_cold(command)
+            walls.append(wall_ms)
+            rss.append(rss_mb)
+            import_totals.append(sum(us for us, top_level in imports.values() if top_level) / 1000)
+
+        self.stdout.write(f"Cold start of `manage.py {' '.join(command)}` ({options['runs']} runs, median)")
+        self.stdout.write(f"  Wall time:   {percentile(walls, 50):.0f} ms")
+        self.stdout.write(f"  Import time: {percentile(import_totals, 50):.0f} ms")
+        self.stdout.write(f"  Peak RSS:    {percentile(rss, 50):.1f} MB")
+
+        slowest = sorted(((us, name) for name, (us, top_level) in imports.items() if top_level), reverse=True)
+        self.stdout.write("Slowest top-level imports")
+        for us, name in slowest[:options['top']]:
+            self.stdout.write(f"  {us / 1000:>8.1f} ms  {name}")
+
+        failures = []
+        loaded = [m for m in budget["FORBIDDEN_MODULES"] if m in imports]
+        if loaded:
+            failures.append(f"imported at startup: {', '.join(loaded)}")
+        if budget["IMPORT_MS"] and percentile(import_totals, 50) > budget["IMPORT_MS"]:
+            failures.append(f"import time over {budget['IMPORT_MS']} ms")
+        if budget["RSS_MB"] and percentile(rss, 50) > budget["RSS_MB"]:
+            failures.append(f"peak RSS over {budget['RSS_MB']} MB")
+
+        if failures:
+            raise CommandError("Startup budget exceeded: " + "; ".join(failures))
+        self.stdout.write(self.style.SUCCESS("Within STARTUP_BUDGET."))
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ai_agent.cache import get_intent_memo
+from apps.ai_agent.intent import get_local_intent_parser
+
+COUNTERS = ("local", "memo", "llm", "local_us", "memo_us", "llm_us")
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports how many chat intents were resolved without Gemini (local parser or intent memo) and the latency saved. "
+        "With --messages, replays a file of chat messages (one per line) through the local parser instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', help="Text file of chat messages to evaluate offline.")
+        parser.add_argument('--reset', action='store_true', help="Zero the live counters after printing them.")
+
+    def handle(self, *args, **options):
+        parser = get_local_intent_parser()
+        if options['messages']:
+            self.evaluate(parser, options['messages'], options['verbosity'])
+            return
+
+        stats = parser.stats.snapshot(COUNTERS)
+        total = stats['local'] + stats['memo'] + stats['llm']
+        average_ms = {
+            source: stats[f"{source}_us"] / 1000 / stats[source] if stats[source] else 0
+            for source in ("local", "memo", "llm")
+        }
+        saved = sum(
+            stats[source] * max(average_ms['llm'] - average_ms[source], 0) for source in ("local", "memo")
+        )
+
+        self.stdout.write(f"Chat intents ({'local parser enabled' if parser.enabled else 'local parser disabled'})")
+        self.stdout.write(f"  Parsed locally:   {stats['local']} ({self._share(stats['local'], total)})")
+        self.stdout.write(f"  From intent memo: {stats['memo']} ({self._share(stats['memo'], total)})")
+        self.stdout.write(f"  Sent to Gemini:   {stats['llm']}")
+        self.stdout.write(f"  Avg local parse:  {average_ms['local']:.2f} ms")
+        self.stdout.write(f"  Avg memo hit:     {average_ms['memo']:.2f} ms")
+        self.stdout.write(f"  Avg Gemini parse: {average_ms['llm']:.0f} ms")
+        self.stdout.write(f"  Latency saved:    ~{saved / 1000:.1f} s")
+
+        memo = get_intent_memo()
+        memo_stats = memo.stats.snapshot()
+        self.stdout.write(f"Intent memo ({'enabled' if memo.enabled else 'disabled'})")
+        self.stdout.write(f"  Hits:     {memo_stats['hits']}")
+        self.stdout.write(f"  Misses:   {memo_stats['misses']}")
+        self.stdout.write(f"  Hit rate: {memo_stats['hit_rate'] * 100:.1f}%")
+
+        if options['reset']:
+            parser.stats.reset(COUNTERS)
+            memo.stats.reset()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
+
+    def evaluate(self, parser, path, verbosity):
+        with open(path, encoding='utf-8') as f:
+            messages = [line.strip() for line in f if line.strip()]
+
+        resolved, elapsed = 0, 0.0
+        for message in messages:
+            started = time.perf_counter()
+            intent, confidence = parser.parse(message)
+            elapsed += time.perf_counter() - started
+
+            local = confidence >= parser.min_confidence
+            resolved += local
+            if verbosity > 1:
+                self.stdout.write(f"{confidence:>5.2f} {'local ' if local else 'gemini'} {message!r} -> {intent}")
+
+        self.stdout.write(f"{len(messages)} messages, {resolved} resolved locally ({self._share(resolved, len(messages))})")
+        if messages:
+            self.stdout.write(f"Avg local parse: {elapsed / len(messages) * 1000:.3f} ms")
+
+    @staticmethod
+    def _share(part, total):
+        return f"{part / total * 100:.1f}%" if total else "n/a"
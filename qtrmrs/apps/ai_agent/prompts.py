@@ -43,6 +43,28 @@ Be encouraging but technically precise.
 
 
 
+BATCH_EXPLANATION_PROMPT = """
+A user answered several coding quiz questions incorrectly (or skipped them).
+Each mistake is listed below as JSON with an "id":
+{mistakes}
+
+Task:
+For EVERY mistake, explain in 2 sentences max why the user's answer is wrong and why the correct answer is right.
+Address the user directly ("You selected..."). For skipped questions, just explain the correct answer.
+Be encouraging but technically precise.
+
+Output ONLY valid JSON in this format, using the same ids:
+{{
+  "explanations": [
+    {{"id": 12, "explanation": "You selected ... but ..."}}
+  ]
+}}
+"""
+
+
+
+
+
 INTENT_PARSING_PROMPT = """
 Analyze the user's request: "{user_message}"
 
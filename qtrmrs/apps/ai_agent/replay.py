@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .cache import get_cache_config
+from .stub import StubGenerativeModel
+
+logger = logging.getLogger(__name__)
+
+REPLAY_DEFAULTS = {
+    "DIR": "ai_recordings",
+    "VARIANTS": 3,
+    "LATENCY": None,
+    "LATENCY_SCALE": 1.0,
+    "ON_MISS": "stub",
+}
+
+
+class ReplayMissError(LookupError):
+    """No recording for a prompt and AI_REPLAY['ON_MISS'] is 'error'."""
+
+
+class RecordingStore:
+    """
+    Gemini responses on disk, one JSON file per prompt (hashed with its
+    generation config). Each file keeps up to VARIANTS responses with the
+    latency they took, so replays vary like the real API does.
+    """
+
+    def __init__(self, directory, variants=3):
+        self.directory = Path(directory)
+        self.variants = variants
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(prompt, generation_config=None):
+        # The model is left out: replays shouldn't depend on which AIModel rows exist locally
+        raw = json.dumps([prompt, generation_config], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key):
+        """A random recorded {"text", "latency"} for the key, or None."""
+        with self._lock:
+            if key not in self._loaded:
+                self._loaded[key] = self._read(key)
+            responses = self._loaded[key]
+        return random.choice(responses) if responses else None
+
+    def add(self, key, model_name, prompt, text, latency):
+        with self._lock:
+            responses = self._read(key) + [{"model": model_name, "text": text, "latency": round(latency, 3)}]
+            responses = responses[-self.variants:]
+            self._write(key, {"prompt": prompt, "responses": responses})
+            self._loaded[key] = responses
+
+    def _path(self, key):
+        return self.directory / f"{key}.json"
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)["responses"]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Unreadable recording {key}: {e}")
+            return []
+
+    def _write(self, key, data):
+        # Write-then-rename, so concurrent workers never read half a file
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, self._path(key))
+
+
+class RecordingGenerativeModel:
+    """Wraps a real genai.GenerativeModel and saves every successful response (AI_BACKEND = 'record')."""
+
+    def __init__(self, model, store):
+        self.model = model
+        self.store = store
+        self.model_name = model.model_name
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        key = self.store.key_for(prompt, generation_config)
+        started = time.monotonic()
+        response = self.model.generate_content(prompt, generation_config=generation_config, stream=stream)
+        if stream:
+            return self._record_stream(key, prompt, response, started)
+        self.store.add(key, self.model_name, prompt, response.text, time.monotonic() - started)
+        return response
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        key = self.store.key_for(prompt, generation_config)
+        started = time.monotonic()
+        response = await self.model.generate_content_async(prompt, generation_config=generation_config, stream=stream)
+        if stream:
+            return self._arecord_stream(key, prompt, response, started)
+        self.store.add(key, self.model_name, prompt, response.text, time.monotonic() - started)
+        return response
+
+    def _record_stream(self, key, prompt, response, started):
+        chunks = []
+        for chunk in response:
+            chunks.append(chunk.text)
+            yield chunk
+        self.store.add(key, self.model_name, prompt, "".join(chunks), time.monotonic() - started)
+
+    async def _arecord_stream(self, key, prompt, response, started):
+        chunks = []
+        async for chunk in response:
+            chunks.append(chunk.text)
+            yield chunk
+        self.store.add(key, self.model_name, prompt, "".join(chunks), time.monotonic() - started)
+
+
+class ReplayGenerativeModel(StubGenerativeModel):
+    """
+    Offline stand-in that answers from recordings (AI_BACKEND = 'replay'),
+    taking the recorded latency (scaled, or a fixed LATENCY). Prompts never
+    recorded get the stub's canned answer, or fail with ON_MISS = 'error'.
+    """
+
+    def __init__(self, model_name, store, config, faults=None, stub_latency=1.0):
+        super().__init__(model_name, latency=stub_latency, faults=faults)
+        self.store = store
+        self.config = config
+
+    def reply(self, prompt, generation_config=None):
+        recorded = self.store.get(self.store.key_for(prompt, generation_config))
+        if recorded is None:
+            if self.config["ON_MISS"] == "error":
+                raise ReplayMissError(f"No recording for prompt {prompt[:60]!r}")
+            return super().reply(prompt, generation_config)
+
+        latency = self.config["LATENCY"]
+        if latency is None:
+            latency = recorded["latency"] * self.config["LATENCY_SCALE"]
+        return recorded["text"], latency
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_recording_store():
+    """Process-wide RecordingStore for AI_REPLAY['DIR'] (relative paths are under BASE_DIR)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = get_cache_config("AI_REPLAY", REPLAY_DEFAULTS)
+            _store = RecordingStore(Path(settings.BASE_DIR) / config["DIR"], variants=config["VARIANTS"])
+        return _store
@@ -0,0 +1,214 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from django.core.cache import caches
+from django.core.signals import setting_changed
+
+from .cache import CacheStats, get_cache_config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+BREAKER_DEFAULTS = {
+    "FAILURE_RATE": 0.5,
+    "MIN_CALLS": 5,
+    "WINDOW": 20,
+    "SLOW_CALL_SECONDS": 30.0,
+    "OPEN_SECONDS": 30,
+    "HALF_OPEN_CALLS": 1,
+    "METRICS_ALIAS": "ai",
+}
+
+RETRY_DEFAULTS = {
+    "MAX_ATTEMPTS": 3,
+    "BASE_DELAY": 0.5,
+    "MAX_DELAY": 5.0,
+    "BUDGET_RATIO": 0.2,
+    "BUDGET_MIN_PER_SECOND": 1.0,
+    "BUDGET_WINDOW": 10,
+}
+
+# Ticket for a call let through a closed circuit (half-open probes get their own)
+CALL = object()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker. Trips OPEN when errors and slow calls reach
+    FAILURE_RATE of the last WINDOW calls; while open, calls fail fast.
+    After OPEN_SECONDS it lets HALF_OPEN_CALLS probe requests through: a
+    probe's success closes the circuit, its failure opens it again. Calls
+    admitted before the circuit opened may finish meanwhile; they don't count.
+    """
+
+    def __init__(self, name, config=None):
+        self.name = name
+        self.config = config or get_cache_config("AI_CIRCUIT_BREAKER", BREAKER_DEFAULTS)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._calls = deque(maxlen=self.config["WINDOW"])
+        self._probes = set()
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        A ticket to pass back to record() if a call may go ahead, else None.
+        Half-open, only HALF_OPEN_CALLS probe tickets are handed out.
+        """
+        change = None
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.config["OPEN_SECONDS"]:
+                    return None
+                change = self._transition(HALF_OPEN)
+
+            ticket = CALL
+            if self.state == HALF_OPEN:
+                if len(self._probes) >= self.config["HALF_OPEN_CALLS"]:
+                    ticket = None
+                else:
+                    ticket = object()
+                    self._probes.add(ticket)
+        if change:
+            self._publish(*change)
+        return ticket
+
+    def is_available(self):
+        """Like allow(), but without taking a probe slot."""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.config["OPEN_SECONDS"]
+            return self.state == CLOSED or len(self._probes) < self.config["HALF_OPEN_CALLS"]
+
+    def record(self, ok, latency=0.0, ticket=CALL):
+        """Reports a finished call with the ticket allow() gave it; slow successes count as failures."""
+        failed = not ok or latency > self.config["SLOW_CALL_SECONDS"]
+        change = None
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if ticket not in self._probes:
+                    return
+                self._probes.discard(ticket)
+                change = self._transition(OPEN if failed else CLOSED)
+            else:
+                self._calls.append(failed)
+                failures = sum(self._calls)
+                if (
+                    self.state == CLOSED
+                    and len(self._calls) >= self.config["MIN_CALLS"]
+                    and failures / len(self._calls) >= self.config["FAILURE_RATE"]
+                ):
+                    change = self._transition(OPEN)
+        if change:
+            self._publish(*change)
+
+    def _transition(self, state):
+        # Caller holds the lock; returns the change for _publish() to report once it is released
+        previous, self.state = self.state, state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state in (OPEN, CLOSED):
+            self._calls.clear()
+            self._probes.clear()
+        return previous, state
+
+    def _publish(self, previous, state):
+        logger.warning(f"Circuit for {self.name}: {previous} -> {state}")
+        get_breaker_metrics().incr(f"{self.name}:{state}")
+        alias = self.config["METRICS_ALIAS"]
+        if alias:
+            try:
+                caches[alias].set(f"breaker:v1:state:{self.name}", state, timeout=None)
+            except Exception as e:
+                logger.warning(f"Breaker state not published for {self.name}: {e}")
+
+
+class RetryBudget:
+    """
+    Process-wide cap on retries: over the last BUDGET_WINDOW seconds,
+    retries may be at most BUDGET_RATIO of first attempts (plus a small
+    per-second allowance), so retries can't multiply load on a struggling API.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_cache_config("AI_RETRY", RETRY_DEFAULTS)
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self._requests.append(time.monotonic())
+
+    def try_retry(self):
+        """Takes a retry from the budget; False if it is spent."""
+        window = self.config["BUDGET_WINDOW"]
+        now = time.monotonic()
+        with self._lock:
+            for stamps in (self._requests, self._retries):
+                while stamps and stamps[0] <= now - window:
+                    stamps.popleft()
+
+            allowed = self.config["BUDGET_MIN_PER_SECOND"] * window + self.config["BUDGET_RATIO"] * len(self._requests)
+            if len(self._retries) >= allowed:
+                get_breaker_metrics().incr("retries_denied")
+                return False
+            self._retries.append(now)
+
+        get_breaker_metrics().incr("retries")
+        return True
+
+    def backoff(self, attempt):
+        """Full-jitter exponential delay before retry number `attempt` (1-based)."""
+        ceiling = min(self.config["MAX_DELAY"], self.config["BASE_DELAY"] * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_retry_budget = None
+_metrics = None
+
+
+def get_breaker_metrics():
+    """Shared counters: transitions per model and state, retries, fast failures."""
+    global _metrics
+    if _metrics is None:
+        config = get_cache_config("AI_CIRCUIT_BREAKER", BREAKER_DEFAULTS)
+        _metrics = CacheStats("breaker:v1", shared=bool(config["METRICS_ALIAS"]))
+    return _metrics
+
+
+def _reload_metrics(sender, setting, **kwargs):
+    global _metrics
+    if setting == "AI_CIRCUIT_BREAKER":
+        _metrics = None
+
+
+setting_changed.connect(_reload_metrics, dispatch_uid="breaker_reload_metrics")
+
+
+def get_breaker(model_name):
+    """Process-wide breaker for a model."""
+    with _breakers_lock:
+        if model_name not in _breakers:
+            _breakers[model_name] = CircuitBreaker(model_name)
+        return _breakers[model_name]
+
+
+def get_retry_budget():
+    global _retry_budget
+    with _breakers_lock:
+        if _retry_budget is None:
+            _retry_budget = RetryBudget()
+        return _retry_budget
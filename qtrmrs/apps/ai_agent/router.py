@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from apps.quizzes.models import AIModel
+from .cache import get_cache_config
+
+logger = logging.getLogger(__name__)
+
+TASK_QUIZ = 'quiz'
+TASK_EXPLANATION = 'explanation'
+TASK_INTENT = 'intent'
+
+ROUTER_DEFAULTS = {
+    "DEFAULT_MODEL": "gemini-flash-lite-latest",
+    "MODEL_LIST_TTL": 60,
+    "WINDOW": 50,
+    "WINDOW_SECONDS": 300,
+    "MIN_SAMPLES": 5,
+    "MAX_ERROR_RATE": 0.5,
+    "SLOW_P95": 20.0,
+}
+
+
+def _percentile(ordered, pct):
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+
+class ModelHealth:
+    """
+    Rolling latency and error window for one model in this process: the
+    last WINDOW calls, dropping any older than WINDOW_SECONDS so a model
+    that was routed away from gets a clean slate later.
+    """
+
+    def __init__(self, window=50, window_seconds=300):
+        self.window_seconds = window_seconds
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._samples.append((time.monotonic(), latency, ok))
+
+    def snapshot(self):
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            samples = list(self._samples)
+
+        latencies = sorted(latency for _, latency, ok in samples if ok)
+        errors = sum(1 for _, _, ok in samples if not ok)
+        return {
+            "calls": len(samples),
+            "error_rate": round(errors / len(samples), 3) if samples else 0.0,
+            "p50": round(_percentile(latencies, 50), 3) if latencies else None,
+            "p95": round(_percentile(latencies, 95), 3) if latencies else None,
+        }
+
+
+class ModelRouter:
+    """
+    Chooses which Gemini model serves each task (quiz, explanation, intent)
+    from the active AIModel rows, default model first. Models that are
+    failing or slow in this process are moved to the back of the list, so
+    they are only used to fail over when everything else fails too.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_cache_config("AI_MODEL_ROUTER", ROUTER_DEFAULTS)
+        self._health = {}
+        self._models = None
+        self._models_loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def candidates(self, task):
+        """Model names to try for `task`, best first."""
+        models = [(name, is_default) for name, is_default, tasks in self._active_models() if not tasks or task in tasks]
+        if not models:
+            return [self.config["DEFAULT_MODEL"]]
+
+        def rank(item):
+            name, is_default = item
+            health = self.health(name).snapshot()
+            enough = health["calls"] >= self.config["MIN_SAMPLES"]
+            # Healthy before unhealthy, then the default, then the fastest
+            return (
+                not self._is_healthy(health) if enough else False,
+                not is_default,
+                (health["p50"] or 0) if enough else 0,
+            )
+
+        return [name for name, _ in sorted(models, key=rank)]
+
+    def primary(self, task):
+        return self.candidates(task)[0]
+
+    def record(self, model_name, latency, ok):
+        self.health(model_name).record(latency, ok)
+
+    def health(self, model_name):
+        with self._lock:
+            if model_name not in self._health:
+                self._health[model_name] = ModelHealth(self.config["WINDOW"], self.config["WINDOW_SECONDS"])
+            return self._health[model_name]
+
+    def snapshot(self):
+        """{model name: rolling calls/error rate/p50/p95} for this process."""
+        with self._lock:
+            names = list(self._health)
+        return {name: self.health(name).snapshot() for name in names}
+
+    def _is_healthy(self, health):
+        if health["error_rate"] > self.config["MAX_ERROR_RATE"]:
+            return False
+        return health["p95"] is None or health["p95"] <= self.config["SLOW_P95"]
+
+    def _active_models(self):
+        # Cached in-process: the model list changes rarely and is read on every call
+        now = time.monotonic()
+        if self._models is None or now - self._models_loaded_at > self.config["MODEL_LIST_TTL"]:
+            try:
+                rows = AIModel.objects.filter(is_active=True).order_by('-is_default', 'id')
+                self._models = [
+                    (row.model_name, row.is_default, {t.strip() for t in row.tasks.split(',') if t.strip()})
+                    for row in rows
+                ]
+            except Exception as e:
+                logger.error(f"Could not load AI models: {e}")
+                self._models = self._models or []
+            self._models_loaded_at = now
+        return self._models
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router():
+    """Process-wide ModelRouter (health windows are only useful if shared)."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -1,30 +1,242 @@
+import asyncio
 import json
 import logging
-from .client import get_gemini_client
-from .prompts import QUIZ_GENERATION_PROMPT, EXPLANATION_PROMPT, INTENT_PARSING_PROMPT
+import time
+from itertools import cycle, islice
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from apps.core.instrumentation import record_ai_call
+from apps.core.metrics import AI_LATENCY, AI_REQUESTS, AI_TOKENS
+from .cache import get_cache_config, get_intent_memo, get_quiz_cache
+from .client import get_generative_model
+from .executor import RateLimitExceeded, estimate_tokens, get_executor, get_rate_limiter
+from .intent import get_local_intent_parser
+from .resilience import RETRY_DEFAULTS, CircuitOpenError, get_breaker, get_breaker_metrics, get_retry_budget
+from .router import TASK_EXPLANATION, TASK_INTENT, TASK_QUIZ, get_model_router
+from .streaming import QuestionStreamParser
+from .prompts import QUIZ_GENERATION_PROMPT, EXPLANATION_PROMPT, BATCH_EXPLANATION_PROMPT, INTENT_PARSING_PROMPT
 
 logger = logging.getLogger(__name__)
 
+# Returned when the intent can't be parsed
+INTENT_DEFAULTS = {
+    "language": "General",
+    "topic": "Random",
+    "level": "Intermediate",
+    "count": 5
+}
+
 class QuizGenerator:
     """
     Service class to handle AI interactions for Quizzes.
     """
     
-    def __init__(self, model_name='gemini-flash-lite-latest'):
-        self.genai = get_gemini_client()
-        self.model = self.genai.GenerativeModel(model_name)
+    def __init__(self, model_name=None, interactive=False):
+        self.router = get_model_router()
+        # An explicit model pins every call to it; otherwise the router picks one per task
+        self.pinned_model = model_name
+        self.model_name = model_name or self.router.primary(TASK_QUIZ)
+        # The model that served the most recent call (may differ after a failover)
+        self.last_model = None
+        # The most recent streamed call, recorded by _end_stream() once consumed
+        self.last_stream = None
+        self.cache = get_quiz_cache()
+        self.local_intent = get_local_intent_parser()
+        self.intent_memo = get_intent_memo()
+        self.retry_config = get_cache_config("AI_RETRY", RETRY_DEFAULTS)
+        # A user is waiting on the result: fail fast so the caller can fall back
+        self.interactive = interactive
 
-    def generate_quiz(self, language, topic, level, num_questions=5, include_code=False):
+    def generate_quiz(self, language, topic, level, num_questions=5, include_code=False, use_cache=True):
         """
         Generates a structured quiz using Gemini.
+        Identical requests are served from the generation cache once its
+        variant pool for that key is full.
+        """
+        cache_key = self.cache.key_for(self.model_name, language, topic, level, num_questions, include_code)
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached:
+                return cached
+
+        prompt = self._build_quiz_prompt(language, topic, level, num_questions, include_code)
+
+        try:
+            response = self._call_model(prompt, json_output=True)
+            
+            quiz_data = json.loads(response.text)
+            questions = quiz_data.get('questions', [])
+            if use_cache:
+                self.cache.add(cache_key, questions)
+            return questions
+
+        except Exception as e:
+            logger.error(f"AI Generation Error: {e}")
+            # Gemini down or its circuit open: an older variant beats no quiz
+            return (self.cache.get_stale(cache_key) if use_cache else None) or []
+
+    def stream_quiz(self, language, topic, level, num_questions=5, include_code=False, use_cache=True):
+        """
+        Yields questions one at a time as Gemini streams them, so the first
+        one can be played while the rest are still being generated.
+        """
+        cache_key = self.cache.key_for(self.model_name, language, topic, level, num_questions, include_code)
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached:
+                yield from cached
+                return
+
+        prompt = self._build_quiz_prompt(language, topic, level, num_questions, include_code)
+        parser = QuestionStreamParser()
+        questions = []
+        streamed_chars = 0
+        call, failed = None, False
+
+        try:
+            response = self._call_model(prompt, json_output=True, stream=True)
+            call = self.last_stream
+            for chunk in response:
+                streamed_chars += len(chunk.text)
+                for q_data in parser.feed(chunk.text):
+                    questions.append(q_data)
+                    yield q_data
+
+        except Exception as e:
+            failed = True
+            logger.error(f"AI Streaming Error: {e}")
+            if not questions and use_cache:
+                yield from self.cache.get_stale(cache_key) or []
+            return
+
+        finally:
+            # Only a stream that started was a call; one the consumer closed early still succeeded
+            if call:
+                self._end_stream(call, ok=not failed, streamed_chars=streamed_chars)
+
+        if use_cache:
+            self.cache.add(cache_key, questions)
+
+    def _call_model(self, prompt, json_output=False, stream=False, task=TASK_QUIZ):
+        """
+        Single entry point to Gemini. Tries the task's models in the router's
+        order, failing over on errors and retrying with jittered backoff up to
+        MAX_ATTEMPTS calls while the global retry budget allows. Models whose
+        circuit is open are skipped without a call; each call waits for a slot
+        under that model's RPM/TPM limits, and the tokens the response
+        actually used are recorded. A stream is only recorded once the caller
+        has consumed it (last_stream, _end_stream()), since it can still
+        break mid-way. Interactive generators wait only
+        INTERACTIVE_TIMEOUT for a slot and never back off: they fail over
+        to untried models, then give up.
         """
+        generation_config = {"response_mime_type": "application/json"} if json_output else None
+        self.last_model = self.last_stream = None
+        budget = get_retry_budget()
+        budget.record_request()
+        calls, tried, last_error = 0, set(), None
+
+        for model_name in self._attempt_order(self._candidates(task)):
+            if calls >= self.retry_config["MAX_ATTEMPTS"]:
+                break
+            breaker = get_breaker(model_name)
+            if not breaker.is_available():
+                last_error = last_error or CircuitOpenError(f"Circuit open for {model_name}")
+                continue
+            if model_name in tried and self.interactive:
+                continue
+            if calls and not budget.try_retry():
+                break
+            if model_name in tried:
+                time.sleep(budget.backoff(calls))
+            tried.add(model_name)
+
+            limiter = get_rate_limiter(model_name)
+            try:
+                limiter.acquire(estimate_tokens(prompt), timeout=self._acquire_timeout())
+            except RateLimitExceeded as e:
+                # Out of quota isn't a model failure: just try the next one
+                last_error = e
+                continue
+            ticket = breaker.allow()
+            if ticket is None:
+                last_error = CircuitOpenError(f"Circuit open for {model_name}")
+                continue
+
+            calls += 1
+            started = time.monotonic()
+            try:
+                model = get_generative_model(model_name)
+                response = model.generate_content(prompt, generation_config=generation_config, stream=stream)
+            except Exception as e:
+                self._record_call(model_name, task, breaker, ticket, started, ok=False, prompt=prompt)
+                logger.warning(f"{model_name} failed ({task}), failing over: {e}")
+                last_error = e
+                continue
+
+            self.last_model = model_name
+            if stream:
+                self.last_stream = (model_name, task, breaker, ticket, started, prompt)
+                return response
+            self._record_call(model_name, task, breaker, ticket, started, ok=True, prompt=prompt, response_chars=len(response.text))
+            self._record_usage(model_name, limiter, response)
+            return response
+
+        raise self._exhausted(task, calls, last_error)
+
+    def _acquire_timeout(self):
+        return settings.AI_EXECUTOR['INTERACTIVE_TIMEOUT' if self.interactive else 'TIMEOUT']
+
+    def is_available(self, task=TASK_QUIZ):
+        """False while every model for the task has an open circuit (calls would fail fast)."""
+        return any(get_breaker(name).is_available() for name in self._candidates(task))
+
+    def _candidates(self, task):
+        return [self.pinned_model] if self.pinned_model else self.router.candidates(task)
+
+    def _attempt_order(self, candidates):
+        # Cycle through the candidates so retries can land on the same model or the next one
+        return islice(cycle(candidates), len(candidates) * self.retry_config["MAX_ATTEMPTS"])
+
+    def _record_call(self, model_name, task, breaker, ticket, started, ok, prompt='', response_chars=0):
+        latency = time.monotonic() - started
+        self.router.record(model_name, latency, ok=ok)
+        breaker.record(ok, latency, ticket=ticket)
+        AI_REQUESTS.inc(model=model_name, task=task, outcome='ok' if ok else 'error')
+        AI_LATENCY.observe(latency, model=model_name, task=task)
+        AI_TOKENS.inc(estimate_tokens(prompt), model=model_name, kind='prompt')
+        record_ai_call(latency, prompt_chars=len(prompt), response_chars=response_chars, ok=ok)
+
+    def _end_stream(self, call, ok, streamed_chars):
+        """Records a consumed (or broken) stream that _call_model() returned as last_stream."""
+        model_name, task, breaker, ticket, started, prompt = call
+        self._record_call(model_name, task, breaker, ticket, started, ok=ok, prompt=prompt, response_chars=streamed_chars)
+        self._record_output_tokens(model_name, get_rate_limiter(model_name), streamed_chars // 4)
+
+    @staticmethod
+    def _exhausted(task, calls, last_error):
+        if not calls and isinstance(last_error, CircuitOpenError):
+            get_breaker_metrics().incr("fast_failures")
+        return last_error or RuntimeError(f"No model available for {task}")
+
+    def _record_usage(self, model_name, limiter, response):
+        usage = getattr(response, 'usage_metadata', None)
+        output_tokens = getattr(usage, 'candidates_token_count', 0) if usage else 0
+        self._record_output_tokens(model_name, limiter, output_tokens or estimate_tokens(response.text))
+
+    @staticmethod
+    def _record_output_tokens(model_name, limiter, tokens):
+        limiter.record_tokens(tokens)
+        AI_TOKENS.inc(tokens, model=model_name, kind='output')
+
+    def _build_quiz_prompt(self, language, topic, level, num_questions, include_code):
         # Dynamic instruction based on user choice
         if include_code:
             code_instruction = "Each question MUST include a relevant code snippet that the user must analyze to answer."
         else:
             code_instruction = "Questions should be conceptual. Do NOT include long code snippets."
 
-        prompt = QUIZ_GENERATION_PROMPT.format(
+        return QUIZ_GENERATION_PROMPT.format(
             language=language,
             topic=topic,
             level=level,
@@ -32,19 +244,6 @@ class QuizGenerator:
             code_instruction=code_instruction
         )
 
-        try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config={"response_mime_type": "application/json"}
-            )
-            
-            quiz_data = json.loads(response.text)
-            return quiz_data.get('questions', [])
-
-        except Exception as e:
-            logger.error(f"AI Generation Error: {e}")
-            return []
-
     def generate_explanation(self, question_text, user_answer, correct_answer):
         """
         Generates a concise explanation for why the user was wrong.
@@ -60,31 +259,308 @@ class QuizGenerator:
         """
         
         try:
-            response = self.model.generate_content(prompt)
+            response = self._call_model(prompt, task=TASK_EXPLANATION)
             return response.text.strip()
         except Exception as e:
             return "Unable to generate explanation at this moment."
-        
 
+    def generate_explanations(self, mistakes, max_attempts=2):
+        """
+        Explains a batch of mistakes with a single structured-JSON call.
+        `mistakes` is a list of dicts with id, question_text, user_answer and
+        correct_answer. Returns {id: explanation}; only items missing from a
+        response are retried, and items still missing after `max_attempts`
+        are left out so the caller can try again later.
+        Batches larger than AI_EXPLANATION_BATCH_SIZE are split and the
+        chunks run concurrently on the shared executor.
+        """
+        size = settings.AI_EXPLANATION_BATCH_SIZE
+        chunks = [mistakes[i:i + size] for i in range(0, len(mistakes), size)]
+        if len(chunks) <= 1:
+            return self._explain_batch(mistakes, max_attempts)
+
+        explanations = {}
+        results = get_executor().map(lambda chunk: self._explain_batch(chunk, max_attempts), chunks, default={})
+        for result in results:
+            explanations.update(result)
+        return explanations
+
+    def _explain_batch(self, mistakes, max_attempts):
+        explanations = {}
+        pending = list(mistakes)
+
+        for attempt in range(max_attempts):
+            if not pending:
+                break
+
+            try:
+                response = self._call_model(self._batch_explanation_prompt(pending), json_output=True, task=TASK_EXPLANATION)
+                items = json.loads(response.text).get('explanations', [])
+            except Exception as e:
+                logger.error(f"Batch Explanation Error (attempt {attempt + 1}): {e}")
+                items = []
+
+            pending = self._collect_explanations(items, pending, explanations)
+
+        if pending:
+            logger.warning(f"No explanation returned for {len(pending)} of {len(mistakes)} mistakes")
+        return explanations
+
+    @staticmethod
+    def _batch_explanation_prompt(mistakes):
+        payload = [
+            {
+                "id": m['id'],
+                "question": m['question_text'],
+                "user_answer": m['user_answer'],
+                "correct_answer": m['correct_answer'],
+            }
+            for m in mistakes
+        ]
+        return BATCH_EXPLANATION_PROMPT.format(mistakes=json.dumps(payload, indent=2))
+
+    @staticmethod
+    def _collect_explanations(items, pending, explanations):
+        # Stores usable answers in `explanations`; returns the mistakes still missing
+        wanted = {str(m['id']): m['id'] for m in pending}
+        for item in items:
+            key = str(item.get('id'))
+            text = (item.get('explanation') or '').strip()
+            if key in wanted and text:
+                explanations[wanted[key]] = text
+        return [m for m in pending if m['id'] not in explanations]
 
     def parse_intent(self, user_message):
         """
         Converts natural language into structured quiz parameters.
+        Clear requests are parsed locally and repeated ones come from the
+        intent memo; only new, ambiguous messages go to Gemini.
         """
+        started = time.perf_counter()
+        intent = self.local_intent.resolve(user_message)
+        if intent:
+            self._record_intent('local', started)
+            return intent
+
+        # Near-identical messages reuse an earlier Gemini parse
+        memo_key = self.intent_memo.key_for(self.model_name, user_message)
+        intent = self.intent_memo.get(memo_key)
+        if intent:
+            self._record_intent('memo', started)
+            return intent
+
         prompt = INTENT_PARSING_PROMPT.format(user_message=user_message)
         
         try:
-            response = self.model.generate_content(
-                prompt, 
-                generation_config={"response_mime_type": "application/json"}
-            )
-            return json.loads(response.text)
+            response = self._call_model(prompt, json_output=True, task=TASK_INTENT)
+            intent = json.loads(response.text)
+            self.intent_memo.set(memo_key, intent)
+            return intent
         except Exception as e:
             logger.error(f"Intent Parsing Error: {e}")
             # Fallback defaults
-            return {
-                "language": "General",
-                "topic": "Random",
-                "level": "Intermediate",
-                "count": 5
-            }
\ No newline at end of file
+            return dict(INTENT_DEFAULTS)
+        finally:
+            self._record_intent('llm', started)
+
+    def _record_intent(self, source, started):
+        # Counts and total time per source, for `manage.py intent_stats`
+        elapsed_us = int((time.perf_counter() - started) * 1_000_000)
+        stats = self.local_intent.stats
+        stats.incr(source)
+        stats.incr(f"{source}_us", elapsed_us)
+
+    # ------------------------------------------
+    # Async variants (used by the ASGI views)
+    # ------------------------------------------
+
+    async def agenerate_quiz(self, language, topic, level, num_questions=5, include_code=False, use_cache=True):
+        """Async generate_quiz(): the Gemini wait doesn't hold a thread."""
+        cache_key = self.cache.key_for(self.model_name, language, topic, level, num_questions, include_code)
+        if use_cache:
+            cached = await sync_to_async(self.cache.get)(cache_key)
+            if cached:
+                return cached
+
+        prompt = self._build_quiz_prompt(language, topic, level, num_questions, include_code)
+
+        try:
+            response = await self._acall_model(prompt, json_output=True)
+            questions = json.loads(response.text).get('questions', [])
+            if use_cache:
+                await sync_to_async(self.cache.add)(cache_key, questions)
+            return questions
+
+        except Exception as e:
+            logger.error(f"AI Generation Error: {e}")
+            return (await sync_to_async(self.cache.get_stale)(cache_key) if use_cache else None) or []
+
+    async def astream_quiz(self, language, topic, level, num_questions=5, include_code=False, use_cache=True):
+        """Async stream_quiz(): yields questions as their JSON objects complete."""
+        cache_key = self.cache.key_for(self.model_name, language, topic, level, num_questions, include_code)
+        if use_cache:
+            cached = await sync_to_async(self.cache.get)(cache_key)
+            if cached:
+                for q_data in cached:
+                    yield q_data
+                return
+
+        prompt = self._build_quiz_prompt(language, topic, level, num_questions, include_code)
+        parser = QuestionStreamParser()
+        questions = []
+        streamed_chars = 0
+        call, failed = None, False
+
+        try:
+            response = await self._acall_model(prompt, json_output=True, stream=True)
+            call = self.last_stream
+            async for chunk in response:
+                streamed_chars += len(chunk.text)
+                for q_data in parser.feed(chunk.text):
+                    questions.append(q_data)
+                    yield q_data
+
+        except Exception as e:
+            failed = True
+            logger.error(f"AI Streaming Error: {e}")
+            if not questions and use_cache:
+                for q_data in await sync_to_async(self.cache.get_stale)(cache_key) or []:
+                    yield q_data
+            return
+
+        finally:
+            if call:
+                await sync_to_async(self._end_stream)(call, ok=not failed, streamed_chars=streamed_chars)
+
+        if use_cache:
+            await sync_to_async(self.cache.add)(cache_key, questions)
+
+    async def agenerate_explanations(self, mistakes, max_attempts=2):
+        """Async generate_explanations(): chunks run concurrently on the event loop."""
+        size = settings.AI_EXPLANATION_BATCH_SIZE
+        chunks = [mistakes[i:i + size] for i in range(0, len(mistakes), size)]
+
+        explanations = {}
+        results = await asyncio.gather(*(self._aexplain_batch(chunk, max_attempts) for chunk in chunks))
+        for result in results:
+            explanations.update(result)
+        return explanations
+
+    async def aiter_explanations(self, mistakes, batch_size, max_attempts=2):
+        """
+        agenerate_explanations() in chunks of `batch_size`, yielding each
+        chunk's {id: explanation} as soon as it completes (for progress streams).
+        """
+        chunks = [mistakes[i:i + batch_size] for i in range(0, len(mistakes), batch_size)]
+        for next_done in asyncio.as_completed([self._aexplain_batch(chunk, max_attempts) for chunk in chunks]):
+            yield await next_done
+
+    async def _aexplain_batch(self, mistakes, max_attempts):
+        explanations = {}
+        pending = list(mistakes)
+
+        for attempt in range(max_attempts):
+            if not pending:
+                break
+
+            try:
+                response = await self._acall_model(
+                    self._batch_explanation_prompt(pending), json_output=True, task=TASK_EXPLANATION
+                )
+                items = json.loads(response.text).get('explanations', [])
+            except Exception as e:
+                logger.error(f"Batch Explanation Error (attempt {attempt + 1}): {e}")
+                items = []
+
+            pending = self._collect_explanations(items, pending, explanations)
+
+        if pending:
+            logger.warning(f"No explanation returned for {len(pending)} of {len(mistakes)} mistakes")
+        return explanations
+
+    async def aparse_intent(self, user_message):
+        """Async parse_intent()."""
+        started = time.perf_counter()
+        # The local parser may look up Topic rows
+        intent = await sync_to_async(self.local_intent.resolve)(user_message)
+        if intent:
+            await sync_to_async(self._record_intent)('local', started)
+            return intent
+
+        memo_key = self.intent_memo.key_for(self.model_name, user_message)
+        intent = await sync_to_async(self.intent_memo.get)(memo_key)
+        if intent:
+            await sync_to_async(self._record_intent)('memo', started)
+            return intent
+
+        prompt = INTENT_PARSING_PROMPT.format(user_message=user_message)
+
+        try:
+            response = await self._acall_model(prompt, json_output=True, task=TASK_INTENT)
+            intent = json.loads(response.text)
+            await sync_to_async(self.intent_memo.set)(memo_key, intent)
+            return intent
+        except Exception as e:
+            logger.error(f"Intent Parsing Error: {e}")
+            return dict(INTENT_DEFAULTS)
+        finally:
+            await sync_to_async(self._record_intent)('llm', started)
+
+    async def _acall_model(self, prompt, json_output=False, stream=False, task=TASK_QUIZ):
+        """Async _call_model() using the SDK's generate_content_async."""
+        generation_config = {"response_mime_type": "application/json"} if json_output else None
+        self.last_model = self.last_stream = None
+        budget = get_retry_budget()
+        budget.record_request()
+        calls, tried, last_error = 0, set(), None
+
+        # The router may (rarely) reload the AIModel list
+        candidates = await sync_to_async(self._candidates)(task)
+        for model_name in self._attempt_order(candidates):
+            if calls >= self.retry_config["MAX_ATTEMPTS"]:
+                break
+            breaker = get_breaker(model_name)
+            if not breaker.is_available():
+                last_error = last_error or CircuitOpenError(f"Circuit open for {model_name}")
+                continue
+            if model_name in tried and self.interactive:
+                continue
+            if calls and not await sync_to_async(budget.try_retry)():
+                break
+            if model_name in tried:
+                await asyncio.sleep(budget.backoff(calls))
+            tried.add(model_name)
+
+            limiter = get_rate_limiter(model_name)
+            try:
+                await limiter.aacquire(estimate_tokens(prompt), timeout=self._acquire_timeout())
+            except RateLimitExceeded as e:
+                last_error = e
+                continue
+            ticket = breaker.allow()
+            if ticket is None:
+                last_error = CircuitOpenError(f"Circuit open for {model_name}")
+                continue
+
+            calls += 1
+            started = time.monotonic()
+            try:
+                model = get_generative_model(model_name)
+                response = await model.generate_content_async(prompt, generation_config=generation_config, stream=stream)
+            except Exception as e:
+                await sync_to_async(self._record_call)(model_name, task, breaker, ticket, started, ok=False, prompt=prompt)
+                logger.warning(f"{model_name} failed ({task}), failing over: {e}")
+                last_error = e
+                continue
+
+            self.last_model = model_name
+            if stream:
+                self.last_stream = (model_name, task, breaker, ticket, started, prompt)
+                return response
+            await sync_to_async(self._record_call)(
+                model_name, task, breaker, ticket, started, ok=True, prompt=prompt, response_chars=len(response.text),
+            )
+            self._record_usage(model_name, limiter, response)
+            return response
+
+        raise await sync_to_async(self._exhausted)(task, calls, last_error)
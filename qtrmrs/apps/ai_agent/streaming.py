@@ -0,0 +1,93 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionStreamParser:
+    """
+    Incrementally extracts complete objects from the "questions" array of a
+    streamed JSON response, so each question can be used as soon as its
+    closing brace arrives instead of waiting for the whole document.
+    """
+
+    def __init__(self, array_key='questions'):
+        self.marker = f'"{array_key}"'
+        self.buffer = ''
+        self.pos = 0
+        self.in_array = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.start = None
+
+    def feed(self, chunk):
+        """Appends streamed text and returns the objects completed by it."""
+        self.buffer += chunk or ''
+        completed = []
+
+        if not self.in_array and not self._enter_array():
+            return completed
+
+        buffer = self.buffer
+        i = self.pos
+        while i < len(buffer) and not self.done:
+            char = buffer[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                if self.depth == 0:
+                    self.start = i
+                self.depth += 1
+            elif char == '}':
+                self.depth -= 1
+                if self.depth == 0 and self.start is not None:
+                    item = self._decode(buffer[self.start:i + 1])
+                    if item is not None:
+                        completed.append(item)
+                    self.start = None
+            elif char == ']' and self.depth == 0:
+                self.done = True
+            i += 1
+
+        self.pos = i
+        self._compact()
+        return completed
+
+    def _enter_array(self):
+        marker_at = self.buffer.find(self.marker)
+        if marker_at == -1:
+            return False
+        bracket_at = self.buffer.find('[', marker_at + len(self.marker))
+        if bracket_at == -1:
+            return False
+
+        self.in_array = True
+        self.pos = bracket_at + 1
+        return True
+
+    def _compact(self):
+        # Drop text that can no longer be part of a pending object
+        cut = self.start if self.start is not None else self.pos
+        if cut > 0:
+            self.buffer = self.buffer[cut:]
+            self.pos -= cut
+            if self.start is not None:
+                self.start = 0
+
+    @staticmethod
+    def _decode(raw):
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            logger.warning(f"Skipping malformed streamed question: {e}")
+            return None
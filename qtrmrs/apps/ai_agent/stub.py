@@ -0,0 +1,105 @@
+import asyncio
+import json
+import random
+import re
+import time
+
+QUESTION_COUNT_RE = re.compile(r"Generate exactly (\d+) questions")
+MISTAKE_ID_RE = re.compile(r'"id": (\d+),\s*"question"')
+
+STREAM_CHUNKS = 8
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class InjectedError(Exception):
+    """A failure injected by an offline backend (AI_FAULT_INJECTION), standing in for an API error."""
+
+
+class StubGenerativeModel:
+    """
+    Offline stand-in for genai.GenerativeModel (AI_BACKEND = 'stub').
+    Answers every prompt used by QuizGenerator with well-formed canned
+    content after an artificial latency, for load tests and local work.
+    A share of calls can be made to fail or run slow (AI_FAULT_INJECTION).
+    """
+
+    def __init__(self, model_name, latency=1.0, faults=None):
+        self.model_name = f"models/{model_name}"
+        self.latency = latency
+        self.faults = faults or {}
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        text, latency = self.reply(prompt, generation_config)
+        latency = self._inject(latency)
+        if stream:
+            return self._stream(text, latency)
+        time.sleep(latency)
+        return StubResponse(text)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        text, latency = self.reply(prompt, generation_config)
+        latency = self._inject(latency)
+        if stream:
+            return self._astream(text, latency)
+        await asyncio.sleep(latency)
+        return StubResponse(text)
+
+    def reply(self, prompt, generation_config=None):
+        """(response text, seconds it takes) for a prompt."""
+        return self.respond(prompt), self.latency
+
+    def _inject(self, latency):
+        if random.random() < self.faults.get("ERROR_RATE", 0):
+            raise InjectedError(f"503 Injected failure from {self.model_name}")
+        if random.random() < self.faults.get("SLOW_RATE", 0):
+            return latency + self.faults.get("SLOW_SECONDS", 0)
+        return latency
+
+    def _stream(self, text, latency):
+        for chunk in self._chunks(text):
+            time.sleep(latency / STREAM_CHUNKS)
+            yield StubResponse(chunk)
+
+    async def _astream(self, text, latency):
+        for chunk in self._chunks(text):
+            await asyncio.sleep(latency / STREAM_CHUNKS)
+            yield StubResponse(chunk)
+
+    @staticmethod
+    def _chunks(text):
+        size = max(1, len(text) // STREAM_CHUNKS + 1)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    @staticmethod
+    def respond(prompt):
+        """Canned output matching the shape each prompt in prompts.py asks for."""
+        count = QUESTION_COUNT_RE.search(prompt)
+        if count:
+            questions = [
+                {
+                    "text": f"Stub question {i + 1}: which option is correct?",
+                    "code_snippet": "",
+                    "options": ["Option A", "Option B", "Option C", "Option D"],
+                    "correct_answer": "Option A",
+                    "explanation": "Option A is correct in the stub backend.",
+                }
+                for i in range(int(count.group(1)))
+            ]
+            return json.dumps({"questions": questions})
+
+        if '"explanations"' in prompt:
+            explanations = [
+                {"id": int(mistake_id), "explanation": "You selected a stub option; the stub answer is Option A."}
+                for mistake_id in MISTAKE_ID_RE.findall(prompt)
+            ]
+            return json.dumps({"explanations": explanations})
+
+        if "Analyze the user's request" in prompt:
+            return json.dumps({"language": "Python", "topic": "General Knowledge", "level": "Intermediate", "count": 5})
+
+        return "You selected a stub option; the stub answer is Option A."
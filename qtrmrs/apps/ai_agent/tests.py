@@ -1,3 +1,475 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from apps.quizzes.models import AIModel, Topic
+from .cache import INTENT_MEMO_DEFAULTS, QUIZ_CACHE_DEFAULTS, CacheStats, IntentMemo, QuizCache, normalize_message
+from .client import reset_clients
+from .intent import LOCAL_INTENT_DEFAULTS, LocalIntentParser
+from .resilience import BREAKER_DEFAULTS, CLOSED, HALF_OPEN, OPEN, CircuitBreaker, get_breaker
+from .router import ROUTER_DEFAULTS, TASK_INTENT, TASK_QUIZ, ModelRouter
+from .services import QuizGenerator
+from .replay import REPLAY_DEFAULTS, RecordingGenerativeModel, RecordingStore, ReplayGenerativeModel, ReplayMissError
+from .streaming import QuestionStreamParser
+from .stub import MISTAKE_ID_RE, StubGenerativeModel, StubResponse
+from .views import _order_for
+
+
+def quiz(label):
+    return [{'text': f"{label} question", 'options': ['a', 'b'], 'correct_answer': 'a'}]
+
+
+class QuizCacheTests(TestCase):
+    def setUp(self):
+        caches['ai'].clear()
+        config = {**QUIZ_CACHE_DEFAULTS, 'VARIANTS': 2}
+        # Separate instances have separate local tiers, like two gunicorn workers
+        self.workers = [QuizCache(config=config), QuizCache(config=config)]
+        self.key = self.workers[0].key_for('model', 'python', 'loops', 'beginner', 5, False)
+
+    def texts(self, questions):
+        return {q['text'] for q in questions}
+
+    def test_misses_until_pool_is_full(self):
+        cache = self.workers[0]
+        self.assertIsNone(cache.get(self.key))
+        cache.add(self.key, quiz("first"))
+        self.assertIsNone(cache.get(self.key))
+        self.assertEqual(self.texts(cache.get_stale(self.key)), {"first question"})
+        cache.add(self.key, quiz("second"))
+        self.assertIn(self.texts(cache.get(self.key)), ({"first question"}, {"second question"}))
+
+    def test_workers_with_stale_local_tiers_keep_each_others_variants(self):
+        config = {**QUIZ_CACHE_DEFAULTS, 'VARIANTS': 3}
+        first, second = QuizCache(config=config), QuizCache(config=config)
+        first.add(self.key, quiz("first"))
+        # second's local tier now holds a pool without the variant first adds next
+        second.get(self.key)
+        first.add(self.key, quiz("second"))
+        second.add(self.key, quiz("third"))
+
+        pool = {q['text'] for questions in QuizCache(config=config)._pool(self.key) for q in questions}
+        self.assertEqual(pool, {"first question", "second question", "third question"})
+
+    def test_full_pool_replaces_a_variant(self):
+        cache = self.workers[0]
+        for label in ("first", "second", "third"):
+            cache.add(self.key, quiz(label))
+        pool = [q['text'] for questions in cache._pool(self.key) for q in questions]
+        self.assertEqual(len(pool), 2)
+        self.assertIn("third question", pool)
+
+
+class CacheStatsTests(TestCase):
+    def test_increments_are_batched_and_summed_across_workers(self):
+        workers = [CacheStats("test:v1"), CacheStats("test:v1")]
+        with self.assertNumQueries(0):
+            workers[0].incr("hits")
+            workers[0].incr("hits")
+            workers[1].incr("misses")
+
+        workers[0].flush()
+        # Unflushed counts of this process are included
+        self.assertEqual(workers[1].snapshot(), {'hits': 2, 'misses': 1, 'hit_rate': 0.667})
+        workers[1].flush()
+        self.assertEqual(workers[0].snapshot(), {'hits': 2, 'misses': 1, 'hit_rate': 0.667})
+
+        workers[0].reset()
+        self.assertEqual(workers[0].snapshot()['hits'], 0)
+
+    def test_per_process_stats(self):
+        stats = CacheStats("test:local", shared=False)
+        stats.incr("hits")
+        with self.assertNumQueries(0):
+            self.assertEqual(stats.snapshot(), {'hits': 1, 'misses': 0, 'hit_rate': 1.0})
+
+
+class IntentMemoTests(TestCase):
+    message = "Something fun for the weekend?"
+
+    def setUp(self):
+        caches['ai'].clear()
+        self.memo = IntentMemo(config=INTENT_MEMO_DEFAULTS)
+        self.intent = {'language': 'Python', 'topic': 'Loops', 'difficulty': 'beginner', 'count': 5}
+
+    def test_normalization(self):
+        self.assertEqual(normalize_message("Quiz me on React hooks!"), normalize_message("  quiz ME on react,  hooks "))
+        self.assertEqual(
+            self.memo.key_for('model', "Quiz me on React hooks!"), self.memo.key_for('model', "quiz me on react hooks")
+        )
+        keys = {normalize_message(f"Quiz me on {language}") for language in ("C++", "C#", "C")}
+        self.assertEqual(len(keys), 3)
+
+    def test_hits_and_misses(self):
+        key = self.memo.key_for('model', self.message)
+        self.assertIsNone(self.memo.get(key))
+        self.memo.set(key, self.intent)
+
+        cached = self.memo.get(key)
+        cached['count'] = 10
+        self.assertEqual(self.memo.get(key), self.intent)
+        self.assertEqual(self.memo.stats.snapshot(), {'hits': 2, 'misses': 1, 'hit_rate': 0.667})
+
+    def test_failed_parses_are_not_memoized(self):
+        generator = QuizGenerator()
+        generator.intent_memo = self.memo
+        replies = [ConnectionError("down"), StubResponse(json.dumps(self.intent))]
+        with mock.patch.object(QuizGenerator, '_call_model', side_effect=replies) as call:
+            fallback = generator.parse_intent(self.message)
+            self.assertIsNone(self.memo.get(self.memo.key_for(generator.model_name, self.message)))
+
+            self.assertEqual(generator.parse_intent(self.message), self.intent)
+            self.assertEqual(generator.parse_intent("something fun for the weekend"), self.intent)
+        self.assertNotEqual(fallback, self.intent)
+        self.assertEqual(call.call_count, 2)
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        caches['ai'].clear()
+        config = {**BREAKER_DEFAULTS, 'MIN_CALLS': 2, 'OPEN_SECONDS': 0}
+        self.breaker = CircuitBreaker('model', config=config)
+
+    def trip(self):
+        tickets = [self.breaker.allow(), self.breaker.allow()]
+        for ticket in tickets:
+            self.breaker.record(False, ticket=ticket)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_only_the_probe_decides_while_half_open(self):
+        straggler = self.breaker.allow()
+        self.trip()
+        probe = self.breaker.allow()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertIsNone(self.breaker.allow())
+
+        # A call admitted before the circuit opened finishing late changes nothing
+        self.breaker.record(True, ticket=straggler)
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+        self.breaker.record(True, ticket=probe)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_failed_probe_reopens(self):
+        self.trip()
+        probe = self.breaker.allow()
+        self.breaker.record(False, ticket=probe)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_transitions_are_published(self):
+        self.trip()
+        self.assertEqual(caches['ai'].get('breaker:v1:state:model'), OPEN)
+
+
+class QuestionStreamParserTests(TestCase):
+    def feed_all(self, text, size):
+        parser = QuestionStreamParser()
+        items = []
+        for i in range(0, len(text), size):
+            items.extend(parser.feed(text[i:i + size]))
+        return items
+
+    def test_objects_split_across_chunks(self):
+        questions = [{'text': 'Braces { in "strings" }', 'options': ['[', ']']}, {'text': 'Second'}]
+        text = json.dumps({'questions': questions, 'extra': [{'ignored': True}]})
+        for size in (1, 3, 7, len(text)):
+            self.assertEqual(self.feed_all(text, size), questions)
+
+    def test_malformed_object_is_skipped(self):
+        text = '{"questions": [{"text": "ok"}, {"text": tru}, {"text": "also ok"}]}'
+        self.assertEqual(self.feed_all(text, 5), [{'text': 'ok'}, {'text': 'also ok'}])
+
+
+class FailingStream:
+    """A model whose stream breaks after its first question."""
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        return self._stream()
+
+    def _stream(self):
+        yield StubResponse('{"questions": [{"text": "First"},')
+        raise ConnectionError("stream reset")
+
+
+@override_settings(AI_BACKEND='stub', AI_STUB_LATENCY=0, AI_FAULT_INJECTION={})
+class QuizGeneratorStreamTests(TestCase):
+    def setUp(self):
+        caches['ai'].clear()
+        reset_clients()
+        self.addCleanup(reset_clients)
+        breakers = mock.patch.dict('apps.ai_agent.resilience._breakers', clear=True)
+        breakers.start()
+        self.addCleanup(breakers.stop)
+        self.generator = QuizGenerator()
+        # Health windows of its own, not the process-wide router's
+        self.generator.router = ModelRouter()
+
+    def stream(self):
+        return list(self.generator.stream_quiz('Python', 'Loops', 'Beginner', num_questions=3, use_cache=False))
+
+    def test_streams_questions(self):
+        self.assertEqual(len(self.stream()), 3)
+        self.assertEqual(list(get_breaker(self.generator.last_model)._calls), [False])
+
+    def test_broken_stream_is_recorded_once_as_a_failure(self):
+        with mock.patch('apps.ai_agent.services.get_generative_model', return_value=FailingStream()):
+            self.assertEqual(self.stream(), [{'text': 'First'}])
+        self.assertEqual(list(get_breaker(self.generator.last_model)._calls), [True])
+        self.assertEqual(self.generator.router.health(self.generator.last_model).snapshot()['error_rate'], 1.0)
+
+    def test_stream_closed_early_is_a_success(self):
+        stream = self.generator.stream_quiz('Python', 'Loops', 'Beginner', num_questions=3, use_cache=False)
+        next(stream)
+        stream.close()
+        self.assertEqual(list(get_breaker(self.generator.last_model)._calls), [False])
+
+    def test_no_tokens_charged_when_no_call_was_made(self):
+        self.stream()
+        with (
+            mock.patch('apps.ai_agent.services.get_generative_model', side_effect=ConnectionError("down")),
+            mock.patch.object(QuizGenerator, '_record_output_tokens') as record_tokens,
+        ):
+            self.assertEqual(self.stream(), [])
+        self.assertIsNone(self.generator.last_model)
+        record_tokens.assert_not_called()
+
+
+class ScriptedExplainer:
+    """
+    Stands in for _call_model on explanation batches: records the mistake
+    ids each call asked about and answers with the next scripted reply
+    (a list of items, or raw text), explaining everything once it runs out.
+    """
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.asked = []
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt, **kwargs):
+        ids = [int(i) for i in MISTAKE_ID_RE.findall(prompt)]
+        with self.lock:
+            self.asked.append(ids)
+            reply = self.replies.pop(0) if self.replies else [{'id': i, 'explanation': f"Because {i}"} for i in ids]
+        return StubResponse(reply if isinstance(reply, str) else json.dumps({'explanations': reply}))
+
+
+def mistakes(*ids):
+    return [{'id': i, 'question_text': f"Q{i}", 'user_answer': 'a', 'correct_answer': 'b'} for i in ids]
+
+
+class ExplanationBatchTests(TestCase):
+    def explain(self, model, items, **kwargs):
+        with mock.patch.object(QuizGenerator, '_call_model', side_effect=model):
+            return QuizGenerator().generate_explanations(items, **kwargs)
+
+    def test_answers_are_matched_by_id_and_only_missing_ones_retried(self):
+        # Out of order, a string id, a blank explanation and an id that wasn't asked for
+        model = ScriptedExplainer([
+            {'id': '3', 'explanation': "Three"}, {'id': 1, 'explanation': "  "}, {'id': 9, 'explanation': "Nine"},
+        ])
+        explanations = self.explain(model, mistakes(1, 2, 3))
+        self.assertEqual(model.asked, [[1, 2, 3], [1, 2]])
+        self.assertEqual(explanations, {1: "Because 1", 2: "Because 2", 3: "Three"})
+
+    def test_malformed_reply_is_retried(self):
+        model = ScriptedExplainer('{"explanations": [')
+        self.assertEqual(self.explain(model, mistakes(1, 2)), {1: "Because 1", 2: "Because 2"})
+        self.assertEqual(model.asked, [[1, 2], [1, 2]])
+
+    def test_items_still_missing_after_max_attempts_are_left_out(self):
+        model = ScriptedExplainer([{'id': 1, 'explanation': "One"}], [], [])
+        self.assertEqual(self.explain(model, mistakes(1, 2), max_attempts=3), {1: "One"})
+        self.assertEqual(model.asked, [[1, 2], [2], [2]])
+
+    @override_settings(AI_EXPLANATION_BATCH_SIZE=2)
+    def test_large_batches_are_split_into_concurrent_chunks(self):
+        model = ScriptedExplainer()
+        explanations = self.explain(model, mistakes(1, 2, 3, 4, 5))
+        self.assertEqual(sorted(model.asked), [[1, 2], [3, 4], [5]])
+        self.assertEqual(sorted(explanations), [1, 2, 3, 4, 5])
+
+
+class RecordReplayTests(TestCase):
+    prompt = "Explain closures"
+    config = {'response_mime_type': 'application/json'}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.gemini = mock.Mock(model_name='models/main')
+
+    def replayer(self, on_miss='stub'):
+        # A fresh store, like another process reading the recordings from disk
+        config = {**REPLAY_DEFAULTS, 'LATENCY': 0, 'ON_MISS': on_miss}
+        return ReplayGenerativeModel('main', RecordingStore(self.directory), config, stub_latency=0)
+
+    def test_recorded_response_is_replayed(self):
+        self.gemini.generate_content.return_value = StubResponse('{"recorded": true}')
+        recorder = RecordingGenerativeModel(self.gemini, RecordingStore(self.directory))
+        self.assertEqual(recorder.generate_content(self.prompt, generation_config=self.config).text, '{"recorded": true}')
+
+        replayer = self.replayer(on_miss='error')
+        self.assertEqual(replayer.generate_content(self.prompt, generation_config=self.config).text, '{"recorded": true}')
+        # The generation config is part of the key
+        with self.assertRaises(ReplayMissError):
+            replayer.generate_content(self.prompt)
+
+    def test_recorded_stream_is_replayed_whole(self):
+        self.gemini.generate_content.return_value = iter([StubResponse('{"a": '), StubResponse('1}')])
+        recorder = RecordingGenerativeModel(self.gemini, RecordingStore(self.directory))
+        self.assertEqual([c.text for c in recorder.generate_content(self.prompt, stream=True)], ['{"a": ', '1}'])
+
+        replayed = self.replayer().generate_content(self.prompt, stream=True)
+        self.assertEqual("".join(c.text for c in replayed), '{"a": 1}')
+
+    def test_only_the_latest_variants_are_kept(self):
+        store = RecordingStore(self.directory, variants=2)
+        key = store.key_for(self.prompt)
+        for text in ("one", "two", "three"):
+            store.add(key, 'main', self.prompt, text, latency=0.1)
+        self.assertEqual({RecordingStore(self.directory).get(key)['text'] for _ in range(20)}, {"two", "three"})
+
+    def test_miss_falls_back_to_the_stub(self):
+        self.assertEqual(
+            self.replayer().generate_content(self.prompt).text, StubGenerativeModel.respond(self.prompt)
+        )
+
+
+class ModelRouterTests(TestCase):
+    def setUp(self):
+        for name, is_default in (('slow', False), ('main', True), ('fast', False)):
+            AIModel.objects.create(display_name=name, model_name=name, is_default=is_default)
+        self.router = ModelRouter(config={**ROUTER_DEFAULTS, 'MIN_SAMPLES': 3})
+
+    def observe(self, name, latency, ok=True, times=3):
+        for _ in range(times):
+            self.router.record(name, latency, ok=ok)
+
+    def test_default_first_then_fastest(self):
+        self.observe('slow', 5.0)
+        self.observe('fast', 1.0)
+        self.assertEqual(self.router.candidates(TASK_QUIZ), ['main', 'fast', 'slow'])
+
+    def test_failing_or_slow_models_go_last(self):
+        self.observe('main', 1.0, ok=False)
+        self.observe('fast', ROUTER_DEFAULTS['SLOW_P95'] + 1)
+        self.assertEqual(self.router.candidates(TASK_QUIZ), ['slow', 'main', 'fast'])
+
+    def test_too_few_samples_keep_the_configured_order(self):
+        self.observe('main', 1.0, ok=False, times=2)
+        self.assertEqual(self.router.primary(TASK_QUIZ), 'main')
+
+    def test_inactive_models_and_other_tasks_are_skipped(self):
+        AIModel.objects.filter(model_name='slow').update(is_active=False)
+        AIModel.objects.filter(model_name='fast').update(tasks='intent, explanation')
+        self.assertEqual(self.router.candidates(TASK_QUIZ), ['main'])
+        self.assertEqual(self.router.candidates(TASK_INTENT), ['main', 'fast'])
+
+    def test_default_model_when_none_is_active(self):
+        AIModel.objects.update(is_active=False)
+        self.assertEqual(self.router.candidates(TASK_QUIZ), [ROUTER_DEFAULTS['DEFAULT_MODEL']])
+
+
+class FailoverTests(TestCase):
+    def setUp(self):
+        AIModel.objects.create(display_name="Main", model_name='main', is_default=True)
+        AIModel.objects.create(display_name="Backup", model_name='backup')
+        breakers = mock.patch.dict('apps.ai_agent.resilience._breakers', clear=True)
+        breakers.start()
+        self.addCleanup(breakers.stop)
+        self.generator = QuizGenerator()
+        self.generator.router = ModelRouter()
+
+    def test_fails_over_to_the_next_candidate(self):
+        broken = mock.Mock(**{'generate_content.side_effect': ConnectionError("down")})
+        working = mock.Mock(**{'generate_content.return_value': StubResponse("ok")})
+        models = {'main': broken, 'backup': working}
+        with mock.patch('apps.ai_agent.services.get_generative_model', side_effect=models.get):
+            self.assertEqual(self.generator._call_model("prompt").text, "ok")
+
+        self.assertEqual(self.generator.last_model, 'backup')
+        self.assertEqual(list(get_breaker('main')._calls), [True])
+        snapshot = self.generator.router.snapshot()
+        self.assertEqual((snapshot['main']['error_rate'], snapshot['backup']['error_rate']), (1.0, 0.0))
+
+
+@override_settings(AI_EXECUTOR={'MAX_WORKERS': 2, 'TIMEOUT': 60, 'INTERACTIVE_TIMEOUT': 2})
+class InteractiveGeneratorTests(TestCase):
+    def setUp(self):
+        caches['ai'].clear()
+        breakers = mock.patch.dict('apps.ai_agent.resilience._breakers', clear=True)
+        breakers.start()
+        self.addCleanup(breakers.stop)
+        self.limiter = mock.Mock()
+        patches = [
+            mock.patch('apps.ai_agent.services.get_rate_limiter', return_value=self.limiter),
+            mock.patch('apps.ai_agent.services.get_generative_model', side_effect=ConnectionError("down")),
+            mock.patch('apps.ai_agent.services.time.sleep'),
+        ]
+        self.sleep = [p.start() for p in patches][-1]
+        for p in patches:
+            self.addCleanup(p.stop)
+
+    def generate(self, generator):
+        return generator.generate_quiz('Python', 'Loops', 'Beginner', num_questions=1)
+
+    def test_fails_fast_and_falls_back_to_cached_variants(self):
+        generator = QuizGenerator(interactive=True)
+        key = generator.cache.key_for(generator.model_name, 'Python', 'Loops', 'Beginner', 1, False)
+        # One variant: not enough to be served fresh, but a fallback
+        generator.cache.add(key, quiz('stale'))
+
+        self.assertEqual(self.texts(generator), {'stale question'})
+        self.sleep.assert_not_called()
+        self.assertEqual({c.kwargs['timeout'] for c in self.limiter.acquire.call_args_list}, {2})
+
+    def test_background_callers_back_off_and_wait(self):
+        self.assertEqual(self.generate(QuizGenerator()), [])
+        self.sleep.assert_called()
+        self.assertEqual({c.kwargs['timeout'] for c in self.limiter.acquire.call_args_list}, {60})
+
+    def texts(self, generator):
+        return {q['text'] for q in self.generate(generator)}
+
+
+class LocalIntentParserTests(TestCase):
+    def setUp(self):
+        self.parser = LocalIntentParser(config={**LOCAL_INTENT_DEFAULTS, 'SHARED_STATS': False})
+        Topic.objects.create(language='Python', name='Loops')
+
+    def test_known_topic_is_resolved_locally(self):
+        intent = self.parser.resolve("easy python loops quiz, 5 questions")
+        self.assertEqual(intent, {'language': 'Python', 'topic': 'Loops', 'level': 'Beginner', 'count': 5})
+
+    def test_free_text_topic_is_kept_as_phrased_and_left_to_gemini(self):
+        intent, confidence = self.parser.parse("python decorators and generators")
+        self.assertEqual(intent['topic'], 'Decorators and generators')
+        self.assertLess(confidence, LOCAL_INTENT_DEFAULTS['MIN_CONFIDENCE'])
+        self.assertIsNone(self.parser.resolve("python quiz for an interview tomorrow"))
+
+    def test_request_resolves_locally_once_its_topic_is_seeded(self):
+        message = "hard quiz on python decorators, 7 questions"
+        self.assertIsNone(self.parser.resolve(message))
+
+        Topic.objects.create(language='Python', name='Decorators')
+        Topic.objects.create(language='JavaScript', name='React Hooks')
+        parser = LocalIntentParser(config={**LOCAL_INTENT_DEFAULTS, 'SHARED_STATS': False})
+        self.assertEqual(
+            parser.resolve(message), {'language': 'Python', 'topic': 'Decorators', 'level': 'Expert', 'count': 7},
+        )
+        self.assertEqual(parser.resolve("quiz me on react hooks")['topic'], 'React Hooks')
+
+    def test_out_of_range_count_is_left_to_gemini(self):
+        intent, confidence = self.parser.parse("css flexbox quiz, 20 questions")
+        self.assertEqual(intent['count'], 20)
+        self.assertLess(confidence, LOCAL_INTENT_DEFAULTS['MIN_CONFIDENCE'])
+
+    def test_chat_count_from_gemini_is_sanitized(self):
+        for count, expected in (("7", 7), (50, 10), (0, 1), ("five", 5), (None, 5)):
+            self.assertEqual(_order_for(None, {'count': count}).num_questions, expected)
@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+process_chat_message = views.process_chat_message_async if settings.AI_ASYNC_VIEWS else views.process_chat_message
+
 urlpatterns = [
     path('', views.chat_interface, name='chat_interface'),
-    path('send/', views.process_chat_message, name='chat_process'),
+    path('send/', process_chat_message, name='chat_process'),
 ]
\ No newline at end of file
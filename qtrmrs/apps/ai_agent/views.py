@@ -1,10 +1,12 @@
+import time
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
-from django.db import transaction
 from django.http import HttpResponse
+from .intent import DEFAULT_COUNT, MAX_COUNT
 from .services import QuizGenerator
-from apps.quizzes.models import Quiz, Question, Option
+from apps.quizzes.services import QuizOrder
 
 @login_required
 def chat_interface(request):
@@ -20,55 +22,68 @@ def process_chat_message(request):
     3. Generates Quiz.
     4. Redirects to Player.
     """
+    request_started = time.monotonic()
     user_message = request.POST.get('message', '')
     
     if not user_message.strip():
         return HttpResponse("Please type something.", status=400)
 
-    generator = QuizGenerator()
+    generator = QuizGenerator(interactive=True)
     
     # 1. Parse Intent (What does the user want?)
-    params = generator.parse_intent(user_message)
+    order = _order_for(request.user, generator.parse_intent(user_message))
+
+    # 2. Take what the question bank has, generate only the rest
+    order.plan(generator)
+    generated = generator.generate_quiz(**order.generation) if order.generates_now else []
+
+    # 3. Save to DB; remaining questions stream in while the user plays
+    quiz = order.save(generated)
+    if quiz is None or (order.streaming and not order.stream(quiz, generator, started=request_started)):
+        return _chat_error(request)
+
+    # 4. Redirect to Player
+    response = HttpResponse()
+    response['HX-Redirect'] = f"/quiz/play/{quiz.id}/"
+    return response
+
+@login_required
+@require_http_methods(["POST"])
+async def process_chat_message_async(request):
+    """process_chat_message for uvicorn (see AI_ASYNC_VIEWS)."""
+    request_started = time.monotonic()
+    user_message = request.POST.get('message', '')
     
-    # 2. Generate Content based on parsed params
-    questions_data = generator.generate_quiz(
-        language=params.get('language'),
-        topic=params.get('topic'),
-        level=params.get('level'),
-        num_questions=params.get('count', 5)
-    )
+    if not user_message.strip():
+        return HttpResponse("Please type something.", status=400)
 
-    if not questions_data:
-        return render(request, 'components/chat_error.html', {
-            'message': "I couldn't generate a quiz for that. Try being more specific."
-        })
+    user = await request.auser()
+    generator = await sync_to_async(QuizGenerator)(interactive=True)
+    order = _order_for(user, await generator.aparse_intent(user_message))
 
-    # 3. Save to DB
-    with transaction.atomic():
-        quiz = Quiz.objects.create(
-            user=request.user,
-            language=params.get('language'),
-            topic_description=f"{params['language']}: {params['topic']}",
-            difficulty=params.get('level').lower(),
-            total_questions=len(questions_data),
-            model_used="Chat Agent"
-        )
+    await sync_to_async(order.plan)(generator)
+    generated = await generator.agenerate_quiz(**order.generation) if order.generates_now else []
 
-        for q_data in questions_data:
-            question = Question.objects.create(
-                quiz=quiz,
-                text=q_data['text'],
-                explanation=q_data.get('explanation', '')
-            )
-            
-            for opt_text in q_data['options']:
-                Option.objects.create(
-                    question=question,
-                    text=opt_text,
-                    is_correct=(opt_text == q_data['correct_answer'])
-                )
+    quiz = await sync_to_async(order.save)(generated)
+    if quiz is None or (order.streaming and not await order.astream(quiz, generator, started=request_started)):
+        return _chat_error(request)
 
-    # 4. Redirect to Player
     response = HttpResponse()
     response['HX-Redirect'] = f"/quiz/play/{quiz.id}/"
-    return response
\ No newline at end of file
+    return response
+
+def _order_for(user, params):
+    try:
+        # Gemini's JSON can carry "five", null or 50 as well
+        count = max(1, min(MAX_COUNT, int(params.get('count', DEFAULT_COUNT))))
+    except (TypeError, ValueError):
+        count = DEFAULT_COUNT
+    return QuizOrder(
+        user, params.get('language'), params.get('topic'), params.get('level'), count,
+        source='chat', model_used="Chat Agent",
+    )
+
+def _chat_error(request):
+    return render(request, 'components/chat_error.html', {
+        'message': "I couldn't generate a quiz for that. Try being more specific."
+    })
@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.core'
\ No newline at end of file
+    name = 'apps.core'
+    def ready(self):
+        # Connects the connection_created hook before any connection is opened
+        from . import instrumentation  # noqa: F401
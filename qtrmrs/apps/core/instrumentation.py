@@ -0,0 +1,216 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+from .metrics import REGISTRY, add_totals, delete_totals, read_totals
+
+logger = logging.getLogger(__name__)
+
+REQUEST_METRICS_DEFAULTS = {
+    "ENABLED": True,
+    "SERVER_TIMING": True,
+    "LOG": True,
+}
+
+# Upper bounds (ms) of the histogram buckets; the last one catches everything slower
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf"))
+TIMINGS = ("total", "db", "ai", "template")
+COUNTS = ("requests", "queries", "ai_calls", "ai_errors", "prompt_chars", "response_chars")
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def get_config():
+    return {**REQUEST_METRICS_DEFAULTS, **getattr(settings, "REQUEST_METRICS", {})}
+
+
+class RequestMetrics:
+    """What one request spent its time on. Threads fanned out for the request share it."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.ai_calls = 0
+        self.ai_errors = 0
+        self.ai_ms = 0.0
+        self.prompt_chars = 0
+        self.response_chars = 0
+        self.template_ms = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        return self
+
+    def server_timing(self):
+        return ", ".join((
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'ai;dur={self.ai_ms:.1f};desc="{self.ai_calls} calls"',
+            f"tpl;dur={self.template_ms:.1f}",
+            f"total;dur={self.total_ms:.1f}",
+        ))
+
+    def as_log(self, view, request, status):
+        return {
+            "view": view,
+            "method": request.method,
+            "status": status,
+            "total_ms": round(self.total_ms, 1),
+            "queries": self.queries,
+            "db_ms": round(self.db_ms, 1),
+            "ai_calls": self.ai_calls,
+            "ai_errors": self.ai_errors,
+            "ai_ms": round(self.ai_ms, 1),
+            "prompt_chars": self.prompt_chars,
+            "response_chars": self.response_chars,
+            "template_ms": round(self.template_ms, 1),
+        }
+
+
+def start_request():
+    """Starts collecting for the current context; returns the token for end_request()."""
+    return _current.set(RequestMetrics())
+
+
+def end_request(token):
+    metrics = _current.get()
+    _current.reset(token)
+    return metrics.finish()
+
+
+def record_ai_call(latency, prompt_chars=0, response_chars=0, ok=True):
+    """Hook for QuizGenerator: one model call made on behalf of the current request."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(
+            ai_calls=1, ai_errors=0 if ok else 1, ai_ms=latency * 1000,
+            prompt_chars=prompt_chars, response_chars=response_chars,
+        )
+
+
+def _time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add(queries=1, db_ms=(time.perf_counter() - started) * 1000)
+
+
+def install_query_timer(connection):
+    # Every connection (including the per-thread ones sync_to_async uses) reports to the current request
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    install_query_timer(connection)
+
+
+connection_created.connect(_on_connection_created, dispatch_uid="request_metrics_query_timer")
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.add(template_ms=(time.perf_counter() - started) * 1000)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing top-level renders (includes count toward their parent)."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class ViewHistograms:
+    """
+    Per-view histograms of request timings and totals of counts, kept in
+    process and added to MetricTotal by the metrics flusher thread, so
+    `manage.py request_metrics` sees every worker.
+    """
+
+    namespace = "reqmetrics:v1"
+
+    def __init__(self):
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        REGISTRY.on_flush(self.flush)
+
+    def observe(self, view, metrics):
+        values = {"total": metrics.total_ms, "db": metrics.db_ms, "ai": metrics.ai_ms, "template": metrics.template_ms}
+        with self._lock:
+            for timing, ms in values.items():
+                self._pending[(view, timing, bisect.bisect_left(BUCKETS_MS, ms))] += 1
+                self._pending[(view, f"{timing}_ms", "value")] += round(ms)
+            self._pending[(view, "requests", "value")] += 1
+            for name in COUNTS[1:]:
+                self._pending[(view, name, "value")] += getattr(metrics, name)
+        REGISTRY.start_flusher()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        add_totals({(self.namespace, (view, name), part): amount for (view, name, part), amount in pending.items()})
+
+    def read(self):
+        """{view: {timing: [count per bucket], "<timing>_ms": sum, count name: total}} over all workers."""
+        result = {}
+        for (_, (view, name), part), value in read_totals([self.namespace]).items():
+            totals = result.setdefault(view, {timing: [0] * len(BUCKETS_MS) for timing in TIMINGS})
+            if part == "value":
+                totals[name] = value
+            else:
+                totals[name][part] = value
+        return result
+
+    def reset(self):
+        delete_totals([self.namespace])
+
+
+def bucket_percentile(counts, pct):
+    """Upper bound (ms) of the bucket holding the pct-th percentile."""
+    total = sum(counts)
+    if not total:
+        return 0
+    rank = max(1, round(pct / 100 * total))
+    seen = 0
+    for bound, count in zip(BUCKETS_MS, counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return BUCKETS_MS[-1]
+
+
+_histograms = None
+
+
+def get_view_histograms():
+    global _histograms
+    if _histograms is None:
+        _histograms = ViewHistograms()
+    return _histograms
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.instrumentation import bucket_percentile, get_view_histograms
+from apps.core.metrics import get_config
+
+
+class Command(BaseCommand):
+    help = (
+        "Dumps the per-view request histograms collected by RequestMetricsMiddleware across all workers: "
+        "latency percentiles (bucket upper bounds) and average queries, DB, AI and template time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Clear the histograms after printing them.")
+
+    def handle(self, *args, **options):
+        histograms = get_view_histograms()
+        views = histograms.read()
+        if not views:
+            self.stdout.write("No requests recorded yet (workers flush every "
+                              f"{get_config()['FLUSH_SECONDS']}s).")
+
+        self.stdout.write(
+            f"{'View':<30}{'Reqs':>7}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}{'Queries':>9}{'DB ms':>8}"
+            f"{'AI calls':>9}{'AI ms':>8}{'Tpl ms':>8}{'Prompt':>8}{'Resp':>8}"
+        )
+        for view, totals in sorted(views.items(), key=lambda item: -item[1].get('total_ms', 0)):
+            requests = totals.get('requests', 0)
+            if not requests:
+                continue
+
+            def average(name):
+                return totals.get(name, 0) / requests
+
+            self.stdout.write(
+                f"{view:<30}{requests:>7}"
+                f"{bucket_percentile(totals['total'], 50):>8g}{bucket_percentile(totals['total'], 95):>8g}"
+                f"{bucket_percentile(totals['total'], 99):>8g}{average('queries'):>9.1f}{average('db_ms'):>8.1f}"
+                f"{average('ai_calls'):>9.2f}{average('ai_ms'):>8.0f}{average('template_ms'):>8.1f}"
+                f"{average('prompt_chars'):>8.0f}{average('response_chars'):>8.0f}"
+            )
+
+        if options['reset']:
+            histograms.reset()
+            self.stdout.write(self.style.SUCCESS("Histograms reset."))
@@ -0,0 +1,373 @@
+import bisect
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import Counter as Tally
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import BigIntegerField, Case, F, Q, Value, When
+
+from .models import MetricTotal
+
+logger = logging.getLogger(__name__)
+
+METRICS_DEFAULTS = {
+    "ENABLED": True,
+    "ALIAS": "ai",
+    "FLUSH_SECONDS": 30,
+    "GAUGE_TTL": 120,
+    "TOKEN": None,
+}
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, float("inf"))
+# Sums are kept as integers in MetricTotal
+SUM_SCALE = 1_000_000
+
+
+def get_config():
+    return {**METRICS_DEFAULTS, **getattr(settings, "METRICS", {})}
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def _series(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount:
+            self.registry.add((self.name, self._series(labels), "value"), amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        series = self._series(labels)
+        self.registry.add((self.name, series, bisect.bisect_left(self.buckets, value)), 1)
+        self.registry.add((self.name, series, "sum"), round(value * SUM_SCALE))
+        self.registry.add((self.name, series, "count"), 1)
+
+
+class Gauge(Metric):
+    """Read from `collect()` ({label values tuple: value}) at each flush, and exported per worker pid."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, collect, labelnames=(), registry=None):
+        self.collect = collect
+        super().__init__(name, documentation, labelnames, registry)
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics, safe across gunicorn workers: counter and
+    histogram increments are batched in process and a background thread
+    adds them to the MetricTotal table every FLUSH_SECONDS (see
+    add_totals), so totals survive worker restarts and no request pays for
+    the write. Gauges are published per process in the ALIAS cache with a
+    GAUGE_TTL, so dead workers drop out.
+    """
+
+    namespace = "metrics:v1"
+
+    def __init__(self, config=None):
+        self._config = config
+        self.metrics = {}
+        self._pending = Tally()
+        self._hooks = []
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    @property
+    def config(self):
+        # Settings aren't ready when the module-level registry is created
+        if self._config is None:
+            self._config = get_config()
+        return self._config
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def on_flush(self, hook):
+        """Runs `hook()` on every flush, for other in-process batches (request histograms, cache stats)."""
+        if hook not in self._hooks:
+            self._hooks.append(hook)
+
+    def add(self, key, amount):
+        if not self.config["ENABLED"]:
+            return
+        with self._lock:
+            self._pending[key] += amount
+        self.start_flusher()
+
+    def start_flusher(self):
+        """Starts this process's flusher thread if it isn't running (a forked worker needs its own)."""
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._run_flusher, name="metrics-flusher", daemon=True).start()
+
+    def _run_flusher(self):
+        flushed_at = time.monotonic()
+        while True:
+            # Re-read each time so override_settings (e.g. an infinite interval in benchmarks) applies
+            interval = self.config["FLUSH_SECONDS"]
+            time.sleep(min(interval, 1))
+            if time.monotonic() - flushed_at < interval:
+                continue
+            self.flush()
+            flushed_at = time.monotonic()
+            # The thread's own connection; the next flush opens a fresh one
+            connections.close_all()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Tally()
+        for hook in self._hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.warning(f"Metrics hook {hook} failed: {e}")
+        if not self.config["ENABLED"]:
+            return
+        try:
+            add_totals(pending)
+        except Exception as e:
+            logger.warning(f"Metrics not flushed: {e}")
+        if self.config["ALIAS"]:
+            try:
+                self._publish_gauges(caches[self.config["ALIAS"]])
+            except Exception as e:
+                logger.warning(f"Gauges not published: {e}")
+
+    def _publish_gauges(self, backend):
+        values = {}
+        for metric in self.metrics.values():
+            if metric.kind == "gauge":
+                values[metric.name] = metric.collect()
+        pid = os.getpid()
+        backend.set(self._key("gauges", pid), values, timeout=self.config["GAUGE_TTL"])
+        pids = set(backend.get(self._key("pids")) or ())
+        if pid not in pids:
+            backend.set(self._key("pids"), sorted(pids | {pid}), timeout=None)
+
+    def read(self):
+        """({(name, labels): {part: value}}, {(name, labels + (pid,)): value}) summed over all workers."""
+        totals = {}
+        for (name, labels, part), value in read_totals(self.metrics).items():
+            totals.setdefault((name, labels), {})[part] = value
+
+        gauges = {}
+        if not self.config["ALIAS"]:
+            return totals, gauges
+        backend = caches[self.config["ALIAS"]]
+        pids = backend.get(self._key("pids")) or []
+        published = backend.get_many([self._key("gauges", pid) for pid in pids])
+        alive = []
+        for pid in pids:
+            values = published.get(self._key("gauges", pid))
+            if values is None:
+                continue
+            alive.append(pid)
+            for name, by_labels in values.items():
+                for labels, value in by_labels.items():
+                    gauges[(name, tuple(labels) + (str(pid),))] = value
+        if len(alive) < len(pids):
+            backend.set(self._key("pids"), alive, timeout=None)
+        return totals, gauges
+
+    def _key(self, *parts):
+        return ":".join([self.namespace, *map(str, parts)])
+
+
+# --- Shared totals (MetricTotal) ---
+LABEL_SEPARATOR = "\x1f"
+# Series per UPDATE, well under every backend's parameter limit
+TOTALS_BATCH_SIZE = 250
+
+
+def add_totals(increments):
+    """
+    Adds {(name, label values, part): amount} to MetricTotal. Missing rows
+    are inserted at 0, then one UPDATE per batch adds every amount with
+    value = value + amount, so concurrent flushes from other processes
+    never lose counts. Three queries per batch, however many processes.
+    """
+    rows = {
+        (name, LABEL_SEPARATOR.join(labels), str(part)): amount
+        for (name, labels, part), amount in increments.items()
+        if amount
+    }
+    keys = list(rows)
+    for start in range(0, len(keys), TOTALS_BATCH_SIZE):
+        batch = keys[start:start + TOTALS_BATCH_SIZE]
+        MetricTotal.objects.bulk_create(
+            [MetricTotal(name=name, labels=labels, part=part) for name, labels, part in batch],
+            ignore_conflicts=True,
+        )
+        # Only the series being flushed, however many others share their names
+        series = {}
+        for name, labels, part in batch:
+            series.setdefault((name, labels), []).append(part)
+        wanted = reduce(or_, (Q(name=name, labels=labels, part__in=parts) for (name, labels), parts in series.items()))
+        ids = {
+            (name, labels, part): pk
+            for pk, name, labels, part in MetricTotal.objects.filter(wanted).values_list('pk', 'name', 'labels', 'part')
+        }
+        MetricTotal.objects.filter(pk__in=[ids[key] for key in batch]).update(
+            value=F('value') + Case(
+                *[When(pk=ids[key], then=Value(rows[key])) for key in batch],
+                default=Value(0),
+                output_field=BigIntegerField(),
+            )
+        )
+
+
+def read_totals(names):
+    """{(name, label values, part): value} for the given metric names; numeric parts (histogram buckets) as ints."""
+    totals = {}
+    rows = MetricTotal.objects.filter(name__in=list(names)).values_list('name', 'labels', 'part', 'value')
+    for name, labels, part, value in rows:
+        labels = tuple(labels.split(LABEL_SEPARATOR)) if labels else ()
+        totals[(name, labels, int(part) if part.isdigit() else part)] = value
+    return totals
+
+
+def delete_totals(names, labels=None):
+    """Drops the totals of the given metric names (only the given label value tuples, if any)."""
+    rows = MetricTotal.objects.filter(name__in=list(names))
+    if labels is not None:
+        rows = rows.filter(labels__in=[LABEL_SEPARATOR.join(values) for values in labels])
+    rows.delete()
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _reload_config(sender, setting, **kwargs):
+    if setting == "METRICS":
+        REGISTRY._config = None
+
+
+setting_changed.connect(_reload_config, dispatch_uid="metrics_reload_config")
+
+
+def render(registry=REGISTRY, extra=()):
+    """
+    Prometheus text exposition format. `extra` adds families kept
+    elsewhere, as (name, kind, help, [(sample name, labels dict, value)]).
+    """
+    totals, gauges = registry.read()
+    lines = []
+
+    def header(name, kind, documentation):
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def labels_text(labels):
+        if not labels:
+            return ""
+        escaped = (
+            f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+            for k, v in labels.items()
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    for metric in registry.metrics.values():
+        header(metric.name, metric.kind, metric.documentation)
+        if metric.kind == "gauge":
+            for (name, labels), value in sorted(gauges.items()):
+                if name == metric.name:
+                    named = dict(zip(metric.labelnames + ("pid",), labels))
+                    lines.append(f"{metric.name}{labels_text(named)} {value}")
+            continue
+
+        for (name, labels), parts in sorted(totals.items()):
+            if name != metric.name:
+                continue
+            named = dict(zip(metric.labelnames, labels))
+            if metric.kind == "counter":
+                lines.append(f"{metric.name}{labels_text(named)} {parts.get('value', 0)}")
+                continue
+            cumulative = 0
+            for index, bound in enumerate(metric.buckets):
+                cumulative += parts.get(index, 0)
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{metric.name}_bucket{labels_text({**named, 'le': le})} {cumulative}")
+            lines.append(f"{metric.name}_sum{labels_text(named)} {parts.get('sum', 0) / SUM_SCALE:g}")
+            lines.append(f"{metric.name}_count{labels_text(named)} {parts.get('count', 0)}")
+
+    for name, kind, documentation, samples in extra:
+        header(name, kind, documentation)
+        for sample, labels, value in samples:
+            lines.append(f"{sample}{labels_text(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+# --- DB connections (per process) ---
+_connections = weakref.WeakSet()
+
+
+def _track_connection(sender, connection, **kwargs):
+    _connections.add(connection)
+
+
+connection_created.connect(_track_connection, dispatch_uid="metrics_track_connection")
+
+
+def _db_connections():
+    open_by_alias = Tally(c.alias for c in list(_connections) if c.connection is not None)
+    return {(alias,): count for alias, count in open_by_alias.items()}
+
+
+def _db_pool():
+    # Only with Django's PostgreSQL connection pool (OPTIONS 'pool')
+    stats = {}
+    for connection in list(_connections):
+        pool = getattr(connection, "pool", None)
+        if pool is not None and hasattr(pool, "get_stats"):
+            for stat, value in pool.get_stats().items():
+                stats[(connection.alias, stat)] = value
+    return stats
+
+
+# --- Application metrics ---
+AI_REQUESTS = Counter("ai_requests_total", "Gemini calls by model, task and outcome.", ("model", "task", "outcome"))
+AI_LATENCY = Histogram("ai_request_duration_seconds", "Gemini call latency.", ("model", "task"))
+AI_TOKENS = Counter("ai_tokens_total", "Estimated tokens sent (prompt) and received (output).", ("model", "kind"))
+QUIZZES_CREATED = Counter("quizzes_created_total", "Quizzes created.", ("source",))
+ANSWERS_SUBMITTED = Counter("answers_submitted_total", "Answers recorded.", ("result",))
+EXPLANATIONS_GENERATED = Counter("explanations_generated_total", "Mistake explanations generated by Gemini.")
+EXPLANATION_LOOKUPS = Counter(
+    "explanation_cache_lookups_total", "Mistakes looked up among explanations shared across users, by result.", ("result",)
+)
+DB_CONNECTIONS = Gauge("db_connections_open", "Open database connections per worker.", _db_connections, ("alias",))
+DB_POOL = Gauge("db_pool", "Connection pool statistics per worker.", _db_pool, ("alias", "stat"))
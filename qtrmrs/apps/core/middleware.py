@@ -0,0 +1,70 @@
+import json
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+
+from .instrumentation import (
+    end_request, get_config, get_view_histograms, install_query_timer, start_request,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures each request: SQL queries and DB time, Gemini calls (via the
+    QuizGenerator hook), prompt/response sizes and template render time.
+    Adds them as a Server-Timing header, logs one JSON line per request
+    and feeds the per-view histograms (`manage.py request_metrics`).
+    Put it first in MIDDLEWARE so the total covers the whole stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        self.histograms = get_view_histograms()
+        # Connections opened before this middleware loaded miss the connection_created hook
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.config["ENABLED"]:
+            return self.get_response(request)
+
+        token = start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics = end_request(token)
+        self._report(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        if not self.config["ENABLED"]:
+            return await self.get_response(request)
+
+        token = start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics = end_request(token)
+        self._report(request, response, metrics)
+        return response
+
+    def _report(self, request, response, metrics):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+
+        if self.config["SERVER_TIMING"]:
+            response['Server-Timing'] = metrics.server_timing()
+        if self.config["LOG"]:
+            logger.info(json.dumps(metrics.as_log(view, request, response.status_code)))
+        self.histograms.observe(view, metrics)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('labels', models.CharField(blank=True, help_text='Label values joined by \\x1f', max_length=255)),
+                ('part', models.CharField(default='value', help_text="'value', or a histogram bucket index, 'sum' or 'count'", max_length=20)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'labels', 'part'), name='unique_metric_total')],
+            },
+        ),
+    ]
@@ -1,3 +1,21 @@
 from django.db import models
 
-# Create your models here.
+
+class MetricTotal(models.Model):
+    """
+    One counter or histogram part summed over every process. Workers add
+    their batched increments in place (metrics.add_totals), so concurrent
+    flushes never overwrite each other.
+    """
+    name = models.CharField(max_length=100)
+    labels = models.CharField(max_length=255, blank=True, help_text="Label values joined by \\x1f")
+    part = models.CharField(max_length=20, default='value', help_text="'value', or a histogram bucket index, 'sum' or 'count'")
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'labels', 'part'], name='unique_metric_total'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}{{{self.labels}}} {self.part}={self.value}"
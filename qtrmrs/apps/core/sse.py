@@ -0,0 +1,63 @@
+import asyncio
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+SSE_DEFAULTS = {
+    "POLL_SECONDS": 0.5,
+    "HEARTBEAT_SECONDS": 15,
+    "MAX_SECONDS": 300,
+    "EXPLANATION_BATCH_SIZE": 3,
+}
+
+
+def get_config():
+    return {**SSE_DEFAULTS, **getattr(settings, "SSE", {})}
+
+
+def sse_event(event, data="", id=None):
+    """One Server-Sent Event; multi-line data (e.g. rendered HTML) gets a `data:` line each."""
+    lines = [f"event: {event}"]
+    if id is not None:
+        lines.append(f"id: {id}")
+    lines += [f"data: {line}" for line in str(data).strip().splitlines() or [""]]
+    return "\n".join(lines) + "\n\n"
+
+
+async def with_heartbeat(events, interval):
+    """
+    Passes events through, adding a comment line whenever none was sent for
+    `interval` seconds (e.g. during a long Gemini call), so proxies keep the
+    connection open. Closing this closes `events` too.
+    """
+    iterator = aiter(events)
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield ": keepalive\n\n"
+                continue
+            finished, pending = pending, None
+            try:
+                event = finished.result()
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        if pending is not None:
+            pending.cancel()
+        await iterator.aclose()
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """text/event-stream over an async generator of sse_event() strings. Serve it from ASGI (config.asgi)."""
+
+    def __init__(self, events, heartbeat=None):
+        heartbeat = get_config()["HEARTBEAT_SECONDS"] if heartbeat is None else heartbeat
+        super().__init__(with_heartbeat(events, heartbeat), content_type="text/event-stream")
+        self["Cache-Control"] = "no-cache"
+        # Stops nginx from buffering the stream
+        self["X-Accel-Buffering"] = "no"
@@ -1,3 +1,107 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from .instrumentation import RequestMetrics, ViewHistograms
+from .metrics import Counter, Histogram, MetricsRegistry, add_totals, read_totals, render
+
+CONFIG = {"ENABLED": True, "ALIAS": None, "FLUSH_SECONDS": float("inf"), "GAUGE_TTL": 120, "TOKEN": None}
+
+
+class MetricTotalsTests(TestCase):
+    def test_increments_add_up(self):
+        add_totals({("jobs_total", ("a",), "value"): 2})
+        add_totals({("jobs_total", ("a",), "value"): 3, ("jobs_total", ("b",), "value"): 1})
+        self.assertEqual(read_totals(["jobs_total"]), {
+            ("jobs_total", ("a",), "value"): 5,
+            ("jobs_total", ("b",), "value"): 1,
+        })
+
+    def test_zero_increments_write_nothing(self):
+        with self.assertNumQueries(0):
+            add_totals({("jobs_total", (), "value"): 0})
+
+    def test_flush_costs_the_same_for_many_series(self):
+        increments = {("requests_total", (str(i),), "value"): 1 for i in range(100)}
+        with self.assertNumQueries(3):
+            add_totals(increments)
+
+
+class MetricsRegistryTests(TestCase):
+    def setUp(self):
+        # Two registries stand in for two gunicorn workers
+        self.workers = [MetricsRegistry(config=CONFIG) for _ in range(2)]
+        self.counters = [Counter("answers_total", "Answers.", ("result",), registry=r) for r in self.workers]
+        self.histograms = [Histogram("latency_seconds", "Latency.", buckets=(1, float("inf")), registry=r) for r in self.workers]
+
+    def test_workers_flushes_are_summed(self):
+        for counter in self.counters:
+            counter.inc(result="wrong")
+        self.counters[0].inc(2, result="correct")
+        for registry in self.workers:
+            registry.flush()
+
+        totals, _ = self.workers[0].read()
+        self.assertEqual(totals[("answers_total", ("wrong",))], {"value": 2})
+        self.assertEqual(totals[("answers_total", ("correct",))], {"value": 2})
+
+    def test_flush_sends_pending_counts_once(self):
+        self.counters[0].inc(result="wrong")
+        self.workers[0].flush()
+        self.workers[0].flush()
+        totals, _ = self.workers[0].read()
+        self.assertEqual(totals[("answers_total", ("wrong",))], {"value": 1})
+
+    def test_histogram_renders_cumulative_buckets(self):
+        self.histograms[0].observe(0.5)
+        self.histograms[1].observe(3)
+        for registry in self.workers:
+            registry.flush()
+
+        body = render(self.workers[0])
+        self.assertIn('latency_seconds_bucket{le="1"} 1', body)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2', body)
+        self.assertIn("latency_seconds_sum 3.5", body)
+        self.assertIn("latency_seconds_count 2", body)
+
+    def test_flush_runs_hooks(self):
+        calls = []
+        self.workers[0].on_flush(lambda: calls.append(1))
+        self.workers[0].flush()
+        self.assertEqual(calls, [1])
+
+
+@override_settings(METRICS={**CONFIG, "TOKEN": "s3cret"})
+class MetricsViewTests(TestCase):
+    def test_hidden_without_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 404)
+
+    def test_served_with_token_or_staff(self):
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE quizzes_created_total counter", response.content)
+
+        staff = get_user_model().objects.create(username="ops", email="ops@example.com", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+
+class ViewHistogramsTests(TestCase):
+    def test_flush_and_read_across_workers(self):
+        metrics = RequestMetrics()
+        metrics.add(queries=3, db_ms=2.0)
+        metrics.total_ms = 30
+        workers = [ViewHistograms() for _ in range(2)]
+        for histograms in workers:
+            histograms.observe("quiz_results", metrics)
+            histograms.flush()
+
+        totals = workers[0].read()["quiz_results"]
+        self.assertEqual(totals["requests"], 2)
+        self.assertEqual(totals["queries"], 6)
+        self.assertEqual(totals["total_ms"], 60)
+        # 30 ms falls in the (25, 50] bucket
+        self.assertEqual(totals["total"][5], 2)
+
+        workers[0].reset()
+        self.assertEqual(workers[0].read(), {})
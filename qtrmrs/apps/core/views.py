@@ -1,7 +1,65 @@
+import hmac
+
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from apps.ai_agent.cache import get_intent_memo, get_quiz_cache
+from apps.ai_agent.resilience import get_breaker_metrics
+from .instrumentation import BUCKETS_MS, get_view_histograms
+from .metrics import REGISTRY, get_config, render as render_metrics
+
 def home(request):
     return render(request, 'core/home.html')
 
 def languages_list(request):
-    return render(request, 'core/languages.html')
\ No newline at end of file
+    return render(request, 'core/languages.html')
+
+def metrics(request):
+    """
+    Prometheus scrape target. Needs `Authorization: Bearer <METRICS['TOKEN']>`
+    or a staff session; anyone else gets a 404.
+    """
+    config = get_config()
+    token = config["TOKEN"]
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    authorized = bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+    if not config["ENABLED"] or not (authorized or request.user.is_staff):
+        raise Http404
+
+    body = render_metrics(REGISTRY, extra=_cache_families() + _request_families(get_view_histograms().read()))
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _cache_families():
+    caches_stats = {'quiz_generation': get_quiz_cache().stats, 'intent': get_intent_memo().stats}
+    snapshots = {name: stats.snapshot() for name, stats in caches_stats.items()}
+    retries = get_breaker_metrics().snapshot(("retries", "retries_denied", "fast_failures"))
+    return [
+        ('cache_hits_total', 'counter', "AI response cache hits.",
+         [('cache_hits_total', {'cache': name}, counts['hits']) for name, counts in snapshots.items()]),
+        ('cache_misses_total', 'counter', "AI response cache misses.",
+         [('cache_misses_total', {'cache': name}, counts['misses']) for name, counts in snapshots.items()]),
+        ('ai_retries_total', 'counter', "Gemini retries by retry budget decision.", [
+            ('ai_retries_total', {'decision': 'allowed'}, retries['retries']),
+            ('ai_retries_total', {'decision': 'denied'}, retries['retries_denied']),
+        ]),
+        ('ai_fast_failures_total', 'counter', "Gemini calls refused because every circuit was open.",
+         [('ai_fast_failures_total', {}, retries['fast_failures'])]),
+    ]
+
+def _request_families(views):
+    duration, queries, db_seconds = [], [], []
+    for view, totals in sorted(views.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS_MS, totals['total']):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else f"{bound / 1000:g}"
+            duration.append(('http_request_duration_seconds_bucket', {'view': view, 'le': le}, cumulative))
+        duration.append(('http_request_duration_seconds_sum', {'view': view}, totals.get('total_ms', 0) / 1000))
+        duration.append(('http_request_duration_seconds_count', {'view': view}, totals.get('requests', 0)))
+        queries.append(('http_request_queries_total', {'view': view}, totals.get('queries', 0)))
+        db_seconds.append(('http_request_db_seconds_total', {'view': view}, totals.get('db_ms', 0) / 1000))
+    return [
+        ('http_request_duration_seconds', 'histogram', "Request latency by view.", duration),
+        ('http_request_queries_total', 'counter', "SQL queries by view.", queries),
+        ('http_request_db_seconds_total', 'counter', "Time spent in SQL by view.", db_seconds),
+    ]
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Job
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'priority', 'attempts', 'user', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('locked_by', 'started_at', 'finished_at')
+
+admin.site.register(Job, JobAdmin)
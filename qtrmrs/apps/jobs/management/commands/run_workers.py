@@ -0,0 +1,87 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.module_loading import autodiscover_modules
+
+from apps.core.metrics import REGISTRY
+from apps.jobs.queue import get_config, reap, registered_kinds
+from apps.jobs.worker import start_workers
+
+# Seconds between housekeeping passes (expired leases, old jobs)
+REAP_INTERVAL = 60
+
+
+def run_process(threads, kinds, burst):
+    """Body of one worker process: `threads` workers until SIGTERM/SIGINT (or, with burst, an empty queue)."""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+
+    workers = start_workers(threads, stop, kinds=kinds, burst=burst)
+    reaped_at = 0
+    try:
+        while any(worker.is_alive() for worker in workers):
+            if time.monotonic() - reaped_at >= REAP_INTERVAL:
+                reap()
+                reaped_at = time.monotonic()
+            stop.wait(1)
+    finally:
+        # Workers finish the job they hold before exiting
+        stop.set()
+        for worker in workers:
+            worker.join()
+        # The flusher thread dies with the process: don't lose its last batch
+        REGISTRY.flush()
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs background jobs (quiz and explanation generation) from the jobs table. "
+        "Starts --processes worker processes of --threads claim loops each; SIGTERM lets running jobs finish."
+    )
+
+    def add_arguments(self, parser):
+        config = get_config()
+        parser.add_argument('--processes', type=int, default=config['PROCESSES'], help="Worker processes.")
+        parser.add_argument('--threads', type=int, default=config['THREADS'], help="Worker threads per process.")
+        parser.add_argument('--kind', action='append', dest='kinds', help="Only run jobs of this kind (repeatable).")
+        parser.add_argument('--burst', action='store_true', help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        # Handlers live in each app's jobs.py
+        autodiscover_modules('jobs')
+        kinds = options['kinds'] or registered_kinds()
+        unknown = set(kinds) - set(registered_kinds())
+        if unknown:
+            raise CommandError(f"No handler registered for: {', '.join(sorted(unknown))}")
+
+        processes, threads = options['processes'], options['threads']
+        self.stdout.write(f"Running {', '.join(kinds)} on {processes} process(es) x {threads} thread(s)")
+        if processes <= 1:
+            run_process(threads, kinds, options['burst'])
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [
+            context.Process(target=run_process, args=(threads, kinds, options['burst']), name=f"job-worker-{i}")
+            for i in range(processes)
+        ]
+        for child in children:
+            child.start()
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.join()
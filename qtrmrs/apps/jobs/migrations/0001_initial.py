@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(help_text="Registered handler name, e.g. 'quizzes.generate_quiz'", max_length=100)),
+                ('payload', models.JSONField(blank=True, default=dict, help_text='Keyword arguments for the handler')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('priority', models.SmallIntegerField(default=0, help_text='Higher runs first')),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Queued: not before this time. Running: lease expiry, after which another worker may retry it')),
+                ('locked_by', models.CharField(blank=True, help_text='Worker holding the lease', max_length=100)),
+                ('dedupe_key', models.CharField(blank=True, help_text='At most one active job per key', max_length=255)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status__in', ['queued', 'running'])), fields=['-priority', 'available_at'], name='job_claim_idx'), models.Index(fields=['finished_at'], name='job_finished_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running']), models.Q(('dedupe_key', ''), _negated=True)), fields=('dedupe_key',), name='unique_active_job')],
+            },
+        ),
+    ]
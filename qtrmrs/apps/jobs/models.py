@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    A unit of background work (see apps.jobs.queue), run by
+    `manage.py run_workers`. The table is the queue: no broker needed.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE = (QUEUED, RUNNING)
+
+    kind = models.CharField(max_length=100, help_text="Registered handler name, e.g. 'quizzes.generate_quiz'")
+    payload = models.JSONField(default=dict, blank=True, help_text="Keyword arguments for the handler")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.SmallIntegerField(default=0, help_text="Higher runs first")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Queued: not before this time. Running: lease expiry, after which another worker may retry it",
+    )
+    locked_by = models.CharField(max_length=100, blank=True, help_text="Worker holding the lease")
+    dedupe_key = models.CharField(max_length=255, blank=True, help_text="At most one active job per key")
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claim: the next ready job, highest priority first
+            models.Index(
+                fields=['-priority', 'available_at'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='job_claim_idx',
+            ),
+            # Purge of old finished jobs
+            models.Index(fields=['finished_at'], name='job_finished_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(status__in=['queued', 'running']) & ~models.Q(dedupe_key=''),
+                name='unique_active_job',
+            ),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,193 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.core.metrics import Counter, Histogram
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOBS_DEFAULTS = {
+    "LEASE_SECONDS": 300,
+    "MAX_ATTEMPTS": 3,
+    "RETRY_BACKOFF": 5,
+    "POLL_SECONDS": 1.0,
+    "PROCESSES": 1,
+    "THREADS": 4,
+    "RETENTION_HOURS": 24,
+}
+
+# SQLite has no row locks: a claim races this many candidates before giving up
+SQLITE_CANDIDATES = 5
+
+JOBS_PROCESSED = Counter("jobs_processed_total", "Background jobs finished, by kind and outcome.", ("kind", "outcome"))
+JOB_WAIT = Histogram("job_wait_seconds", "Time jobs spent queued before a worker took them.", ("kind",))
+JOB_DURATION = Histogram("job_duration_seconds", "Background job run time.", ("kind",))
+
+
+def get_config():
+    return {**JOBS_DEFAULTS, **getattr(settings, "JOBS", {})}
+
+
+# --- Handlers ---
+_handlers = {}
+_failure_hooks = {}
+
+
+def register(kind, on_failure=None):
+    """
+    Decorator: `@register('app.task')` makes a function runnable as a job;
+    it gets the payload as kwargs. `on_failure` is called the same way once
+    the job has failed for good (out of attempts or its last lease expired).
+    """
+    def decorator(fn):
+        _handlers[kind] = fn
+        if on_failure:
+            _failure_hooks[kind] = on_failure
+        return fn
+    return decorator
+
+
+def get_handler(kind):
+    return _handlers.get(kind)
+
+
+def registered_kinds():
+    return sorted(_handlers)
+
+
+# --- Producer side ---
+
+def enqueue(kind, payload=None, user=None, priority=0, dedupe_key='', delay=0, max_attempts=None):
+    """
+    Queues a job and returns it. With a dedupe_key, a job already queued
+    or running under that key is returned instead of adding another.
+    """
+    job = Job(
+        kind=kind,
+        payload=payload or {},
+        user=user,
+        priority=priority,
+        dedupe_key=dedupe_key,
+        available_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or get_config()["MAX_ATTEMPTS"],
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        existing = Job.objects.filter(dedupe_key=dedupe_key, status__in=Job.ACTIVE).first()
+        if existing is None:
+            raise
+        return existing
+    return job
+
+
+# --- Worker side ---
+
+def claim(worker_id, kinds=None):
+    """
+    Leases the next ready job to `worker_id`, or returns None. Ready means
+    queued and due, or running with an expired lease (its worker died) and
+    attempts left. Uses SELECT ... FOR UPDATE SKIP LOCKED where supported
+    (PostgreSQL), otherwise a compare-and-swap UPDATE.
+    """
+    config = get_config()
+    now = timezone.now()
+    ready = Job.objects.filter(available_at__lte=now).filter(
+        Q(status=Job.QUEUED) | Q(status=Job.RUNNING, attempts__lt=F('max_attempts'))
+    )
+    if kinds:
+        ready = ready.filter(kind__in=kinds)
+    ready = ready.order_by('-priority', 'available_at', 'id')
+    lease = {
+        'status': Job.RUNNING,
+        'attempts': F('attempts') + 1,
+        'available_at': now + timedelta(seconds=config["LEASE_SECONDS"]),
+        'locked_by': worker_id,
+        'started_at': now,
+    }
+
+    job = None
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = next(iter(ready.select_for_update(skip_locked=True)[:1]), None)
+            if job is not None:
+                Job.objects.filter(pk=job.pk).update(**lease)
+    else:
+        for candidate in ready[:SQLITE_CANDIDATES]:
+            # Only one worker's UPDATE can still match the row as it was read
+            won = Job.objects.filter(
+                pk=candidate.pk, status=candidate.status, attempts=candidate.attempts,
+            ).update(**lease)
+            if won:
+                job = candidate
+                break
+    if job is None:
+        return None
+
+    JOB_WAIT.observe((now - job.available_at).total_seconds() if job.status == Job.QUEUED else 0, kind=job.kind)
+    job.status, job.attempts, job.locked_by, job.started_at = Job.RUNNING, job.attempts + 1, worker_id, now
+    job.available_at = lease['available_at']
+    return job
+
+
+def _owned(job):
+    # Guards against finishing a job whose lease expired and was taken over
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by, attempts=job.attempts)
+
+
+def complete(job, result=None):
+    now = timezone.now()
+    _owned(job).update(status=Job.SUCCEEDED, result=result, error='', finished_at=now)
+    JOBS_PROCESSED.inc(kind=job.kind, outcome='succeeded')
+    JOB_DURATION.observe((now - job.started_at).total_seconds(), kind=job.kind)
+
+
+def fail(job, error):
+    """Requeues the job with exponential backoff, or marks it failed once out of attempts."""
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        delay = get_config()["RETRY_BACKOFF"] * 2 ** (job.attempts - 1)
+        _owned(job).update(
+            status=Job.QUEUED, available_at=now + timedelta(seconds=delay), locked_by='', error=str(error),
+        )
+        outcome = 'retried'
+    else:
+        if _owned(job).update(status=Job.FAILED, error=str(error), finished_at=now):
+            _gave_up(job)
+        outcome = 'failed'
+    JOBS_PROCESSED.inc(kind=job.kind, outcome=outcome)
+    JOB_DURATION.observe((now - job.started_at).total_seconds(), kind=job.kind)
+
+
+def _gave_up(job):
+    hook = _failure_hooks.get(job.kind)
+    if hook is None:
+        return
+    try:
+        hook(**job.payload)
+    except Exception as e:
+        logger.error(f"on_failure hook of job {job.pk} ({job.kind}) failed: {e}")
+
+
+def reap():
+    """Fails running jobs whose lease expired with no attempts left, and purges old finished jobs."""
+    config = get_config()
+    now = timezone.now()
+    expired = Job.objects.filter(status=Job.RUNNING, available_at__lte=now, attempts__gte=F('max_attempts'))
+    lost = 0
+    for job in expired.only('kind', 'payload', 'status', 'locked_by', 'attempts'):
+        if _owned(job).update(status=Job.FAILED, error="Lease expired", finished_at=now):
+            lost += 1
+            _gave_up(job)
+    if lost:
+        logger.warning(f"{lost} job(s) failed after their last lease expired")
+    purged, _ = Job.objects.filter(
+        finished_at__lt=now - timedelta(hours=config["RETENTION_HOURS"])
+    ).delete()
+    return lost, purged
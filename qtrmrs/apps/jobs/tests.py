@@ -0,0 +1,134 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.quizzes import jobs as quiz_jobs
+from apps.quizzes.models import Quiz
+from apps.quizzes.services import clean_questions, record_answer, save_generated_quiz
+from .models import Job
+from .queue import claim, complete, enqueue, reap, register
+from .worker import execute
+
+failures = []
+
+
+@register('tests.ok')
+def succeed(**payload):
+    return payload
+
+
+@register('tests.broken', on_failure=lambda **payload: failures.append(payload))
+def explode(**payload):
+    raise RuntimeError("boom")
+
+
+def make_due(job):
+    # Skips the rest of a lease or a retry's backoff
+    Job.objects.filter(pk=job.pk).update(available_at=timezone.now() - timedelta(seconds=1))
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        failures.clear()
+
+    def test_claims_the_highest_priority_ready_job(self):
+        low = enqueue('tests.ok')
+        high = enqueue('tests.ok', priority=1)
+        enqueue('tests.ok', priority=5, delay=60)
+
+        self.assertEqual(claim('w1').pk, high.pk)
+        self.assertEqual(claim('w2').pk, low.pk)
+        self.assertIsNone(claim('w3'))
+
+    def test_expired_lease_is_taken_over(self):
+        enqueue('tests.ok')
+        first = claim('w1')
+        self.assertIsNone(claim('w2'))
+
+        make_due(first)
+        second = claim('w2')
+        self.assertEqual((second.pk, second.attempts), (first.pk, 2))
+
+        # The worker that lost its lease can't finish the job
+        complete(first, {'stale': True})
+        job = Job.objects.get(pk=first.pk)
+        self.assertEqual((job.status, job.locked_by), (Job.RUNNING, 'w2'))
+
+    def test_failed_job_is_retried_later(self):
+        enqueue('tests.broken', {'n': 1})
+        execute(claim('w1'))
+
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts, job.error), (Job.QUEUED, 1, "boom"))
+        self.assertGreater(job.available_at, timezone.now())
+        self.assertIsNone(claim('w1'))
+        self.assertEqual(failures, [])
+
+    def test_last_failed_attempt_gives_up(self):
+        enqueue('tests.broken', {'n': 1}, max_attempts=1)
+        execute(claim('w1'))
+
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+        self.assertEqual(failures, [{'n': 1}])
+
+    def test_reap_gives_up_on_an_expired_last_lease(self):
+        enqueue('tests.broken', {'n': 2}, max_attempts=1)
+        make_due(claim('w1'))
+
+        self.assertEqual(reap(), (1, 0))
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+        self.assertEqual(failures, [{'n': 2}])
+
+
+def short_stream(self, language, topic, level, num_questions=5, include_code=False, use_cache=True):
+    # Gemini gives up after one question, whatever was asked
+    yield {
+        'text': "Streamed?", 'code_snippet': '', 'explanation': '',
+        'options': ['a', 'b'], 'correct_answer': 'a',
+    }
+
+
+@mock.patch('apps.ai_agent.services.QuizGenerator.stream_quiz', short_stream)
+class GenerateQuizJobTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='player')
+        bank = clean_questions([
+            {'text': "Banked?", 'code_snippet': '', 'explanation': '', 'options': ['a', 'b'], 'correct_answer': 'a'},
+        ])
+        self.quiz = save_generated_quiz(user, 'Python', 'Loops', 'beginner', 'test', questions_data=bank, total_questions=3)
+        Quiz.objects.filter(pk=self.quiz.pk).update(is_generating=True)
+        self.payload = {'quiz_id': self.quiz.pk, 'language': 'Python', 'topic': 'Loops', 'level': 'beginner'}
+
+    def run_job(self, **kwargs):
+        enqueue('quizzes.generate_quiz', self.payload, **kwargs)
+        execute(claim('w1', kinds=['quizzes.generate_quiz']))
+        self.quiz.refresh_from_db()
+        return Job.objects.get()
+
+    def test_short_stream_is_retried_for_the_shortfall(self):
+        job = self.run_job()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertTrue(self.quiz.is_generating)
+        self.assertEqual((self.quiz.total_questions, self.quiz.questions.count()), (3, 2))
+
+        make_due(job)
+        with mock.patch.object(quiz_jobs.StreamingQuizBuilder, 'run', autospec=True) as run:
+            execute(claim('w1'))
+        self.assertEqual(run.call_args.args[4], 1)
+
+    def test_last_attempt_keeps_what_was_generated(self):
+        job = self.run_job(max_attempts=1)
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertFalse(self.quiz.is_generating)
+        self.assertEqual((self.quiz.total_questions, self.quiz.questions.count()), (2, 2))
+
+    def test_unexplained_mistakes_are_retried(self):
+        question = self.quiz.questions.get()
+        record_answer(self.quiz, question.id, None)
+        enqueue('quizzes.explain_mistakes', {'quiz_id': self.quiz.pk})
+        with mock.patch('apps.ai_agent.services.QuizGenerator.generate_explanations', return_value={}):
+            execute(claim('w1'))
+        self.assertEqual(Job.objects.get().status, Job.QUEUED)
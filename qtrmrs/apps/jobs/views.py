@@ -0,0 +1,10 @@
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import get_object_or_404, render
+
+from .models import Job
+
+@login_required
+def job_status(request, job_id):
+    """HTMX poll target: a spinner that re-polls while the job runs, then its result."""
+    job = get_object_or_404(Job.objects.only('id', 'status', 'result'), id=job_id, user=request.user)
+    return render(request, 'jobs/partials/job_status.html', {'job': job})
@@ -0,0 +1,79 @@
+import logging
+import os
+import socket
+import threading
+
+from django.db import connection
+
+from .queue import claim, complete, fail, get_config, get_handler, registered_kinds
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def execute(job):
+    """Runs one claimed job and records its outcome."""
+    handler = get_handler(job.kind)
+    if handler is None:
+        # Workers only claim registered kinds, so this is a handler unregistered at runtime
+        fail(job, f"No handler registered for {job.kind!r}")
+        return
+    try:
+        result = handler(**job.payload)
+    except Exception as e:
+        logger.error(f"Job {job.pk} ({job.kind}) failed on attempt {job.attempts}: {e}")
+        fail(job, e)
+    else:
+        complete(job, result)
+
+
+class Worker:
+    """One claim-and-run loop; `manage.py run_workers` runs THREADS of these per process."""
+
+    def __init__(self, name, stop, kinds=None, burst=False, config=None):
+        self.name = name
+        self.stop = stop
+        # Never lease a job this process can't run (e.g. one queued by newer code)
+        self.kinds = kinds or registered_kinds()
+        self.burst = burst
+        self.config = config or get_config()
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                if self.run_once():
+                    continue
+                if self.burst:
+                    break
+                self.stop.wait(self.config["POLL_SECONDS"])
+        finally:
+            connection.close()
+
+    def run_once(self):
+        """Claims and runs one job; False if none was ready."""
+        try:
+            job = claim(self.name, kinds=self.kinds)
+        except Exception as e:
+            # e.g. the database restarting; back off and try again
+            logger.error(f"Worker {self.name} could not claim a job: {e}")
+            connection.close()
+            return False
+        if job is None:
+            return False
+        execute(job)
+        return True
+
+
+def start_workers(threads, stop, kinds=None, burst=False):
+    """Starts `threads` Worker threads in this process and returns them."""
+    config = get_config()
+    workers = []
+    for index in range(threads):
+        worker = Worker(worker_id(index), stop, kinds=kinds, burst=burst, config=config)
+        thread = threading.Thread(target=worker.run, name=f"job-worker-{index}", daemon=True)
+        thread.start()
+        workers.append(thread)
+    return workers
@@ -1,11 +1,16 @@
 from django.contrib import admin
-from .models import AIModel, Topic, Quiz, Question, Option, UserAnswer
+from .models import AIModel, Topic, Quiz, Question, Option, UserAnswer, UserTopicStats, MistakeExplanation
+
+class AIModelAdmin(admin.ModelAdmin):
+    list_display = ('display_name', 'model_name', 'tasks', 'is_active', 'is_default')
 
 class OptionInline(admin.TabularInline):
     model = Option
     extra = 4
 
 class QuestionAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'quiz', 'bank_key')
+    search_fields = ('text', 'bank_key')
     inlines = [OptionInline]
 
 class UserAnswerInline(admin.TabularInline):
@@ -17,8 +22,19 @@ class QuizAdmin(admin.ModelAdmin):
     list_display = ('language', 'topic_description', 'user', 'score', 'created_at')
     inlines = [UserAnswerInline]
 
-admin.site.register(AIModel)
+class UserTopicStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'language', 'difficulty', 'attempts', 'questions_answered', 'accuracy', 'best_streak', 'last_seen')
+    list_filter = ('language', 'difficulty')
+    search_fields = ('user__email',)
+
+class MistakeExplanationAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'created_at')
+    search_fields = ('question_hash', 'text')
+
+admin.site.register(AIModel, AIModelAdmin)
 admin.site.register(Topic)
 admin.site.register(Quiz, QuizAdmin)
 admin.site.register(Question, QuestionAdmin)
-admin.site.register(UserAnswer)
\ No newline at end of file
+admin.site.register(UserAnswer)
+admin.site.register(UserTopicStats, UserTopicStatsAdmin)
+admin.site.register(MistakeExplanation, MistakeExplanationAdmin)
\ No newline at end of file
@@ -0,0 +1,51 @@
+import time
+
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.ai_agent.services import QuizGenerator
+from apps.jobs.queue import register
+from .models import Quiz
+from .services import QuestionBank, StreamingQuizBuilder, explain_mistakes, finish_generation
+
+
+def end_generation(quiz_id, **payload):
+    """Out of attempts: the quiz keeps the questions that made it."""
+    finish_generation(quiz_id)
+
+
+@register('quizzes.generate_quiz', on_failure=end_generation)
+def generate_quiz(quiz_id, language, topic, level, include_code=False):
+    """
+    Streams a queued quiz's missing questions in. A failed or short stream
+    raises so the job is retried; only the shortfall is generated again.
+    """
+    quiz = Quiz.objects.filter(pk=quiz_id).first()
+    if quiz is None:
+        return None
+
+    saved = quiz.questions.count()
+    missing = quiz.total_questions - saved
+    if missing <= 0:
+        finish_generation(quiz.pk)
+        return {'questions': saved}
+
+    # Time to first question counts from the request that queued the quiz
+    started = time.monotonic() - (timezone.now() - quiz.created_at).total_seconds()
+    builder = StreamingQuizBuilder(
+        quiz, QuizGenerator(), bank=QuestionBank(language, level, topic, include_code), started=started,
+    )
+    if saved:
+        # Bank questions were playable straight away
+        builder.first_ready.set()
+    builder.run(language, topic, level, missing, include_code, raise_errors=True)
+    return {'questions': quiz.questions.count(), 'url': reverse('quiz_player', args=[quiz.pk])}
+
+
+@register('quizzes.explain_mistakes')
+def explain_quiz_mistakes(quiz_id):
+    quiz = Quiz.objects.filter(pk=quiz_id).first()
+    if quiz is None:
+        return None
+    explained = explain_mistakes(quiz, QuizGenerator(), raise_errors=True)
+    return {'explained': explained, 'url': reverse('quiz_results_list', args=[quiz.pk])}
@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.quizzes.models import Option, Question, Quiz
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark's throwaway data."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Plays a throwaway quiz through the exam player and reports the SQL queries per answer, "
+        "which should stay constant however far into the quiz the player is."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=30, help="Questions in the throwaway quiz.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                counts = self._play(options['questions'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{'Answer':>8}{'Queries':>10}")
+        for number, count in enumerate(counts, start=1):
+            self.stdout.write(f"{number:>8}{count:>10}")
+
+        # The last answer redirects to results instead of rendering a card
+        steady = set(counts[:-1])
+        if len(steady) > 1:
+            raise CommandError(f"Query count per answer varies: {sorted(steady)}")
+        self.stdout.write(self.style.SUCCESS(f"Constant: {counts[0]} queries per answer."))
+
+    def _play(self, num_questions):
+        user = get_user_model().objects.create(username='player-benchmark', email='player-benchmark@example.com')
+        quiz = Quiz.objects.create(
+            user=user, language='Python', topic_description='Benchmark', difficulty='intermediate',
+            total_questions=num_questions, model_used='Benchmark',
+        )
+        for i in range(num_questions):
+            question = Question.objects.create(quiz=quiz, text=f"Question {i + 1}")
+            Option.objects.bulk_create([
+                Option(question=question, text=f"Option {letter}", is_correct=(letter == 'A'))
+                for letter in 'ABCD'
+            ])
+
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        client.get(reverse('quiz_player', args=[quiz.id]))
+
+        counts = []
+        for question in quiz.questions.prefetch_related('options').order_by('id'):
+            # Always answer correctly: the most expensive path (it also updates the score)
+            data = {'option': question.options.all()[0].id}
+            with CaptureQueriesContext(connection) as queries:
+                client.post(reverse('submit_answer', args=[quiz.id, question.id]), data, HTTP_HX_REQUEST='true')
+            counts.append(len(queries))
+        return counts
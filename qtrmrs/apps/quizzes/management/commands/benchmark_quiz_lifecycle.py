@@ -0,0 +1,152 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import resolve, reverse
+
+from apps.ai_agent.client import OFFLINE_BACKENDS, reset_clients
+from apps.ai_agent.management.commands.benchmark_ai_servers import percentile
+from apps.quizzes.models import Option, Quiz
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark's throwaway data."""
+
+
+class QueryTimer:
+    """connection.execute_wrapper that counts queries and sums their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs whole quiz lifecycles in-process against the offline AI backend: create -> play every answer -> "
+        "results -> explain-all -> dashboard. Reports per-view latency percentiles, SQL query counts and DB "
+        "time, and fails if a view exceeds its PERF_BUDGET. Data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help="Quiz lifecycles to run.")
+        parser.add_argument('--questions', type=int, default=10, help="Questions per quiz.")
+        parser.add_argument('--ai-latency', type=float, default=0.0, help="Stubbed Gemini latency (seconds).")
+        parser.add_argument('--no-budget', action='store_true', help="Report only; don't fail on budget overruns.")
+
+    def handle(self, *args, **options):
+        if settings.AI_BACKEND not in OFFLINE_BACKENDS:
+            raise CommandError("Refusing to benchmark against the real Gemini API. Use DJANGO_SETTINGS_MODULE=config.settings.benchmark.")
+
+        samples = defaultdict(list)
+        # Streaming generation and queued jobs run elsewhere and can't see this transaction, and the
+        # metrics flusher thread would wait on the database lock this transaction holds
+        with override_settings(
+            AI_STUB_LATENCY=options['ai_latency'],
+            AI_STREAMING_GENERATION=False,
+            AI_BACKGROUND_JOBS=False,
+            METRICS={**getattr(settings, 'METRICS', {}), 'FLUSH_SECONDS': float('inf')},
+        ):
+            reset_clients()
+            try:
+                with transaction.atomic():
+                    self._run(samples, options)
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                reset_clients()
+
+        self._report(samples, options)
+        if not options['no_budget']:
+            self._check_budget(samples)
+
+    def _run(self, samples, options):
+        user = get_user_model().objects.create(username='lifecycle-benchmark', email='lifecycle-benchmark@example.com')
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+
+        def request(method, url, data=None, **headers):
+            timer = QueryTimer()
+            started = time.perf_counter()
+            with connection.execute_wrapper(timer):
+                response = getattr(client, method)(url, data, HTTP_HX_REQUEST='true', **headers)
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise CommandError(f"{method.upper()} {url} returned {response.status_code}")
+            samples[resolve(url).url_name].append((elapsed * 1000, timer.count, timer.seconds * 1000))
+            return response
+
+        for i in range(options['iterations']):
+            # A unique topic per run, so the question bank can't answer and every quiz reaches the AI backend
+            response = request('post', reverse('create_quiz'), {
+                'topic': f"lifecycle {i}",
+                'language_select': 'Python',
+                'level': 'intermediate',
+                'num_questions': options['questions'],
+            })
+            quiz = Quiz.objects.get(id=resolve(response['HX-Redirect']).kwargs['quiz_id'])
+            request('get', reverse('quiz_player', args=[quiz.id]))
+
+            questions = quiz.questions.order_by('id').values_list('id', flat=True)
+            correct = dict(
+                Option.objects.filter(question__quiz=quiz, is_correct=True).values_list('question_id', 'id')
+            )
+            wrong = dict(
+                Option.objects.filter(question__quiz=quiz, is_correct=False).values_list('question_id', 'id')
+            )
+            for number, question_id in enumerate(questions):
+                # Every other answer wrong, so explain-all has work to do
+                option = correct[question_id] if number % 2 else wrong[question_id]
+                request('post', reverse('submit_answer', args=[quiz.id, question_id]), {'option': option})
+
+            request('get', reverse('quiz_results', args=[quiz.id]))
+            request('post', reverse('generate_all_explanations', args=[quiz.id]))
+            request('get', reverse('dashboard'))
+            request('get', reverse('dashboard_history'))
+
+    def _report(self, samples, options):
+        self.stdout.write(
+            f"{options['iterations']} lifecycles, {options['questions']} questions each, "
+            f"AI latency {options['ai_latency']}s ({settings.AI_BACKEND} backend)"
+        )
+        self.stdout.write(
+            f"{'View':<28}{'Calls':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'Queries':>9}{'Max q':>7}{'DB ms':>8}"
+        )
+        for name, rows in samples.items():
+            latencies = [row[0] for row in rows]
+            queries = [row[1] for row in rows]
+            db_ms = sum(row[2] for row in rows) / len(rows)
+            self.stdout.write(
+                f"{name:<28}{len(rows):>7}{percentile(latencies, 50):>9.1f}{percentile(latencies, 95):>9.1f}"
+                f"{percentile(latencies, 99):>9.1f}{sum(queries) / len(rows):>9.1f}{max(queries):>7}{db_ms:>8.1f}"
+            )
+
+    def _check_budget(self, samples):
+        failures = []
+        for name, budget in getattr(settings, 'PERF_BUDGET', {}).items():
+            rows = samples.get(name)
+            if not rows:
+                continue
+            p95 = percentile([row[0] for row in rows], 95)
+            most_queries = max(row[1] for row in rows)
+            if 'P95_MS' in budget and p95 > budget['P95_MS']:
+                failures.append(f"{name}: p95 {p95:.1f} ms > {budget['P95_MS']} ms")
+            if 'QUERIES' in budget and most_queries > budget['QUERIES']:
+                failures.append(f"{name}: {most_queries} queries > {budget['QUERIES']}")
+
+        if failures:
+            raise CommandError("Performance budget exceeded:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS("Within PERF_BUDGET."))
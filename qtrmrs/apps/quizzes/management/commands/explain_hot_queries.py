@@ -0,0 +1,98 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.quizzes.models import Option, Question, Quiz, Topic, UserAnswer
+from apps.quizzes.services import QuestionBank
+
+# Patterns naming the index a plan line uses, per database vendor
+INDEX_PATTERNS = {
+    'sqlite': re.compile(r"USING (?:COVERING )?INDEX (\w+)|USING (INTEGER PRIMARY KEY)"),
+    'postgresql': re.compile(r"Index (?:Only )?Scan (?:Backward )?using (\w+)|Bitmap Index Scan on (\w+)"),
+}
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r"\bSCAN (\w+)\b(?! USING)"),
+    'postgresql': re.compile(r"Seq Scan on (\w+)"),
+}
+
+
+def hot_queries(sample):
+    """(label, expected index or None for any index, queryset) for each hot query path."""
+    return [
+        ("Dashboard history", 'quiz_user_created_idx',
+         Quiz.objects.filter(user_id=sample['user_id']).order_by('-created_at', '-id')),
+        ("Results answers", None,
+         UserAnswer.objects.filter(quiz_id=sample['quiz_id'])),
+        ("Mistakes to explain", 'answer_needs_explanation_idx',
+         UserAnswer.objects.filter(quiz_id=sample['quiz_id'], is_correct=False, error_explanation='')),
+        ("Correct options", 'option_correct_idx',
+         Option.objects.filter(question_id__in=sample['question_ids'], is_correct=True)),
+        ("Player questions", None,
+         Question.objects.filter(quiz_id=sample['quiz_id']).order_by('id')),
+        ("Question bank", 'question_bank_idx',
+         QuestionBank(sample['language'], sample['level'], sample['topic']).questions()),
+        ("Bank popularity window", 'quiz_created_idx',
+         Quiz.objects.filter(created_at__gte=timezone.now() - timedelta(days=7))),
+        ("Topics by language", 'topic_language_idx',
+         Topic.objects.filter(language=sample['language'])),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the hot query paths and checks that each one is served by an index. "
+        "Exits with an error if any of them falls back to a full table scan."
+    )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in INDEX_PATTERNS:
+            raise CommandError(f"EXPLAIN parsing is not supported on {vendor}.")
+
+        failures = []
+        with transaction.atomic():
+            if vendor == 'postgresql':
+                # Small tables make a seq scan cheapest; ask whether an index *could* serve the query
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for label, expected, queryset in hot_queries(self._sample()):
+                plan = queryset.explain()
+                used = [name for match in INDEX_PATTERNS[vendor].finditer(plan) for name in match.groups() if name]
+                scans = FULL_SCAN_PATTERNS[vendor].findall(plan)
+
+                if scans:
+                    status, ok = f"FULL SCAN of {', '.join(scans)}", False
+                elif expected and expected not in used:
+                    status, ok = f"expected {expected}", False
+                elif not used:
+                    status, ok = "no index", False
+                else:
+                    status, ok = "ok", True
+
+                style = self.style.SUCCESS if ok else self.style.ERROR
+                self.stdout.write(f"{label:<24}{', '.join(used) or '-':<42}{style(status)}")
+                if options['verbosity'] > 1:
+                    self.stdout.write(plan)
+                if not ok:
+                    failures.append(label)
+
+        if failures:
+            raise CommandError(f"Hot queries not using an index: {', '.join(failures)}")
+
+    @staticmethod
+    def _sample():
+        """Parameters taken from real rows where there are any, so the plans reflect real data."""
+        quiz = Quiz.objects.order_by('-id').first()
+        question_ids = list(Question.objects.filter(quiz=quiz).values_list('id', flat=True)[:10]) if quiz else []
+        return {
+            'user_id': quiz.user_id if quiz else 0,
+            'quiz_id': quiz.id if quiz else 0,
+            'question_ids': question_ids or [0],
+            'language': quiz.language if quiz else 'Python',
+            'level': quiz.difficulty if quiz else 'beginner',
+            'topic': 'General Knowledge',
+        }
@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from apps.ai_agent.cache import normalize_text
+from apps.quizzes.models import Quiz, UserAnswer, UserTopicStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes UserTopicStats from UserAnswer, streaming users in chunks so memory stays flat. "
+        "Use it after a backfill, or if the incremental updates ever drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Users recomputed per transaction.")
+        parser.add_argument('--user', type=int, help="Only rebuild this user id.")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if options['user']:
+            users = users.filter(pk=options['user'])
+
+        last_pk, total_users, total_rows = 0, 0, 0
+        while True:
+            # Keyset over user ids: every chunk costs the same however deep we are
+            chunk = list(users.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_pk = chunk[-1]
+
+            rows = self.compute(chunk)
+            with transaction.atomic():
+                UserTopicStats.objects.filter(user_id__in=chunk).delete()
+                UserTopicStats.objects.bulk_create(rows)
+
+            total_users += len(chunk)
+            total_rows += len(rows)
+            self.stdout.write(f"{total_users} users, {total_rows} stats rows")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt topic stats for {total_users} users ({total_rows} rows)."))
+
+    def compute(self, user_ids):
+        """UserTopicStats rows (unsaved) for a chunk of users."""
+        stats = {}
+
+        def row(user_id, language, difficulty):
+            key = (user_id, normalize_text(language), difficulty)
+            if key not in stats:
+                stats[key] = UserTopicStats(user_id=key[0], language=key[1], difficulty=key[2])
+            return stats[key]
+
+        # Attempts and last_seen come from the quiz counters; answers carry no timestamp of their own
+        quizzes = (
+            Quiz.objects.filter(user_id__in=user_ids, answered_count__gt=0)
+            .values('user_id', 'language', 'difficulty')
+            .annotate(attempts=Count('id'), last_seen=Max('created_at'))
+        )
+        for quiz in quizzes:
+            stat = row(quiz['user_id'], quiz['language'], quiz['difficulty'])
+            stat.attempts += quiz['attempts']
+            stat.last_seen = max(filter(None, [stat.last_seen, quiz['last_seen']]))
+
+        # Answers in the order they were recorded, so streaks replay exactly
+        answers = (
+            UserAnswer.objects.filter(quiz__user_id__in=user_ids)
+            .order_by('id')
+            .values_list('quiz__user_id', 'quiz__language', 'quiz__difficulty', 'is_correct', 'selected_option_id')
+        )
+        for user_id, language, difficulty, is_correct, selected_option_id in answers.iterator(chunk_size=2000):
+            stat = row(user_id, language, difficulty)
+            stat.questions_answered += 1
+            stat.skipped_answers += selected_option_id is None
+            if is_correct:
+                stat.correct_answers += 1
+                stat.current_streak += 1
+                stat.best_streak = max(stat.best_streak, stat.current_streak)
+            else:
+                stat.current_streak = 0
+
+        return list(stats.values())
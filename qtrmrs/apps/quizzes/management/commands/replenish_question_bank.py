@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ai_agent.executor import get_executor
+from apps.ai_agent.services import QuizGenerator
+from apps.quizzes.services import QuestionBank, clean_questions
+
+# Gemini is asked for at most this many questions per call
+BATCH_SIZE = 10
+
+
+class Command(BaseCommand):
+    help = "Keeps the question bank topped up for the most popular (language, level, topic) keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', type=int, default=50, help="Questions to keep per key.")
+        parser.add_argument('--top', type=int, default=20, help="Number of popular keys to maintain.")
+        parser.add_argument('--days', type=int, default=7, help="Popularity window in days.")
+        parser.add_argument('--max-calls', type=int, default=20, help="Gemini calls allowed per pass.")
+        parser.add_argument('--timeout', type=int, default=600, help="Seconds allowed for a pass's Gemini calls.")
+        parser.add_argument('--loop', action='store_true', help="Run forever as a background worker.")
+        parser.add_argument('--interval', type=int, default=300, help="Seconds between passes with --loop.")
+
+    def handle(self, *args, **options):
+        generator = QuizGenerator()
+
+        while True:
+            self.replenish(generator, options)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def replenish(self, generator, options):
+        keys = QuestionBank.popular_keys(limit=options['top'], days=options['days'])
+
+        # Plan every Gemini call up front (within the per-pass budget)...
+        plan = []
+        for language, level, topic, include_code in keys:
+            bank = QuestionBank(language, level, topic, include_code)
+            missing = options['target'] - bank.available()
+            while missing > 0 and len(plan) < options['max_calls']:
+                plan.append((bank, min(BATCH_SIZE, missing)))
+                missing -= BATCH_SIZE
+
+        # ...run them concurrently under the per-model rate limits...
+        def generate(job):
+            bank, count = job
+            return generator.generate_quiz(
+                language=bank.language,
+                topic=bank.topic,
+                level=bank.level,
+                num_questions=count,
+                include_code=bank.include_code,
+                use_cache=False,
+            )
+
+        results = get_executor().map(generate, plan, timeout=options['timeout'], default=[])
+
+        # ...and write the results from this thread
+        for (bank, _), questions_data in zip(plan, results):
+            added = bank.deposit(clean_questions(questions_data))
+            self.stdout.write(f"[{bank.key}] +{added} questions")
+
+        self.stdout.write(self.style.SUCCESS(f"Pass complete: {len(keys)} keys checked, {len(plan)} Gemini calls."))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0002_question_code_snippet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='bank_key',
+            field=models.CharField(blank=True, help_text='language|level|topic|mode of a reusable bank question', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the normalized question and options', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='quiz',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='questions', to='quizzes.quiz'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('quiz__isnull', True)), fields=['bank_key', 'content_hash'], name='question_bank_idx'),
+        ),
+    ]
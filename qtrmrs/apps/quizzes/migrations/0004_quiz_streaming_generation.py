@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0003_question_bank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='first_question_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Time to first question (ms)', null=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='is_generating',
+            field=models.BooleanField(default=False, help_text='Questions are still being streamed in'),
+        ),
+    ]
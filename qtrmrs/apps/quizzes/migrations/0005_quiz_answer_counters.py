@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:10
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Q
+
+
+def backfill_answer_counters(apps, schema_editor):
+    Quiz = apps.get_model('quizzes', 'Quiz')
+    UserAnswer = apps.get_model('quizzes', 'UserAnswer')
+
+    # Keep the first answer per (quiz, question) so the unique constraint in 0006 can be added
+    duplicates = (
+        UserAnswer.objects.values('quiz_id', 'question_id')
+        .annotate(first_id=Min('id'), answers=Count('id'))
+        .filter(answers__gt=1)
+    )
+    for row in duplicates.iterator():
+        UserAnswer.objects.filter(quiz_id=row['quiz_id'], question_id=row['question_id']).exclude(id=row['first_id']).delete()
+
+    quizzes = Quiz.objects.filter(answers__isnull=False).distinct().annotate(
+        answered=Count('answers'),
+        correct=Count('answers', filter=Q(answers__is_correct=True)),
+        skipped=Count('answers', filter=Q(answers__selected_option__isnull=True)),
+    )
+    batch = []
+    for quiz in quizzes.iterator(chunk_size=1000):
+        quiz.answered_count, quiz.correct_count, quiz.skipped_count = quiz.answered, quiz.correct, quiz.skipped
+        batch.append(quiz)
+        if len(batch) >= 1000:
+            Quiz.objects.bulk_update(batch, ['answered_count', 'correct_count', 'skipped_count'])
+            batch = []
+    Quiz.objects.bulk_update(batch, ['answered_count', 'correct_count', 'skipped_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0004_quiz_streaming_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='answered_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='correct_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='skipped_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_answer_counters, migrations.RunPython.noop),
+    ]
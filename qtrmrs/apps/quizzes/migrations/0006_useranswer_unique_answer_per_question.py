@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0005: PostgreSQL refuses to ALTER a table with rows deleted earlier in the same transaction
+
+    dependencies = [
+        ('quizzes', '0005_quiz_answer_counters'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='useranswer',
+            constraint=models.UniqueConstraint(fields=('quiz', 'question'), name='unique_answer_per_question'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0006_useranswer_unique_answer_per_question'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='option',
+            index=models.Index(condition=models.Q(('is_correct', True)), fields=['question'], name='option_correct_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['user', '-created_at'], name='quiz_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['created_at'], name='quiz_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['language', 'name'], name='topic_language_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useranswer',
+            index=models.Index(condition=models.Q(('error_explanation', ''), ('is_correct', False)), fields=['quiz'], name='answer_needs_explanation_idx'),
+        ),
+    ]
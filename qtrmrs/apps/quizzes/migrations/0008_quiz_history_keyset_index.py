@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0007_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='quiz',
+            name='quiz_user_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='quiz_user_created_idx'),
+        ),
+    ]
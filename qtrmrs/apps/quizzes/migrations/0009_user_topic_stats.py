@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0008_quiz_history_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTopicStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(help_text='Normalized (lowercase) language', max_length=50)),
+                ('difficulty', models.CharField(choices=[('beginner', 'Beginner'), ('intermediate', 'Intermediate'), ('expert', 'Expert')], max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Quizzes with at least one answer')),
+                ('questions_answered', models.PositiveIntegerField(default=0)),
+                ('correct_answers', models.PositiveIntegerField(default=0)),
+                ('skipped_answers', models.PositiveIntegerField(default=0)),
+                ('current_streak', models.PositiveIntegerField(default=0, help_text='Consecutive correct answers so far')),
+                ('best_streak', models.PositiveIntegerField(default=0)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'user topic stats',
+                'constraints': [models.UniqueConstraint(fields=('user', 'language', 'difficulty'), name='unique_user_topic_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0009_user_topic_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aimodel',
+            name='tasks',
+            field=models.CharField(blank=True, help_text='Comma-separated tasks this model serves (quiz, explanation, intent). Blank means all.', max_length=100),
+        ),
+    ]
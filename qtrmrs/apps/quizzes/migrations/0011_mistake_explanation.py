@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:15
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def _normalize(value):
+    return " ".join(str(value or "").split()).casefold()
+
+
+def backfill_content_hashes(apps, schema_editor):
+    # Generated questions had no content_hash; explanations are shared on it.
+    # Same digest as services.question_content_hash, frozen here.
+    Question = apps.get_model('quizzes', 'Question')
+    blank = Question.objects.filter(content_hash='').order_by('id').prefetch_related('options')
+    last_id = 0
+    while True:
+        batch = list(blank.filter(id__gt=last_id)[:1000])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for question in batch:
+            parts = [_normalize(question.text), _normalize(question.code_snippet)]
+            parts += sorted(_normalize(option.text) for option in question.options.all())
+            question.content_hash = hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+        Question.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0010_aimodel_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MistakeExplanation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question_hash', models.CharField(max_length=64)),
+                ('option_hash', models.CharField(blank=True, help_text='Blank for a skipped question', max_length=64)),
+                ('text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('question_hash', 'option_hash'), name='unique_mistake_explanation')],
+            },
+        ),
+        migrations.RunPython(backfill_content_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+def drop_unkeyed_explanations(apps, schema_editor):
+    # Shared without knowing which option was correct: they may explain the wrong answer
+    apps.get_model('quizzes', 'MistakeExplanation').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0011_mistake_explanation'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_unkeyed_explanations, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='mistakeexplanation',
+            name='unique_mistake_explanation',
+        ),
+        migrations.AddField(
+            model_name='mistakeexplanation',
+            name='correct_hash',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='mistakeexplanation',
+            constraint=models.UniqueConstraint(
+                fields=('question_hash', 'correct_hash', 'option_hash'), name='unique_mistake_explanation',
+            ),
+        ),
+    ]
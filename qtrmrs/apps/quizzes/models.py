@@ -2,13 +2,16 @@ from django.db import models
 from django.conf import settings
 
 
-
 class AIModel(models.Model):
     """Manages available Gemini versions (Flash, Pro, etc.)"""
     display_name = models.CharField(max_length=100)
     model_name = models.CharField(max_length=100, help_text="The API string, e.g., 'gemini-1.5-flash'")
     is_active = models.BooleanField(default=True)
     is_default = models.BooleanField(default=False)
+    tasks = models.CharField(
+        max_length=100, blank=True,
+        help_text="Comma-separated tasks this model serves (quiz, explanation, intent). Blank means all."
+    )
 
     def __str__(self):
         return self.display_name
@@ -21,6 +24,9 @@ class Topic(models.Model):
     
     class Meta:
         ordering = ['language', 'name']
+        indexes = [
+            models.Index(fields=['language', 'name'], name='topic_language_idx'),
+        ]
 
     def __str__(self):
         return f"{self.language} - {self.name}"
@@ -46,16 +52,47 @@ class Quiz(models.Model):
     score = models.IntegerField(default=0, help_text="Score percentage")
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    # Streaming generation
+    is_generating = models.BooleanField(default=False, help_text="Questions are still being streamed in")
+    first_question_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Time to first question (ms)")
+
+    # Answer counters, kept in step with UserAnswer inserts by record_answer()
+    answered_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Dashboard history: a user's quizzes, newest first (keyset on created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='quiz_user_created_idx'),
+            # Question bank popularity window
+            models.Index(fields=['created_at'], name='quiz_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.language} ({self.difficulty}) - {self.user.email}"
 
 
 class Question(models.Model):
-    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='questions')
+    # Bank questions have no quiz; sessions get their own copies
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='questions', null=True, blank=True)
     text = models.TextField()
     # Stores the code block (optional)
     code_snippet = models.TextField(blank=True, null=True, help_text="Code context for the question")
     explanation = models.TextField(blank=True, help_text="AI explanation for the correct answer")
+
+    # Question Bank
+    bank_key = models.CharField(max_length=255, blank=True, help_text="language|level|topic|mode of a reusable bank question")
+    content_hash = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the normalized question and options")
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['bank_key', 'content_hash'],
+                condition=models.Q(quiz__isnull=True),
+                name='question_bank_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.text[:50]
@@ -66,6 +103,12 @@ class Option(models.Model):
     text = models.CharField(max_length=255)
     is_correct = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Results page: the correct option of each answered question
+            models.Index(fields=['question'], condition=models.Q(is_correct=True), name='option_correct_idx'),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -80,6 +123,77 @@ class UserAnswer(models.Model):
     # Store the specific AI explanation for *this* error here if needed
     error_explanation = models.TextField(blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'question'], name='unique_answer_per_question'),
+        ]
+        indexes = [
+            # "Explain all mistakes": wrong or skipped answers still without an explanation
+            models.Index(
+                fields=['quiz'],
+                condition=models.Q(is_correct=False, error_explanation=''),
+                name='answer_needs_explanation_idx',
+            ),
+        ]
+
     def __str__(self):
         status = "Correct" if self.is_correct else "Incorrect"
-        return f"{status} answer for {self.question.id}"
\ No newline at end of file
+        return f"{status} answer for {self.question.id}"
+
+
+class MistakeExplanation(models.Model):
+    """
+    An explanation of one mistake shared by every user who makes it: keyed
+    on the question's content_hash, a hash of the correct option's text
+    (content_hash doesn't say which option is right) and a hash of the
+    chosen option's text (blank for a skipped question). See
+    services.ExplanationStore.
+    """
+    question_hash = models.CharField(max_length=64)
+    correct_hash = models.CharField(max_length=64)
+    option_hash = models.CharField(max_length=64, blank=True, help_text="Blank for a skipped question")
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['question_hash', 'correct_hash', 'option_hash'], name='unique_mistake_explanation',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.question_hash[:12]}/{self.option_hash[:12] or 'skipped'}"
+
+
+class UserTopicStats(models.Model):
+    """
+    Per user x language x difficulty rollup, updated as each answer is
+    recorded (see services.record_answer) so dashboards never scan UserAnswer.
+    Rebuild it with `manage.py rebuild_topic_stats`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='topic_stats')
+    language = models.CharField(max_length=50, help_text="Normalized (lowercase) language")
+    difficulty = models.CharField(max_length=20, choices=Quiz.DIFFICULTY_CHOICES)
+
+    attempts = models.PositiveIntegerField(default=0, help_text="Quizzes with at least one answer")
+    questions_answered = models.PositiveIntegerField(default=0)
+    correct_answers = models.PositiveIntegerField(default=0)
+    skipped_answers = models.PositiveIntegerField(default=0)
+    current_streak = models.PositiveIntegerField(default=0, help_text="Consecutive correct answers so far")
+    best_streak = models.PositiveIntegerField(default=0)
+    last_seen = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "user topic stats"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'language', 'difficulty'], name='unique_user_topic_stats'),
+        ]
+
+    @property
+    def accuracy(self):
+        """Percentage of answered questions that were correct."""
+        return round(self.correct_answers / self.questions_answered * 100, 1) if self.questions_answered else 0
+
+    def __str__(self):
+        return f"{self.user} - {self.language} ({self.difficulty})"
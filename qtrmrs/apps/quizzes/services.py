@@ -0,0 +1,988 @@
+import asyncio
+import hashlib
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Prefetch
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from apps.ai_agent.cache import LRUCache, get_cache_config, normalize_text
+from apps.core.metrics import ANSWERS_SUBMITTED, EXPLANATIONS_GENERATED, EXPLANATION_LOOKUPS, QUIZZES_CREATED
+from apps.jobs.queue import enqueue
+from .models import MistakeExplanation, Quiz, Question, Option, UserAnswer, UserTopicStats
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationIncomplete(Exception):
+    """Gemini delivered less than asked for; raised on the job path so the job is retried."""
+
+
+def make_bank_key(language, level, topic, include_code=False):
+    """Normalized (language, level, topic, mode) key shared by the bank and its worker."""
+    mode = 'code' if include_code else 'text'
+    key = "|".join([normalize_text(language), normalize_text(level), normalize_text(topic), mode])
+    return key[:255]
+
+
+def question_content_hash(text, code_snippet, options):
+    """Identifies a question by content so duplicates (e.g. cached generations) are skipped."""
+    parts = [normalize_text(text), normalize_text(code_snippet)] + sorted(normalize_text(o) for o in options)
+    return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+
+# ==========================================
+# PERSISTENCE
+# ==========================================
+
+OPTION_MAX_LENGTH = Option._meta.get_field('text').max_length
+
+
+def clean_question(q_data):
+    """
+    Validates one AI-generated question. Returns a normalized copy, or None
+    if it can't be played (no text, fewer than two options, or a correct
+    answer that matches none of the options).
+    """
+    if not isinstance(q_data, dict):
+        return None
+
+    text = str(q_data.get('text') or '').strip()
+    options = []
+    for opt in q_data.get('options') or []:
+        opt = str(opt).strip()[:OPTION_MAX_LENGTH]
+        if opt and opt not in options:
+            options.append(opt)
+
+    correct = str(q_data.get('correct_answer') or '').strip()[:OPTION_MAX_LENGTH]
+    if correct not in options:
+        # Models sometimes change the casing of the answer they repeat
+        matches = [opt for opt in options if opt.casefold() == correct.casefold()]
+        correct = matches[0] if len(matches) == 1 else None
+
+    if not text or len(options) < 2 or correct is None:
+        return None
+
+    return {
+        'text': text,
+        'code_snippet': q_data.get('code_snippet') or '',
+        'options': options,
+        'correct_answer': correct,
+        'explanation': q_data.get('explanation') or '',
+    }
+
+
+def clean_questions(questions_data):
+    """Validates a whole AI payload once, at the boundary, dropping unplayable questions."""
+    cleaned = [q for q in map(clean_question, questions_data or []) if q]
+    if len(cleaned) < len(questions_data or []):
+        logger.warning(f"Dropped {len(questions_data) - len(cleaned)} malformed AI questions")
+    return cleaned
+
+
+def bulk_create_questions(questions, refetch):
+    """
+    bulk_create that always returns saved rows with primary keys.
+    Backends that return PKs from a bulk INSERT (PostgreSQL, SQLite 3.35+)
+    need one query; others re-read the new rows with `refetch()`, which must
+    return them in the same order as `questions`.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Question.objects.bulk_create(questions)
+
+    Question.objects.bulk_create(questions)
+    return list(refetch())
+
+
+def build_options(question, q_data):
+    return [
+        Option(question=question, text=opt_text, is_correct=(opt_text == q_data['correct_answer']))
+        for opt_text in q_data['options']
+    ]
+
+
+def save_generated_quiz(user, language, topic, level, model_used, questions_data=(), bank_questions=(), total_questions=None):
+    """
+    Creates a quiz with its questions and options in one transaction using
+    bulk INSERTs (1 quiz + 2 per source instead of 1 + 5N round-trips).
+    `questions_data` must already be validated with clean_questions().
+    `total_questions` defaults to what is saved now; pass the expected
+    count when more questions will stream in.
+    """
+    saved_count = len(bank_questions) + len(questions_data)
+
+    with transaction.atomic():
+        quiz = Quiz.objects.create(
+            user=user,
+            language=language,
+            topic_description=f"{language}: {topic}",
+            difficulty=str(level).lower(),
+            total_questions=saved_count if total_questions is None else total_questions,
+            model_used=model_used,
+        )
+
+        copy_bank_questions(quiz, bank_questions)
+
+        if questions_data:
+            questions = bulk_create_questions(
+                [
+                    Question(
+                        quiz=quiz,
+                        text=q_data['text'],
+                        code_snippet=q_data['code_snippet'],
+                        explanation=q_data['explanation'],
+                        content_hash=question_content_hash(q_data['text'], q_data['code_snippet'], q_data['options']),
+                    )
+                    for q_data in questions_data
+                ],
+                refetch=lambda: quiz.questions.order_by('-id')[:len(questions_data)][::-1],
+            )
+            Option.objects.bulk_create([
+                option
+                for question, q_data in zip(questions, questions_data)
+                for option in build_options(question, q_data)
+            ])
+
+    return quiz
+
+
+class QuestionBank:
+    """
+    Pool of reusable, pre-generated questions for one (language, level, topic)
+    key. Bank rows are Questions without a quiz; sessions receive copies.
+    """
+
+    def __init__(self, language, level, topic, include_code=False):
+        self.language = language
+        self.level = level
+        self.topic = topic
+        self.include_code = include_code
+        self.key = make_bank_key(language, level, topic, include_code)
+
+    def questions(self):
+        return Question.objects.filter(quiz__isnull=True, bank_key=self.key)
+
+    def available(self):
+        return self.questions().count()
+
+    def sample(self, count):
+        """Random sample of up to `count` bank questions, options prefetched."""
+        ids = list(self.questions().values_list('id', flat=True))
+        if not ids:
+            return []
+
+        picked = random.sample(ids, min(count, len(ids)))
+        by_id = self.questions().prefetch_related('options').in_bulk(picked)
+        return [by_id[pk] for pk in picked if pk in by_id]
+
+    def deposit(self, questions_data):
+        """Stores validated AI questions in the bank, skipping duplicates. Returns the number added."""
+        candidates = {}
+        for q_data in questions_data:
+            content_hash = question_content_hash(q_data['text'], q_data.get('code_snippet'), q_data['options'])
+            candidates.setdefault(content_hash, q_data)
+
+        existing = set(
+            self.questions()
+            .filter(content_hash__in=candidates.keys())
+            .values_list('content_hash', flat=True)
+        )
+        fresh = {h: q for h, q in candidates.items() if h not in existing}
+        if not fresh:
+            return 0
+
+        questions = bulk_create_questions(
+            [
+                Question(
+                    text=q_data['text'],
+                    code_snippet=q_data.get('code_snippet', ''),
+                    explanation=q_data.get('explanation', ''),
+                    bank_key=self.key,
+                    content_hash=content_hash,
+                )
+                for content_hash, q_data in fresh.items()
+            ],
+            refetch=lambda: sorted(
+                self.questions().filter(content_hash__in=fresh.keys()),
+                key=lambda q: list(fresh).index(q.content_hash),
+            ),
+        )
+
+        Option.objects.bulk_create([
+            option
+            for question, q_data in zip(questions, fresh.values())
+            for option in build_options(question, q_data)
+        ])
+        return len(questions)
+
+    @staticmethod
+    def popular_keys(limit=20, days=7):
+        """
+        Most requested (language, level, topic, include_code) combinations
+        over the last `days`, derived from quiz history.
+        """
+        has_code = Question.objects.filter(quiz=OuterRef('pk')).exclude(code_snippet='').exclude(code_snippet__isnull=True)
+        rows = (
+            Quiz.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+            .annotate(include_code=Exists(has_code))
+            .values('language', 'difficulty', 'topic_description', 'include_code')
+            .annotate(requests=Count('id'))
+            .order_by('-requests')[:limit]
+        )
+
+        keys = []
+        for row in rows:
+            # topic_description is stored as "<language>: <topic>"
+            prefix = f"{row['language']}: "
+            topic = row['topic_description']
+            if topic.startswith(prefix):
+                topic = topic[len(prefix):]
+            keys.append((row['language'], row['difficulty'], topic, row['include_code']))
+        return keys
+
+
+def copy_bank_questions(quiz, bank_questions):
+    """Attaches copies of bank questions (and their options) to a quiz session with two bulk INSERTs."""
+    if not bank_questions:
+        return []
+
+    copies = bulk_create_questions(
+        [
+            Question(
+                quiz=quiz,
+                text=source.text,
+                code_snippet=source.code_snippet,
+                explanation=source.explanation,
+                content_hash=source.content_hash,
+            )
+            for source in bank_questions
+        ],
+        refetch=lambda: quiz.questions.order_by('-id')[:len(bank_questions)][::-1],
+    )
+
+    Option.objects.bulk_create([
+        Option(question=copy, text=option.text, is_correct=option.is_correct)
+        for copy, source in zip(copies, bank_questions)
+        for option in source.options.all()
+    ])
+    return copies
+
+
+def save_question(quiz, q_data):
+    """Persists one validated question and its options (used while streaming)."""
+    question = Question.objects.create(
+        quiz=quiz,
+        text=q_data['text'],
+        code_snippet=q_data['code_snippet'],
+        explanation=q_data['explanation'],
+        content_hash=question_content_hash(q_data['text'], q_data['code_snippet'], q_data['options']),
+    )
+    Option.objects.bulk_create(build_options(question, q_data))
+    return question
+
+
+def is_still_generating(quiz):
+    """
+    True while questions are still streaming in. A quiz whose worker died
+    (e.g. gunicorn recycled it) stops counting after AI_GENERATION_TIMEOUT.
+    """
+    if not quiz.is_generating:
+        return False
+    deadline = quiz.created_at + timedelta(seconds=settings.AI_GENERATION_TIMEOUT)
+    return timezone.now() < deadline
+
+
+def finish_generation(quiz_id):
+    """
+    Ends a quiz's generation: total_questions becomes the number actually
+    saved and the score, so far taken against the expected count, is
+    recomputed against it. A quiz that got no questions at all is deleted
+    rather than left empty in the user's history.
+    """
+    total = Question.objects.filter(quiz_id=quiz_id).count()
+    if total == 0:
+        Quiz.objects.filter(pk=quiz_id).delete()
+        return
+    Quiz.objects.filter(pk=quiz_id).update(
+        is_generating=False, total_questions=total, score=F('correct_count') * 100 / max(total, 1),
+    )
+
+
+def record_answer(quiz, question_id, selected_option=None):
+    """
+    Saves one answer and bumps the quiz's counters and score with F()
+    expressions in the same transaction. Returns False, recording nothing,
+    if the question was already answered (e.g. a double submit).
+    """
+    is_correct = bool(selected_option and selected_option.is_correct)
+    counters = {'answered_count': F('answered_count') + 1}
+    if selected_option is None:
+        counters['skipped_count'] = F('skipped_count') + 1
+    if is_correct:
+        counters['correct_count'] = F('correct_count') + 1
+        # The UPDATE reads the pre-increment row, hence the + 1
+        counters['score'] = (F('correct_count') + 1) * 100 / Greatest(F('total_questions'), 1)
+
+    try:
+        with transaction.atomic():
+            UserAnswer.objects.create(
+                quiz=quiz, question_id=question_id, selected_option=selected_option, is_correct=is_correct
+            )
+            # Only the UPDATE that moves answered_count off 0 counts a new attempt, even
+            # if concurrent submits both loaded the quiz before either was answered
+            first_answer = bool(
+                quiz.answered_count == 0 and Quiz.objects.filter(pk=quiz.pk, answered_count=0).update(**counters)
+            )
+            if not first_answer:
+                Quiz.objects.filter(pk=quiz.pk).update(**counters)
+            update_topic_stats(quiz, is_correct=is_correct, skipped=selected_option is None, first_answer=first_answer)
+    except IntegrityError:
+        return False
+    ANSWERS_SUBMITTED.inc(result='skipped' if selected_option is None else 'correct' if is_correct else 'wrong')
+    return True
+
+
+def update_topic_stats(quiz, is_correct, skipped, first_answer):
+    """Folds one answer into the user's UserTopicStats row: one UPDATE, or an INSERT the first time."""
+    now = timezone.now()
+    changes = {'questions_answered': F('questions_answered') + 1, 'last_seen': now}
+    if first_answer:
+        changes['attempts'] = F('attempts') + 1
+    if skipped:
+        changes['skipped_answers'] = F('skipped_answers') + 1
+    if is_correct:
+        changes['correct_answers'] = F('correct_answers') + 1
+        changes['current_streak'] = F('current_streak') + 1
+        changes['best_streak'] = Greatest(F('best_streak'), F('current_streak') + 1)
+    else:
+        changes['current_streak'] = 0
+
+    key = {'user_id': quiz.user_id, 'language': normalize_text(quiz.language), 'difficulty': quiz.difficulty}
+    rows = UserTopicStats.objects.filter(**key)
+    if rows.update(**changes):
+        return
+
+    try:
+        with transaction.atomic():
+            UserTopicStats.objects.create(
+                **key,
+                attempts=1,
+                questions_answered=1,
+                correct_answers=int(is_correct),
+                skipped_answers=int(skipped),
+                current_streak=int(is_correct),
+                best_streak=int(is_correct),
+                last_seen=now,
+            )
+    except IntegrityError:
+        # Created concurrently by another request
+        rows.update(**changes)
+
+
+def answers_with_correct_option(quiz):
+    """Answers with question/selection joined and each question's correct option prefetched in one query."""
+    correct_options = Prefetch('question__options', queryset=Option.objects.filter(is_correct=True), to_attr='correct_options')
+    return (
+        UserAnswer.objects.filter(quiz=quiz)
+        .select_related('question', 'selected_option')
+        .prefetch_related(correct_options)
+    )
+
+
+def describe_mistakes(answers):
+    """The generate_explanations() payload for wrong or skipped answers."""
+    return [
+        {
+            'id': ans.question_id,
+            'question_text': ans.question.text,
+            'user_answer': ans.selected_option.text if ans.selected_option else "Skipped",
+            'correct_answer': ans.question.correct_options[0].text if ans.question.correct_options else "",
+        }
+        for ans in answers
+    ]
+
+
+def explain_mistakes(quiz, generator, answers=None, raise_errors=False):
+    """
+    Explains the quiz's wrong or skipped answers that have none yet: from
+    the shared ExplanationStore where someone made the same mistake before,
+    the rest in ONE batched call. Returns how many were saved. Pass the
+    answers_with_correct_option() list a page will render as `answers`
+    to fill it in place instead of re-reading them. With raise_errors,
+    answers left unexplained raise GenerationIncomplete (after saving the rest).
+    """
+    if answers is None:
+        # is_correct=False covers both Wrong and Skipped
+        answers = answers_with_correct_option(quiz).filter(is_correct=False, error_explanation='')
+    served, remaining = apply_cached_explanations(answers)
+    if not remaining:
+        return len(served)
+
+    explanations = generator.generate_explanations(describe_mistakes(remaining))
+    explained = save_explanations(remaining, explanations)
+    if raise_errors and len(explained) < len(remaining):
+        raise GenerationIncomplete(f"{len(remaining) - len(explained)} mistake(s) left unexplained")
+    return len(served) + len(explained)
+
+
+def save_explanations(answers, explanations):
+    """
+    Saves freshly generated explanations ({question_id: text}) onto their
+    answers and shares them through the ExplanationStore. Returns the
+    answers that got one.
+    """
+    explained = []
+    for ans in answers:
+        if ans.question_id in explanations:
+            ans.error_explanation = explanations[ans.question_id]
+            explained.append(ans)
+    UserAnswer.objects.bulk_update(explained, ['error_explanation'])
+    get_explanation_store().put_many({mistake_key(ans): ans.error_explanation for ans in explained})
+    EXPLANATIONS_GENERATED.inc(len(explained))
+    return explained
+
+
+# ==========================================
+# SHARED EXPLANATIONS (AI_EXPLANATION_CACHE)
+# ==========================================
+
+EXPLANATION_CACHE_DEFAULTS = {
+    "ENABLED": True,
+    "LOCAL_MAX_ENTRIES": 2048,
+    "LOCAL_TTL": 3600,
+}
+
+
+def option_content_hash(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def mistake_key(answer):
+    """
+    (question content_hash, correct option hash, chosen option hash) that
+    explanations of a wrong or skipped answer are shared under, or None if
+    it can't be shared. Expects answers_with_correct_option() rows.
+    """
+    correct_options = answer.question.correct_options
+    if answer.is_correct or not answer.question.content_hash or len(correct_options) != 1:
+        return None
+    option_hash = option_content_hash(answer.selected_option.text) if answer.selected_option_id else ''
+    return answer.question.content_hash, option_content_hash(correct_options[0].text), option_hash
+
+
+class ExplanationStore:
+    """
+    Explanations of mistakes shared across users: MistakeExplanation rows
+    with a per-process LRU in front, so a popular mistake is explained by
+    Gemini once and served from memory after that.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_cache_config("AI_EXPLANATION_CACHE", EXPLANATION_CACHE_DEFAULTS)
+        self.enabled = self.config["ENABLED"]
+        self.local = LRUCache(max_entries=self.config["LOCAL_MAX_ENTRIES"], ttl=self.config["LOCAL_TTL"])
+
+    def get_many(self, keys):
+        """{key: text} for the keys explained before; whatever the LRU lacks costs one query."""
+        keys = {key for key in keys if key}
+        if not self.enabled or not keys:
+            return {}
+
+        found = {}
+        for key in keys:
+            text = self.local.get(key)
+            if text is not None:
+                found[key] = text
+
+        missing = keys - found.keys()
+        if missing:
+            # The question hash leads the unique index; the few options per question are matched here
+            rows = MistakeExplanation.objects.filter(
+                question_hash__in={key[0] for key in missing}
+            ).values_list('question_hash', 'correct_hash', 'option_hash', 'text')
+            for *key, text in rows:
+                key = tuple(key)
+                if key in missing:
+                    found[key] = text
+                    self.local.set(key, text)
+
+        EXPLANATION_LOOKUPS.inc(len(found), result='hit')
+        EXPLANATION_LOOKUPS.inc(len(keys) - len(found), result='miss')
+        return found
+
+    def put_many(self, explanations):
+        """Shares {key: text}; a mistake already explained by someone else keeps its first explanation."""
+        explanations = {key: text for key, text in explanations.items() if key and text}
+        if not self.enabled or not explanations:
+            return
+        for key, text in explanations.items():
+            self.local.set(key, text)
+        MistakeExplanation.objects.bulk_create(
+            [
+                MistakeExplanation(question_hash=question_hash, correct_hash=correct_hash, option_hash=option_hash, text=text)
+                for (question_hash, correct_hash, option_hash), text in explanations.items()
+            ],
+            ignore_conflicts=True,
+        )
+
+
+_explanation_store = None
+
+
+def get_explanation_store():
+    """Process-wide ExplanationStore (the LRU tier only helps if it is shared)."""
+    global _explanation_store
+    if _explanation_store is None:
+        _explanation_store = ExplanationStore()
+    return _explanation_store
+
+
+def apply_cached_explanations(answers, save=True):
+    """
+    Fills in wrong or skipped answers that have no explanation yet from the
+    ExplanationStore with one bulk lookup, saving them unless save=False.
+    Returns (served, remaining): the answers filled in and those still
+    without one.
+    """
+    pending = [ans for ans in answers if not ans.is_correct and not ans.error_explanation]
+    if not pending:
+        return [], []
+
+    keys = [mistake_key(ans) for ans in pending]
+    cached = get_explanation_store().get_many(keys)
+    served, remaining = [], []
+    for ans, key in zip(pending, keys):
+        text = cached.get(key)
+        if text:
+            ans.error_explanation = text
+            served.append(ans)
+        else:
+            remaining.append(ans)
+    if served and save:
+        UserAnswer.objects.bulk_update(served, ['error_explanation'])
+    return served, remaining
+
+
+class PlayState:
+    """
+    Per-quiz player state kept in the user's session: question ids in play
+    order (answered first) and a cursor at the next unanswered one. Serving
+    a question is one keyed lookup plus one question+options fetch; the
+    state is rebuilt from the database when it is missing or stale.
+    """
+
+    SESSION_KEY = 'play_state'
+    # Only the most recently played quizzes are kept in the session
+    MAX_QUIZZES = 3
+
+    def __init__(self, session, quiz):
+        self.session = session
+        self.quiz = quiz
+        state = session.get(self.SESSION_KEY, {}).get(str(quiz.pk))
+        if state is None:
+            self.rebuild()
+        else:
+            self.ids, self.cursor = state['ids'], state['cursor']
+
+    def rebuild(self):
+        """Reloads the order from the database (two queries) and saves it."""
+        question_ids = list(self.quiz.questions.order_by('id').values_list('id', flat=True))
+        known = set(question_ids)
+        answered = [
+            question_id
+            for question_id in self.quiz.answers.order_by('id').values_list('question_id', flat=True)
+            if question_id in known
+        ]
+        answered_set = set(answered)
+        self.ids = answered + [question_id for question_id in question_ids if question_id not in answered_set]
+        self.cursor = len(answered)
+        self.save()
+
+    def save(self):
+        states = self.session.get(self.SESSION_KEY, {})
+        states.pop(str(self.quiz.pk), None)
+        states[str(self.quiz.pk)] = {'ids': self.ids, 'cursor': self.cursor}
+        while len(states) > self.MAX_QUIZZES:
+            states.pop(next(iter(states)))
+        # Reassign so the session notices the change
+        self.session[self.SESSION_KEY] = states
+
+    @property
+    def answered_count(self):
+        return self.cursor
+
+    @property
+    def question_number(self):
+        return self.cursor + 1
+
+    @property
+    def progress(self):
+        total = self.quiz.total_questions
+        return (self.cursor / total * 100) if total > 0 else 0
+
+    @property
+    def is_last(self):
+        return self.cursor + 1 == self.quiz.total_questions
+
+    def current_id(self):
+        """Id of the next unanswered question, or None."""
+        behind = len(self.ids) < self.quiz.total_questions or is_still_generating(self.quiz)
+        if self.cursor >= len(self.ids) and behind:
+            # Pick up questions streamed in since the state was built, even
+            # if generation has finished since
+            newer = self.quiz.questions.filter(id__gt=max(self.ids, default=0)).order_by('id')
+            added = list(newer.values_list('id', flat=True))
+            if added:
+                self.ids = self.ids + added
+                self.save()
+        return self.ids[self.cursor] if self.cursor < len(self.ids) else None
+
+    def current_question(self):
+        """The next unanswered question with its options prefetched, or None."""
+        question_id = self.current_id()
+        if question_id is None:
+            return None
+        return Question.objects.prefetch_related('options').filter(pk=question_id).first()
+
+    def is_pending(self, question_id):
+        """True if question_id is an unanswered question of this quiz (rebuilds once if not)."""
+        if question_id in self.ids[self.cursor:]:
+            return True
+        self.rebuild()
+        return question_id in self.ids[self.cursor:]
+
+    def advance(self, question_id):
+        """Marks question_id answered; it must be pending."""
+        position = self.ids.index(question_id, self.cursor)
+        # Answering out of order keeps answered ids ahead of the cursor
+        self.ids.insert(self.cursor, self.ids.pop(position))
+        self.cursor += 1
+        self.save()
+
+
+class StreamingQuizBuilder:
+    """
+    Fills a quiz from Gemini's streamed response on a background thread,
+    saving each question as soon as it is parsed. `start()` returns once
+    the first question is playable; the rest keep arriving while the user
+    answers it.
+    """
+
+    def __init__(self, quiz, generator, bank=None, started=None):
+        self.quiz = quiz
+        self.generator = generator
+        self.bank = bank
+        # Measured from the caller's start (e.g. request arrival) when given
+        self.started = started or time.monotonic()
+        self.first_ready = threading.Event()
+        self.cancelled = threading.Event()
+
+    def start(self, language, topic, level, num_questions, include_code=False, wait=True):
+        """
+        Starts streaming `num_questions` more questions into the quiz and
+        blocks until one is playable. Returns False if none arrived in time.
+        With wait=False it returns at once (the player's progress stream waits).
+        """
+        Quiz.objects.filter(pk=self.quiz.pk).update(is_generating=True)
+        self.quiz.is_generating = True
+
+        # Questions copied from the bank are playable right away
+        if self.quiz.questions.exists():
+            self._record_first_question()
+
+        worker = threading.Thread(
+            target=self.run,
+            args=(language, topic, level, num_questions, include_code),
+            daemon=True,
+        )
+        worker.start()
+        if not wait:
+            return True
+        self.first_ready.wait(timeout=settings.AI_FIRST_QUESTION_TIMEOUT)
+        return self.quiz.questions.exists()
+
+    def _record_first_question(self):
+        elapsed_ms = int((time.monotonic() - self.started) * 1000)
+        Quiz.objects.filter(pk=self.quiz.pk).update(first_question_ms=elapsed_ms)
+        logger.info(f"Time to first question: {elapsed_ms}ms (quiz {self.quiz.pk})")
+        self.first_ready.set()
+
+    def cancel(self):
+        """Stops the worker before its next save, e.g. before the caller deletes the quiz."""
+        self.cancelled.set()
+
+    def run(self, language, topic, level, num_questions, include_code=False, raise_errors=False):
+        """
+        Streams the questions in on the calling thread (start() runs it in
+        the background; job workers call it directly). With raise_errors a
+        failure or a short stream raises, leaving the quiz generating with
+        its expected total_questions so a retry can fill the shortfall.
+        """
+        collected = []
+        complete = False
+
+        try:
+            stream = self.generator.stream_quiz(
+                language=language,
+                topic=topic,
+                level=level,
+                num_questions=num_questions,
+                include_code=include_code,
+            )
+            for q_data in stream:
+                if self.cancelled.is_set():
+                    break
+                q_data = clean_question(q_data)
+                if not q_data:
+                    continue
+
+                save_question(self.quiz, q_data)
+                collected.append(q_data)
+
+                if not self.first_ready.is_set():
+                    self._record_first_question()
+
+                if len(collected) >= num_questions:
+                    break
+
+            if self.bank:
+                self.bank.deposit(collected)
+
+            complete = len(collected) >= num_questions
+            if raise_errors and not complete:
+                raise GenerationIncomplete(f"Got {len(collected)} of {num_questions} questions")
+
+        except Exception as e:
+            logger.error(f"Streaming build failed for quiz {self.quiz.pk}: {e}")
+            if raise_errors:
+                raise
+
+        finally:
+            # A cancelled quiz is the caller's to delete
+            if not self.cancelled.is_set() and (complete or not raise_errors):
+                finish_generation(self.quiz.pk)
+            self.first_ready.set()
+            connection.close()
+
+
+# Keeps references so running generation tasks aren't garbage collected
+_background_tasks = set()
+
+
+class AsyncStreamingQuizBuilder:
+    """
+    Event-loop counterpart of StreamingQuizBuilder for the async views:
+    the stream is consumed by an asyncio task rather than a thread, so an
+    in-flight generation costs no worker thread while it waits on Gemini.
+    """
+
+    def __init__(self, quiz, generator, bank=None, started=None):
+        self.quiz = quiz
+        self.generator = generator
+        self.bank = bank
+        self.started = started or time.monotonic()
+        self.first_ready = asyncio.Event()
+        self.cancelled = False
+        self._task = None
+
+    async def start(self, language, topic, level, num_questions, include_code=False, wait=True):
+        """Same contract as StreamingQuizBuilder.start()."""
+        await Quiz.objects.filter(pk=self.quiz.pk).aupdate(is_generating=True)
+        self.quiz.is_generating = True
+
+        if await self.quiz.questions.aexists():
+            await self._record_first_question()
+
+        self._task = task = asyncio.create_task(self._run(language, topic, level, num_questions, include_code))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        if not wait:
+            return True
+
+        try:
+            await asyncio.wait_for(self.first_ready.wait(), timeout=settings.AI_FIRST_QUESTION_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        return await self.quiz.questions.aexists()
+
+    async def _record_first_question(self):
+        elapsed_ms = int((time.monotonic() - self.started) * 1000)
+        await Quiz.objects.filter(pk=self.quiz.pk).aupdate(first_question_ms=elapsed_ms)
+        logger.info(f"Time to first question: {elapsed_ms}ms (quiz {self.quiz.pk})")
+        self.first_ready.set()
+
+    def cancel(self):
+        """Stops the generation task, even mid-call to Gemini."""
+        self.cancelled = True
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self, language, topic, level, num_questions, include_code):
+        collected = []
+
+        try:
+            stream = self.generator.astream_quiz(
+                language=language,
+                topic=topic,
+                level=level,
+                num_questions=num_questions,
+                include_code=include_code,
+            )
+            async for q_data in stream:
+                q_data = clean_question(q_data)
+                if not q_data:
+                    continue
+
+                await sync_to_async(save_question)(self.quiz, q_data)
+                collected.append(q_data)
+
+                if not self.first_ready.is_set():
+                    await self._record_first_question()
+
+                if len(collected) >= num_questions:
+                    break
+
+            if self.bank:
+                await sync_to_async(self.bank.deposit)(collected)
+
+        except Exception as e:
+            logger.error(f"Streaming build failed for quiz {self.quiz.pk}: {e}")
+
+        finally:
+            if not self.cancelled:
+                await sync_to_async(finish_generation)(self.quiz.pk)
+            self.first_ready.set()
+
+
+# ==========================================
+# BACKGROUND JOBS (AI_BACKGROUND_JOBS, handlers in jobs.py)
+# ==========================================
+
+def enqueue_quiz_generation(quiz, language, topic, level, include_code=False):
+    """
+    Marks the quiz as generating and queues the rest of its questions
+    (up to total_questions) for `manage.py run_workers`. The player polls
+    next_question until they arrive.
+    """
+    Quiz.objects.filter(pk=quiz.pk).update(is_generating=True)
+    quiz.is_generating = True
+    payload = {'quiz_id': quiz.pk, 'language': language, 'topic': topic, 'level': level, 'include_code': include_code}
+    # Someone is waiting on the player: ahead of explanations
+    return enqueue('quizzes.generate_quiz', payload, user=quiz.user, priority=1, dedupe_key=f"quiz:{quiz.pk}")
+
+
+def enqueue_explanations(quiz, user):
+    """Queues explain_mistakes() for the quiz; a second click while it runs gets the same job."""
+    return enqueue('quizzes.explain_mistakes', {'quiz_id': quiz.pk}, user=user, dedupe_key=f"explain:{quiz.pk}")
+
+
+# ==========================================
+# QUIZ CREATION (setup form and chat, sync and async views)
+# ==========================================
+
+class QuizOrder:
+    """
+    One create-quiz request: take what the question bank has, then get the
+    shortfall from Gemini during the request, by streaming it in, or from a
+    worker (AI_BACKGROUND_JOBS). Views only make the Gemini calls, with the
+    sync or the async client; every decision and write happens here.
+    """
+
+    def __init__(self, user, language, topic, level, num_questions, include_code=False, source='form', model_used=None):
+        self.user = user
+        self.language = language
+        self.topic = topic
+        self.level = level
+        self.num_questions = num_questions
+        self.include_code = include_code
+        self.source = source
+        self.model_used = model_used
+        self.bank = QuestionBank(language, level, topic, include_code)
+        self.bank_questions = []
+        self.shortfall = 0
+        self.queued = False
+        self.streaming = False
+
+    def plan(self, generator):
+        """Samples the bank and decides how the shortfall is generated."""
+        self.bank_questions = self.bank.sample(self.num_questions)
+        self.shortfall = self.num_questions - len(self.bank_questions)
+        if self.shortfall <= 0:
+            self.model_used = self.model_used or "Question Bank"
+            return
+
+        self.model_used = self.model_used or generator.model_name
+        # A worker generates the shortfall (`manage.py run_workers`) and the player polls for it
+        self.queued = settings.AI_BACKGROUND_JOBS
+        # Don't start a stream while Gemini's circuit is open: the blocking
+        # path fails fast and falls back to cached variants and the bank
+        self.streaming = not self.queued and settings.AI_STREAMING_GENERATION and generator.is_available()
+
+    @property
+    def generates_now(self):
+        """True when the view must generate the shortfall itself and pass it to save()."""
+        return self.shortfall > 0 and not self.queued and not self.streaming
+
+    @property
+    def generation(self):
+        """Arguments for generate_quiz() and the streaming builders' start()."""
+        return {
+            'language': self.language,
+            'topic': self.topic,
+            'level': self.level,
+            'num_questions': self.shortfall,
+            'include_code': self.include_code,
+        }
+
+    def save(self, generated=()):
+        """
+        Saves the quiz with the bank's questions and `generated`, queueing
+        the shortfall for a worker if planned. None if nothing can be played.
+        """
+        questions_data = clean_questions(generated)
+        if questions_data:
+            self.bank.deposit(questions_data)
+
+        if not (self.streaming or self.queued or self.bank_questions or questions_data):
+            return None
+
+        # Streamed or queued questions arrive later: total_questions is the expected count
+        total_questions = (
+            self.num_questions if self.streaming or self.queued
+            else len(self.bank_questions) + len(questions_data)
+        )
+        quiz = save_generated_quiz(
+            self.user, self.language, self.topic, self.level, self.model_used,
+            questions_data=questions_data, bank_questions=self.bank_questions, total_questions=total_questions,
+        )
+        QUIZZES_CREATED.inc(source=self.source)
+
+        if self.queued:
+            enqueue_quiz_generation(quiz, self.language, self.topic, self.level, self.include_code)
+        return quiz
+
+    def stream(self, quiz, generator, started=None):
+        """Streams the shortfall into the quiz; deletes it and returns False if nothing arrived."""
+        builder = StreamingQuizBuilder(quiz, generator, bank=self.bank, started=started)
+        # With SSE the player's progress stream waits for question 1, not the request
+        if builder.start(**self.generation, wait=not settings.AI_SSE_PROGRESS):
+            return True
+        builder.cancel()
+        quiz.delete()
+        return False
+
+    async def astream(self, quiz, generator, started=None):
+        """stream() for the async views."""
+        builder = AsyncStreamingQuizBuilder(quiz, generator, bank=self.bank, started=started)
+        if await builder.start(**self.generation, wait=not settings.AI_SSE_PROGRESS):
+            return True
+        builder.cancel()
+        await quiz.adelete()
+        return False
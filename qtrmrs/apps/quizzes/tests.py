@@ -1,3 +1,472 @@
-from django.test import TestCase
+import asyncio
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from apps.jobs.models import Job
+from .models import MistakeExplanation, Quiz, UserAnswer, UserTopicStats
+from .services import (
+    AsyncStreamingQuizBuilder, ExplanationStore, PlayState, QuestionBank, QuizOrder, StreamingQuizBuilder,
+    answers_with_correct_option, clean_questions, explain_mistakes, finish_generation, mistake_key, record_answer,
+    save_generated_quiz, save_question,
+)
+
+
+def question(i, correct='a'):
+    return {
+        'text': f"Question {i}?", 'code_snippet': '', 'explanation': '',
+        'options': ['a', 'b'], 'correct_answer': correct,
+    }
+
+
+class FakeGenerator:
+    model_name = 'fake-model'
+
+    def __init__(self, available=True):
+        self.available = available
+
+    def is_available(self):
+        return self.available
+
+
+def make_quiz(user, saved=3, total=None, correct='a'):
+    return save_generated_quiz(
+        user, 'Python', 'Loops', 'beginner', 'test',
+        questions_data=clean_questions([question(i, correct) for i in range(saved)]), total_questions=total,
+    )
+
+
+def correct_option(question):
+    return question.options.get(is_correct=True)
+
+
+@override_settings(AI_STREAMING_GENERATION=False, AI_BACKGROUND_JOBS=False)
+class QuizOrderTests(TestCase):
+    def setUp(self):
+        caches['ai'].clear()
+        self.user = get_user_model().objects.create_user(username='player')
+
+    def order(self, num_questions=3, **kwargs):
+        order = QuizOrder(self.user, 'Python', 'Loops', 'beginner', num_questions, **kwargs)
+        order.plan(FakeGenerator())
+        return order
+
+    def test_served_from_the_bank(self):
+        QuestionBank('Python', 'beginner', 'Loops').deposit([question(i) for i in range(3)])
+        order = self.order()
+        self.assertFalse(order.generates_now)
+
+        quiz = order.save()
+        self.assertEqual((quiz.total_questions, quiz.questions.count()), (3, 3))
+        self.assertEqual(quiz.model_used, "Question Bank")
+
+    def test_generated_shortfall_is_saved_and_banked(self):
+        QuestionBank('Python', 'beginner', 'Loops').deposit([question(0)])
+        order = self.order(source='chat', model_used="Chat Agent")
+        self.assertTrue(order.generates_now)
+        self.assertEqual(order.generation['num_questions'], 2)
+
+        quiz = order.save([question(1), question(2)])
+        self.assertEqual((quiz.total_questions, quiz.questions.count()), (3, 3))
+        self.assertEqual(quiz.model_used, "Chat Agent")
+        self.assertEqual(QuestionBank('Python', 'beginner', 'Loops').available(), 3)
+
+    def test_nothing_to_play(self):
+        self.assertIsNone(self.order().save([]))
+
+    @override_settings(AI_BACKGROUND_JOBS=True)
+    def test_queued_shortfall(self):
+        order = self.order()
+        self.assertFalse(order.generates_now)
+
+        quiz = order.save()
+        self.assertEqual((quiz.total_questions, quiz.questions.count()), (3, 0))
+        self.assertTrue(quiz.is_generating)
+        self.assertEqual(Job.objects.get().payload['quiz_id'], quiz.pk)
+
+
+class RecordAnswerTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='player')
+        self.quiz = make_quiz(self.user, saved=4)
+        self.questions = list(self.quiz.questions.order_by('id'))
+
+    def test_counters_and_score(self):
+        q1, q2, q3, _ = self.questions
+        self.assertTrue(record_answer(self.quiz, q1.id, correct_option(q1)))
+        self.assertTrue(record_answer(self.quiz, q2.id, q2.options.get(is_correct=False)))
+        self.assertTrue(record_answer(self.quiz, q3.id, None))
+
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        self.assertEqual(
+            (quiz.answered_count, quiz.correct_count, quiz.skipped_count, quiz.score), (3, 1, 1, 25)
+        )
+        stats = UserTopicStats.objects.get(user=self.user)
+        self.assertEqual((stats.attempts, stats.questions_answered, stats.correct_answers), (1, 3, 1))
+
+    def test_double_submit_is_recorded_once(self):
+        q1 = self.questions[0]
+        self.assertTrue(record_answer(self.quiz, q1.id, correct_option(q1)))
+        self.assertFalse(record_answer(self.quiz, q1.id, None))
+
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        self.assertEqual((quiz.answered_count, quiz.correct_count, quiz.skipped_count), (1, 1, 0))
+        self.assertEqual(UserAnswer.objects.filter(quiz=self.quiz).count(), 1)
+
+    def test_one_attempt_when_submits_race_on_a_fresh_quiz(self):
+        # Both requests loaded the quiz before either answer was saved
+        stale = [Quiz.objects.get(pk=self.quiz.pk), Quiz.objects.get(pk=self.quiz.pk)]
+        for quiz, q in zip(stale, self.questions):
+            record_answer(quiz, q.id, correct_option(q))
+        self.assertEqual(UserTopicStats.objects.get(user=self.user).attempts, 1)
+
+    def test_score_follows_the_final_question_count(self):
+        # 5 requested, 3 generated, all correct
+        quiz = make_quiz(self.user, saved=3, total=5)
+        for q in quiz.questions.all():
+            record_answer(quiz, q.id, correct_option(q))
+        self.assertEqual(Quiz.objects.get(pk=quiz.pk).score, 60)
+
+        finish_generation(quiz.pk)
+        quiz.refresh_from_db()
+        self.assertEqual((quiz.total_questions, quiz.score), (3, 100))
+
+
+class StreamingGenerator(FakeGenerator):
+    """Streams the given questions; with hang=True the async stream never yields."""
+
+    def __init__(self, questions=(), hang=False):
+        super().__init__()
+        self.questions = list(questions)
+        self.hang = hang
+
+    def stream_quiz(self, **kwargs):
+        yield from self.questions
+
+    async def astream_quiz(self, **kwargs):
+        if self.hang:
+            await asyncio.Event().wait()
+        for q in self.questions:
+            yield q
+
+
+class StreamingBuilderTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='player')
+        self.quiz = make_quiz(self.user, saved=0, total=2)
+        Quiz.objects.filter(pk=self.quiz.pk).update(is_generating=True)
+
+    def run_builder(self, generator, cancel=False):
+        builder = StreamingQuizBuilder(self.quiz, generator)
+        if cancel:
+            builder.cancel()
+        builder.run('Python', 'Loops', 'beginner', 2)
+
+    def test_cancelled_build_leaves_the_quiz_to_the_caller(self):
+        self.run_builder(StreamingGenerator([question(0), question(1)]), cancel=True)
+        quiz = Quiz.objects.get(pk=self.quiz.pk)
+        self.assertEqual((quiz.is_generating, quiz.questions.count()), (True, 0))
+
+    def test_empty_stream_deletes_the_quiz(self):
+        self.run_builder(StreamingGenerator())
+        self.assertFalse(Quiz.objects.filter(pk=self.quiz.pk).exists())
+
+    @override_settings(AI_FIRST_QUESTION_TIMEOUT=0.05)
+    async def test_timed_out_async_build_is_cancelled(self):
+        builder = AsyncStreamingQuizBuilder(self.quiz, StreamingGenerator([question(0)], hang=True))
+        self.assertFalse(await builder.start('Python', 'Loops', 'beginner', 2))
+
+        builder.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await builder._task
+        self.assertEqual(await self.quiz.questions.acount(), 0)
+
+
+class Explainer:
+    """Stands in for QuizGenerator.generate_explanations, counting the mistakes it is asked about."""
+
+    def __init__(self):
+        self.asked = 0
+
+    def generate_explanations(self, mistakes):
+        self.asked += len(mistakes)
+        return {m['id']: f"The answer is {m['correct_answer']}" for m in mistakes}
+
+
+class ExplanationSharingTests(TestCase):
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(username=f"player{i}", email=f"player{i}@example.com") for i in range(3)]
+        self.explainer = Explainer()
+        # Each test starts with a cold per-process tier
+        patcher = mock.patch('apps.quizzes.services._explanation_store', ExplanationStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def answer_wrong(self, user, correct='a'):
+        quiz = make_quiz(user, saved=1, correct=correct)
+        q = quiz.questions.get()
+        record_answer(quiz, q.id, q.options.get(is_correct=False))
+        explain_mistakes(quiz, self.explainer)
+        return UserAnswer.objects.get(quiz=quiz)
+
+    def test_same_mistake_is_explained_once(self):
+        first = self.answer_wrong(self.users[0])
+        second = self.answer_wrong(self.users[1])
+        self.assertEqual(self.explainer.asked, 1)
+        self.assertEqual(second.error_explanation, first.error_explanation)
+
+    def test_question_with_another_correct_answer_is_not_shared(self):
+        # Same text and options, so the same content_hash, but 'b' is right this time
+        first = self.answer_wrong(self.users[0], correct='a')
+        second = self.answer_wrong(self.users[1], correct='b')
+        self.assertEqual(self.explainer.asked, 2)
+        self.assertEqual((first.error_explanation, second.error_explanation), ("The answer is a", "The answer is b"))
+
+    def test_store_keeps_the_first_explanation_and_serves_from_memory(self):
+        self.answer_wrong(self.users[0])
+        answer = answers_with_correct_option(UserAnswer.objects.get().quiz).get()
+        key = mistake_key(answer)
+
+        store = ExplanationStore()
+        store.put_many({key: "A later explanation"})
+        self.assertEqual(MistakeExplanation.objects.get().text, "The answer is a")
+        # The local tier has the late write; a cold process reads the first one from the table
+        with self.assertNumQueries(0):
+            self.assertEqual(store.get_many([key]), {key: "A later explanation"})
+        self.assertEqual(ExplanationStore().get_many([key, None]), {key: "The answer is a"})
+
+
+class PlayStateTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='player')
+        self.quiz = make_quiz(self.user, saved=3)
+        self.ids = list(self.quiz.questions.order_by('id').values_list('id', flat=True))
+        self.session = {}
+
+    def test_cursor_walks_the_quiz_from_the_session(self):
+        state = PlayState(self.session, self.quiz)
+        self.assertEqual((state.current_id(), state.question_number), (self.ids[0], 1))
+        state.advance(self.ids[0])
+
+        # Later requests read the order and cursor from the session alone
+        with self.assertNumQueries(0):
+            state = PlayState(self.session, self.quiz)
+            self.assertEqual((state.current_id(), state.answered_count), (self.ids[1], 1))
+        state.advance(self.ids[1])
+        self.assertTrue(PlayState(self.session, self.quiz).is_last)
+
+    def test_out_of_order_answer_stays_ahead_of_the_cursor(self):
+        state = PlayState(self.session, self.quiz)
+        record_answer(self.quiz, self.ids[2], None)
+        state.advance(self.ids[2])
+        self.assertEqual(state.ids, [self.ids[2], self.ids[0], self.ids[1]])
+        self.assertEqual(state.current_id(), self.ids[0])
+        self.assertFalse(state.is_pending(self.ids[2]))
+
+    def test_answers_from_another_session_rebuild_the_state(self):
+        state = PlayState(self.session, self.quiz)
+        record_answer(self.quiz, self.ids[0], None)
+
+        # What submit_answer does when the other tab got there first
+        self.assertFalse(record_answer(self.quiz, self.ids[0], None))
+        state.rebuild()
+        self.assertEqual((state.cursor, state.current_id()), (1, self.ids[1]))
+        self.assertEqual(PlayState({}, self.quiz).cursor, 1)
+
+    def test_picks_up_streamed_questions(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(is_generating=True)
+        self.quiz.refresh_from_db()
+        state = PlayState(self.session, self.quiz)
+        for question_id in self.ids:
+            state.advance(question_id)
+        self.assertIsNone(state.current_id())
+
+        streamed = save_question(self.quiz, clean_questions([question(9)])[0])
+        self.assertEqual(state.current_id(), streamed.id)
+
+    def test_picks_up_questions_streamed_before_generation_finished(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(is_generating=True, total_questions=5)
+        self.quiz.refresh_from_db()
+        state = PlayState(self.session, self.quiz)
+        for question_id in self.ids:
+            state.advance(question_id)
+
+        # The last question lands and generation ends before the next submit
+        streamed = save_question(self.quiz, clean_questions([question(9)])[0])
+        finish_generation(self.quiz.pk)
+        self.quiz.refresh_from_db()
+        self.assertFalse(self.quiz.is_generating)
+        self.assertEqual(PlayState(self.session, self.quiz).current_id(), streamed.id)
+
+    def test_session_keeps_only_recent_quizzes(self):
+        quizzes = [make_quiz(self.user, saved=1) for _ in range(PlayState.MAX_QUIZZES + 1)]
+        for quiz in quizzes:
+            PlayState(self.session, quiz)
+        self.assertEqual(list(self.session[PlayState.SESSION_KEY]), [str(quiz.pk) for quiz in quizzes[1:]])
+
+
+async def read_events(response):
+    """[(event, data)] from a consumed event stream, without keepalive comments."""
+    body = "".join([chunk.decode() async for chunk in response.streaming_content])
+    events = []
+    for block in body.split("\n\n"):
+        if not block or block.startswith(":"):
+            continue
+        name, *data = block.split("\n")
+        events.append((name.removeprefix("event: "), "\n".join(line.removeprefix("data: ") for line in data)))
+    return events
+
+
+class PartialExplainer:
+    """Stands in for QuizGenerator in explanation_events, explaining only the first mistake."""
+
+    def __init__(self, interactive=False):
+        pass
+
+    async def aiter_explanations(self, mistakes, batch_size):
+        yield {mistakes[0]['id']: "Explained"}
+
+
+@override_settings(SSE={'POLL_SECONDS': 0.01, 'MAX_SECONDS': 5}, AI_SSE_PROGRESS=True)
+class ProgressEventsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='player')
+        self.quiz = make_quiz(self.user, saved=1)
+        patcher = mock.patch('apps.quizzes.services._explanation_store', ExplanationStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def events(self, name, quiz=None):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse(name, args=[(quiz or self.quiz).pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response
+
+    async def test_question_card_follows_progress(self):
+        events = await read_events(await self.events('quiz_events'))
+        self.assertEqual([name for name, _ in events], ['progress', 'progress', 'question'])
+        self.assertEqual(events[1][1], "Question 1/1 ready")
+        self.assertIn("Question 0?", events[2][1])
+
+    async def test_generation_ending_without_a_question_sends_the_player_on(self):
+        question = await self.quiz.questions.aget()
+        await sync_to_async(record_answer)(self.quiz, question.id, None)
+
+        events = await read_events(await self.events('quiz_events'))
+        self.assertEqual([name for name, _ in events], ['progress', 'progress', 'question'])
+        # A one-off poll of next_question, which redirects to the results
+        self.assertIn(reverse('next_question', args=[self.quiz.pk]), events[2][1])
+
+    async def test_failed_generation_ends_the_stream(self):
+        quiz = await sync_to_async(make_quiz)(self.user, saved=0, total=2)
+        await Quiz.objects.filter(pk=quiz.pk).aupdate(is_generating=True)
+        response = await self.events('quiz_events', quiz)
+        # Nothing was streamed in: the quiz is deleted while the player waits
+        await sync_to_async(finish_generation)(quiz.pk)
+
+        events = await read_events(response)
+        self.assertEqual([name for name, _ in events], ['progress', 'question'])
+        self.assertIn("AI failed to generate this quiz", events[1][1])
+
+    async def test_missing_quiz_is_not_found(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('quiz_events', args=[self.quiz.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch('apps.quizzes.views.QuizGenerator', PartialExplainer)
+    async def test_explanations_then_done(self):
+        quiz = await sync_to_async(make_quiz)(self.user, saved=2)
+        async for question in quiz.questions.order_by('id'):
+            await sync_to_async(record_answer)(quiz, question.id, None)
+
+        events = await read_events(await self.events('explanation_events', quiz))
+        self.assertEqual([name for name, _ in events], ['progress', 'explanation', 'progress', 'done'])
+        self.assertEqual((events[0][1], events[2][1]), ("Explaining 2 mistakes...", "Explanation 1/2 ready"))
+        self.assertIn("Explained", events[1][1])
+        self.assertIn("1 mistake couldn't be explained", events[3][1])
+
+    async def test_nothing_to_explain_is_done_at_once(self):
+        events = await read_events(await self.events('explanation_events'))
+        self.assertEqual(events, [('done', '')])
+
+
+class AnswerCountersMigrationTests(TransactionTestCase):
+    before = [('quizzes', '0004_quiz_streaming_generation')]
+    after = [('quizzes', '0006_useranswer_unique_answer_per_question')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_backfills_counters_and_drops_duplicate_answers(self):
+        apps = self.migrate(self.before)
+        Quiz, Question, Option, UserAnswer = (
+            apps.get_model('quizzes', name) for name in ('Quiz', 'Question', 'Option', 'UserAnswer')
+        )
+        user = apps.get_model('users', 'User').objects.create(username='player')
+        quiz = Quiz.objects.create(user=user, language='Python', topic_description='Python: Loops', difficulty='beginner')
+        questions = [Question.objects.create(quiz=quiz, text=f"Q{i}?") for i in range(3)]
+        right = Option.objects.create(question=questions[0], text='a', is_correct=True)
+        wrong = Option.objects.create(question=questions[1], text='b', is_correct=False)
+        UserAnswer.objects.create(quiz=quiz, question=questions[0], selected_option=right, is_correct=True)
+        # A double submit from before the constraint: only the first answer counts
+        UserAnswer.objects.create(quiz=quiz, question=questions[0], selected_option=right, is_correct=True)
+        UserAnswer.objects.create(quiz=quiz, question=questions[1], selected_option=wrong, is_correct=False)
+        UserAnswer.objects.create(quiz=quiz, question=questions[2], selected_option=None, is_correct=False)
+
+        apps = self.migrate(self.after)
+        quiz = apps.get_model('quizzes', 'Quiz').objects.get()
+        self.assertEqual((quiz.answered_count, quiz.correct_count, quiz.skipped_count), (3, 1, 1))
+        self.assertEqual(apps.get_model('quizzes', 'UserAnswer').objects.count(), 3)
+
+
+class TopicStatsTests(TestCase):
+    FIELDS = (
+        'language', 'difficulty', 'attempts', 'questions_answered', 'correct_answers', 'skipped_answers',
+        'current_streak', 'best_streak',
+    )
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(username=f"player{i}", email=f"player{i}@example.com") for i in range(2)
+        ]
+
+    def play(self, user, language, results):
+        quiz = make_quiz(user, saved=len(results))
+        Quiz.objects.filter(pk=quiz.pk).update(language=language)
+        quiz.refresh_from_db()
+        for q, result in zip(quiz.questions.order_by('id'), results):
+            option = None if result is None else q.options.get(is_correct=result)
+            record_answer(quiz, q.id, option)
+
+    def stats(self):
+        return list(UserTopicStats.objects.order_by('user_id', 'language').values_list(*self.FIELDS))
+
+    def test_incremental_stats(self):
+        # "Python" and "python" roll up into one row
+        self.play(self.users[0], 'Python', [True, True, False])
+        self.play(self.users[0], 'python', [True, None])
+        self.assertEqual(self.stats(), [('python', 'beginner', 2, 5, 3, 1, 0, 2)])
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.play(self.users[0], 'Python', [True, False, True])
+        self.play(self.users[0], 'Python', [True, True])
+        self.play(self.users[1], 'Go', [None, True])
+        incremental = self.stats()
+
+        UserTopicStats.objects.update(attempts=99, best_streak=0)
+        call_command('rebuild_topic_stats', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(), incremental)
@@ -1,13 +1,26 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# AI-bound endpoints have async twins for ASGI deployments
+if settings.AI_ASYNC_VIEWS:
+    create_quiz = views.create_quiz_async
+    generate_all_explanations = views.generate_all_explanations_async
+else:
+    create_quiz = views.create_quiz
+    generate_all_explanations = views.generate_all_explanations
+
 urlpatterns = [
     path('setup/', views.quiz_setup, name='quiz_setup'),
-    path('create/', views.create_quiz, name='create_quiz'),
+    path('create/', create_quiz, name='create_quiz'),
     
     path('play/<int:quiz_id>/', views.quiz_player, name='quiz_player'),
     path('play/<int:quiz_id>/submit/<int:question_id>/', views.submit_answer, name='submit_answer'),
+    path('play/<int:quiz_id>/next/', views.next_question, name='next_question'),
+    path('play/<int:quiz_id>/events/', views.quiz_events, name='quiz_events'),
     
     path('results/<int:quiz_id>/', views.quiz_results, name='quiz_results'),
-    path('results/<int:quiz_id>/explain-all/', views.generate_all_explanations, name='generate_all_explanations'),
+    path('results/<int:quiz_id>/explain-all/', generate_all_explanations, name='generate_all_explanations'),
+    path('results/<int:quiz_id>/list/', views.quiz_results_list, name='quiz_results_list'),
+    path('results/<int:quiz_id>/explain-all/events/', views.explanation_events, name='explanation_events'),
 ]
\ No newline at end of file
@@ -1,9 +1,19 @@
-from django.shortcuts import render, redirect, get_object_or_404, HttpResponse
+import asyncio
+import time
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404, HttpResponse
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count
+from django.template.loader import render_to_string
 from django.views.decorators.http import require_http_methods
-from django.db import transaction
 from .models import Quiz, Question, Option, UserAnswer
+from .services import (
+    PlayState, QuizOrder, answers_with_correct_option, apply_cached_explanations, describe_mistakes,
+    enqueue_explanations, explain_mistakes, is_still_generating, record_answer, save_explanations,
+)
 from apps.ai_agent.services import QuizGenerator
+from apps.core.sse import EventStreamResponse, get_config as sse_config, sse_event
 
 # ==========================================
 # 1. QUIZ SETUP & CREATION
@@ -19,63 +29,42 @@ def quiz_setup(request):
 @login_required
 @require_http_methods(["POST"])
 def create_quiz(request):
-    topic = request.POST.get('topic')
-    
-    # --- Handle Custom Language Logic ---
-    lang_select = request.POST.get('language_select')
-    custom_lang = request.POST.get('custom_language')
-    
-    # If custom_lang has text, USE IT. Else, use dropdown.
-    language = custom_lang.strip() if custom_lang and custom_lang.strip() else lang_select
-    
-    level = request.POST.get('level', 'intermediate')
-    num_questions = int(request.POST.get('num_questions', 5))
-    include_code = request.POST.get('include_code') == 'on'
-    
-    generator = QuizGenerator()
-    
-    # Pass the new arguments
-    questions_data = generator.generate_quiz(
-        language=language, 
-        topic=topic, 
-        level=level, 
-        num_questions=num_questions,
-        include_code=include_code
-    )
+    request_started = time.monotonic()
+    order = QuizOrder(request.user, **_read_quiz_form(request.POST))
+    generator = QuizGenerator(interactive=True)
 
-    if not questions_data:
+    # Serve from the pre-generated bank; only the shortfall goes to Gemini
+    order.plan(generator)
+    generated = generator.generate_quiz(**order.generation) if order.generates_now else []
+    quiz = order.save(generated)
+
+    # Stream the rest in; the player polls if the user catches up
+    if quiz is None or (order.streaming and not order.stream(quiz, generator, started=request_started)):
         return render(request, 'components/error_alert.html', {
             'message': "AI failed to generate. Try again."
         })
 
-    with transaction.atomic():
-        quiz = Quiz.objects.create(
-            user=request.user,
-            language=language,
-            topic_description=f"{language}: {topic}",
-            difficulty=level,
-            total_questions=len(questions_data),
-            model_used=generator.model.model_name
-        )
-
-        for q_data in questions_data:
-            question = Question.objects.create(
-                quiz=quiz,
-                text=q_data['text'],
-                code_snippet=q_data.get('code_snippet', ''),
-                explanation=q_data.get('explanation', '')
-            )
-            for opt_text in q_data['options']:
-                Option.objects.create(
-                    question=question,
-                    text=opt_text,
-                    is_correct=(opt_text == q_data['correct_answer'])
-                )
-
     response = HttpResponse()
     response['HX-Redirect'] = f"/quiz/play/{quiz.id}/"
     return response
 
+def _read_quiz_form(data):
+    """Normalizes the setup form into generation parameters."""
+    # --- Handle Custom Language Logic ---
+    lang_select = data.get('language_select')
+    custom_lang = data.get('custom_language')
+    
+    # If custom_lang has text, USE IT. Else, use dropdown.
+    language = custom_lang.strip() if custom_lang and custom_lang.strip() else lang_select
+
+    return {
+        'topic': data.get('topic'),
+        'language': language,
+        'level': data.get('level', 'intermediate'),
+        'num_questions': int(data.get('num_questions', 5)),
+        'include_code': data.get('include_code') == 'on',
+    }
+
 
 # ==========================================
 # 2. CLASSIC EXAM PLAYER
@@ -84,82 +73,103 @@ def create_quiz(request):
 @login_required
 def quiz_player(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id, user=request.user)
-    
-    answered_ids = quiz.answers.values_list('question_id', flat=True)
-    current_question = quiz.questions.exclude(id__in=answered_ids).first()
+    state = PlayState(request.session, quiz)
+    current_question = state.current_question()
 
-    if not current_question:
+    if not current_question and not is_still_generating(quiz):
         return redirect('quiz_results', quiz_id=quiz.id)
 
-    total_qs = quiz.questions.count()
-    # Avoid division by zero
-    progress = (len(answered_ids) / total_qs * 100) if total_qs > 0 else 0
-
+    # total_questions is the expected count, even while questions stream in
     return render(request, 'quizzes/player.html', {
         'quiz': quiz,
         'current_question': current_question,
-        'progress': progress,
-        'is_last': (len(answered_ids) + 1 == total_qs)
+        'question_number': state.question_number,
+        'progress': state.progress,
+        'is_last': state.is_last,
+        'sse_progress': settings.AI_SSE_PROGRESS,
     })
 
 @login_required
 @require_http_methods(["POST"])
 def submit_answer(request, quiz_id, question_id):
     quiz = get_object_or_404(Quiz, id=quiz_id, user=request.user)
-    question = get_object_or_404(Question, id=question_id, quiz=quiz)
-    
+    state = PlayState(request.session, quiz)
+
+    if not state.is_pending(question_id):
+        # Double submit (or not part of this quiz): nothing to record
+        return _render_next_question(request, quiz, state)
+
     selected_option_id = request.POST.get('option')
     action = request.POST.get('action')
 
     if action == 'skip' or not selected_option_id:
-        UserAnswer.objects.create(quiz=quiz, question=question, selected_option=None, is_correct=False)
+        selected_option = None
     else:
-        selected_option = get_object_or_404(Option, id=selected_option_id, question=question)
-        is_correct = selected_option.is_correct
-        UserAnswer.objects.create(
-            quiz=quiz, question=question, selected_option=selected_option, is_correct=is_correct
-        )
-        if is_correct:
-            quiz.score += (100 / quiz.total_questions)
-            quiz.save()
-
-    # Get next question
-    answered_ids = quiz.answers.values_list('question_id', flat=True)
-    next_q = quiz.questions.exclude(id__in=answered_ids).first()
+        selected_option = get_object_or_404(Option, id=selected_option_id, question_id=question_id)
+
+    if record_answer(quiz, question_id, selected_option):
+        state.advance(question_id)
+    else:
+        # Answered concurrently (e.g. from another tab): resync with the database
+        state.rebuild()
+
+    return _render_next_question(request, quiz, state)
+
+@login_required
+def next_question(request, quiz_id):
+    """HTMX poll target used when the player outpaces streaming generation."""
+    quiz = Quiz.objects.filter(id=quiz_id, user=request.user).first()
+    if quiz is None:
+        # Deleted when its generation produced nothing
+        return render(request, 'quizzes/partials/generation_failed.html')
+    return _render_next_question(request, quiz, PlayState(request.session, quiz))
+
+def _render_next_question(request, quiz, state):
+    """Next unanswered question card, a polling placeholder, or a redirect to results."""
+    next_q = state.current_question()
 
     if not next_q:
+        if is_still_generating(quiz):
+            return render(request, 'quizzes/partials/question_pending.html', {
+                'quiz': quiz, 'sse_progress': settings.AI_SSE_PROGRESS,
+            })
+
         response = HttpResponse()
         response['HX-Redirect'] = f"/quiz/results/{quiz.id}/"
         return response
 
-    return render(request, 'quizzes/partials/question_card.html', {
+    return render(request, 'quizzes/partials/question_card.html', _question_card_context(quiz, state, next_q))
+
+def _question_card_context(quiz, state, question):
+    return {
         'quiz': quiz,
-        'question': next_q,
-        'progress': (len(answered_ids) / quiz.questions.count()) * 100,
-        'is_last': (len(answered_ids) + 1 == quiz.questions.count())
-    })
+        'question': question,
+        'question_number': state.question_number,
+        'progress': state.progress,
+        'is_last': state.is_last,
+    }
 
 @login_required
 def quiz_results(request, quiz_id):
     """Renders the results page."""
     quiz = get_object_or_404(Quiz, id=quiz_id, user=request.user)
-    user_answers = UserAnswer.objects.filter(quiz=quiz).select_related('question', 'selected_option')
-    
-    correct_count = user_answers.filter(is_correct=True).count()
-    skipped_count = user_answers.filter(selected_option__isnull=True).count()
-    wrong_count = quiz.total_questions - correct_count - skipped_count
+    user_answers = list(answers_with_correct_option(quiz))
+
+    # Unanswered questions count as wrong
+    wrong_count = quiz.total_questions - quiz.correct_count - quiz.skipped_count
     
-    # Check if any explanations generated yet
-    has_explanations = user_answers.exclude(error_explanation='').exists()
+    # Mistakes other users already had explained show up straight away (explain-all saves them)
+    _, unexplained = apply_cached_explanations(user_answers, save=False)
 
     return render(request, 'quizzes/results.html', {
         'quiz': quiz,
         'user_answers': user_answers,
         'score_percent': int(quiz.score),
-        'correct': correct_count,
-        'skipped': skipped_count,
+        'correct': quiz.correct_count,
+        'skipped': quiz.skipped_count,
         'wrong': wrong_count,
-        'has_explanations': has_explanations
+        'needs_explanations': bool(unexplained),
+        'sse_progress': settings.AI_SSE_PROGRESS,
     })
 
 @login_required
@@ -167,35 +177,186 @@ def generate_all_explanations(request, quiz_id):
     """
     HTMX View: 
     1. Finds ALL wrong/skipped answers.
-    2. Generates AI text for them in a batch (loop).
+    2. Generates AI text for them in ONE batched call.
     3. Re-renders the answer list part of the page with explanations included.
+    With AI_SSE_PROGRESS the page instead opens explanation_events, and
+    with AI_BACKGROUND_JOBS a worker does 1-2 while the page polls the job.
     """
     quiz = get_object_or_404(Quiz, id=quiz_id, user=request.user)
-    
-    # Filter for wrong or skipped answers that don't have an explanation yet
-    # (is_correct=False covers both Wrong and Skipped)
-    answers_needing_help = UserAnswer.objects.filter(
-        quiz=quiz, 
-        is_correct=False, 
-        error_explanation=''
-    ).select_related('question', 'selected_option')
-    
-    generator = QuizGenerator()
-    
-    for ans in answers_needing_help:
-        correct_opt = ans.question.options.filter(is_correct=True).first()
-        user_text = ans.selected_option.text if ans.selected_option else "Skipped"
-        
-        explanation = generator.generate_explanation(
-            question_text=ans.question.text,
-            user_answer=user_text,
-            correct_answer=correct_opt.text
-        )
-        ans.error_explanation = explanation
-        ans.save()
-    
-    # Re-fetch all answers to render the list again
-    user_answers = UserAnswer.objects.filter(quiz=quiz).select_related('question', 'selected_option')
-    
+
+    if settings.AI_SSE_PROGRESS:
+        return render(request, 'quizzes/partials/explain_stream.html', {'quiz': quiz})
+    if settings.AI_BACKGROUND_JOBS:
+        if UserAnswer.objects.filter(quiz=quiz, is_correct=False, error_explanation='').exists():
+            job = enqueue_explanations(quiz, request.user)
+            return render(request, 'jobs/partials/job_status.html', {'job': job})
+        return _render_results_list(request, quiz)
+
+    # Explained in place, so the list renders without re-fetching
+    user_answers = list(answers_with_correct_option(quiz))
+    explain_mistakes(quiz, QuizGenerator(interactive=True), answers=user_answers)
+    return render(request, 'quizzes/partials/results_list.html', {'user_answers': user_answers})
+
+@login_required
+def quiz_results_list(request, quiz_id):
+    """The answer list alone; where a finished explanation job's status poll lands."""
+    return _render_results_list(request, get_object_or_404(Quiz, id=quiz_id, user=request.user))
+
+def _render_results_list(request, quiz):
     # We render a partial template that just contains the list loop
-    return render(request, 'quizzes/partials/results_list.html', {'user_answers': user_answers})
\ No newline at end of file
+    user_answers = answers_with_correct_option(quiz)
+    return render(request, 'quizzes/partials/results_list.html', {'user_answers': user_answers})
+
+
+
+# ==========================================
+# 3. ASYNC VARIANTS (ASGI, see AI_ASYNC_VIEWS)
+# ==========================================
+
+@login_required
+@require_http_methods(["POST"])
+async def create_quiz_async(request):
+    """create_quiz for uvicorn: Gemini waits happen on the event loop, not a worker thread."""
+    request_started = time.monotonic()
+    order = QuizOrder(await request.auser(), **_read_quiz_form(request.POST))
+    # The model router may read the AIModel table
+    generator = await sync_to_async(QuizGenerator)(interactive=True)
+
+    await sync_to_async(order.plan)(generator)
+    generated = await generator.agenerate_quiz(**order.generation) if order.generates_now else []
+    quiz = await sync_to_async(order.save)(generated)
+
+    if quiz is None or (order.streaming and not await order.astream(quiz, generator, started=request_started)):
+        return render(request, 'components/error_alert.html', {
+            'message': "AI failed to generate. Try again."
+        })
+
+    response = HttpResponse()
+    response['HX-Redirect'] = f"/quiz/play/{quiz.id}/"
+    return response
+
+@login_required
+async def generate_all_explanations_async(request, quiz_id):
+    """generate_all_explanations for uvicorn, using the async ORM and Gemini client."""
+    user = await request.auser()
+    quiz = await aget_object_or_404(Quiz, id=quiz_id, user=user)
+
+    if settings.AI_SSE_PROGRESS:
+        return render(request, 'quizzes/partials/explain_stream.html', {'quiz': quiz})
+
+    answers_needing_help = [
+        ans async for ans in answers_with_correct_option(quiz).filter(is_correct=False, error_explanation='')
+    ]
+
+    _, remaining = await sync_to_async(apply_cached_explanations)(answers_needing_help)
+
+    if remaining and settings.AI_BACKGROUND_JOBS:
+        job = await sync_to_async(enqueue_explanations)(quiz, user)
+        return render(request, 'jobs/partials/job_status.html', {'job': job})
+
+    if remaining:
+        generator = await sync_to_async(QuizGenerator)(interactive=True)
+        explanations = await generator.agenerate_explanations(describe_mistakes(remaining))
+        await sync_to_async(save_explanations)(remaining, explanations)
+
+    user_answers = [ans async for ans in answers_with_correct_option(quiz)]
+    return render(request, 'quizzes/partials/results_list.html', {'user_answers': user_answers})
+
+
+# ==========================================
+# 4. PROGRESS EVENTS (SSE, see AI_SSE_PROGRESS)
+# ==========================================
+
+@login_required
+async def quiz_events(request, quiz_id):
+    """
+    Event stream for a player waiting on generation: "question k/n ready"
+    progress, then the next question card as soon as it is saved. Polls
+    the database on the event loop, so a waiting player holds no thread.
+    """
+    user = await request.auser()
+    quiz = await aget_object_or_404(Quiz, id=quiz_id, user=user)
+    return EventStreamResponse(_quiz_progress(request, quiz))
+
+async def _quiz_progress(request, quiz):
+    config = sse_config()
+    deadline = time.monotonic() + config['MAX_SECONDS']
+    # The parsed request (chat intent or setup form) comes first
+    yield sse_event('progress', f"Generating {quiz.total_questions} {quiz.difficulty} questions on {quiz.topic_description}")
+
+    rows = Quiz.objects.filter(pk=quiz.pk).annotate(saved=Count('questions'))
+    saved = None
+    while time.monotonic() < deadline:
+        row = await rows.values('is_generating', 'total_questions', 'saved').afirst()
+        if row is None:
+            # Generation produced nothing and deleted the quiz
+            yield sse_event('question', render_to_string('quizzes/partials/generation_failed.html'))
+            return
+        if row['saved'] != saved:
+            saved = row['saved']
+            yield sse_event('progress', f"Question {saved}/{row['total_questions']} ready")
+            card = await sync_to_async(_next_question_card)(request, quiz)
+            if card:
+                yield sse_event('question', card)
+                return
+        if not row['is_generating']:
+            break
+        await asyncio.sleep(config['POLL_SECONDS'])
+
+    # Generation ended without another question: a one-off poll takes the player to the results
+    yield sse_event('question', render_to_string('quizzes/partials/question_pending.html', {'quiz': quiz}))
+
+def _next_question_card(request, quiz):
+    # The session isn't saved from a stream: submit_answer resyncs the play state if needed
+    state = PlayState(request.session, quiz)
+    question = state.current_question()
+    if question is None:
+        return None
+    return render_to_string(
+        'quizzes/partials/question_card.html', _question_card_context(quiz, state, question), request=request,
+    )
+
+@login_required
+async def explanation_events(request, quiz_id):
+    """
+    Event stream that explains the quiz's remaining mistakes in small
+    concurrent batches, pushing each explanation into the results page
+    (out-of-band swap) with "explanation k/n ready" progress.
+    """
+    user = await request.auser()
+    quiz = await aget_object_or_404(Quiz, id=quiz_id, user=user)
+    return EventStreamResponse(_explanation_progress(quiz))
+
+async def _explanation_progress(quiz):
+    answers = [
+        ans async for ans in answers_with_correct_option(quiz).filter(is_correct=False, error_explanation='')
+    ]
+    total = len(answers)
+    done = 0
+    if answers:
+        yield sse_event('progress', f"Explaining {total} mistake{'s' if total != 1 else ''}...")
+        served, remaining = await sync_to_async(apply_cached_explanations)(answers)
+        for ans in served:
+            done += 1
+            yield _explanation_event(ans)
+        if served:
+            yield sse_event('progress', f"Explanation {done}/{total} ready")
+
+        if remaining:
+            generator = await sync_to_async(QuizGenerator)(interactive=True)
+            batches = generator.aiter_explanations(
+                describe_mistakes(remaining), batch_size=sse_config()['EXPLANATION_BATCH_SIZE'],
+            )
+            async for explanations in batches:
+                explained = await sync_to_async(save_explanations)(remaining, explanations)
+                for ans in explained:
+                    done += 1
+                    yield _explanation_event(ans)
+                    yield sse_event('progress', f"Explanation {done}/{total} ready")
+
+    yield sse_event('done', render_to_string('quizzes/partials/explain_done.html', {'missing': total - done}))
+
+def _explanation_event(ans):
+    return sse_event('explanation', render_to_string(
+        'quizzes/partials/answer_explanation.html', {'ans': ans, 'oob': True},
+    ))
@@ -1,3 +1,54 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+
+from apps.quizzes.models import Quiz
+
+SAME_TIME = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@mock.patch('apps.users.views.HISTORY_PAGE_SIZE', 2)
+class DashboardHistoryTests(TestCase):
+    def setUp(self):
+        users = get_user_model().objects
+        self.user = users.create_user(username='player', email='player@example.com')
+        other = users.create_user(username='other', email='other@example.com')
+        # Interleaved with another user's quizzes, all created in the same instant
+        self.mine = []
+        for _ in range(5):
+            self.mine.append(self.quiz(self.user).pk)
+            self.quiz(other)
+        Quiz.objects.update(created_at=SAME_TIME)
+        self.mine.reverse()
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def quiz(user):
+        return Quiz.objects.create(user=user, language='Python', topic_description='Loops', difficulty='beginner')
+
+    def page(self, cursor=None):
+        params = {'cursor': cursor} if cursor is not None else {}
+        response = self.client.get(reverse('dashboard_history'), params)
+        self.assertEqual(response.status_code, 200)
+        return [quiz.pk for quiz in response.context['quizzes']], response.context['next_cursor']
+
+    def test_pages_break_ties_on_id(self):
+        seen, cursor = self.page()
+        while cursor:
+            ids, cursor = self.page(cursor)
+            seen += ids
+        self.assertEqual(seen, self.mine)
+
+    def test_dashboard_shows_the_first_page(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual([quiz.pk for quiz in response.context['quizzes']], self.mine[:2])
+        self.assertEqual(response.context['total_quizzes'], 5)
 
-# Create your tests here.
+    def test_invalid_cursor_returns_the_first_page(self):
+        first = self.page()
+        for cursor in ('', 'garbage', f"{SAME_TIME.isoformat()}_x", f"yesterday_{self.mine[0]}", f"{SAME_TIME.isoformat()}_{10 ** 30}"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.page(cursor), first)
@@ -7,5 +7,6 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     
     path('dashboard/', views.user_dashboard, name='dashboard'),
+    path('dashboard/history/', views.dashboard_history, name='dashboard_history'),
     path('settings/', views.account_settings, name='account_settings'),
 ]
\ No newline at end of file
@@ -1,12 +1,19 @@
+from datetime import datetime
+
 from django.shortcuts import render, redirect, get_object_or_404, HttpResponse
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib import messages
-from django.db.models import Avg
+from django.db.models import Avg, Count, Q
 from .forms import SignUpForm, LoginForm, UserUpdateForm 
 from apps.quizzes.models import Quiz
 
+# Dashboard history: cards per infinite-scroll page, and the only columns a card renders
+HISTORY_PAGE_SIZE = 24
+TOPIC_STATS_SHOWN = 6
+HISTORY_CARD_FIELDS = ('id', 'topic_description', 'created_at', 'difficulty', 'score', 'correct_count', 'total_questions')
+
 def signup_view(request):
     if request.user.is_authenticated:
         return redirect('home')
@@ -48,19 +55,63 @@ def user_dashboard(request):
     """
     Shows quiz history and statistics.
     """
-    user_quizzes = Quiz.objects.filter(user=request.user).order_by('-created_at')
-    
-    # Calculate Stats
-    total_quizzes = user_quizzes.count()
-    avg_score = user_quizzes.aggregate(Avg('score'))['score__avg'] or 0
-    
+    # One aggregate for both stats
+    stats = Quiz.objects.filter(user=request.user).aggregate(total=Count('id'), avg_score=Avg('score'))
+    quizzes, next_cursor = _history_page(request.user)
+
+    # Precomputed per language/difficulty rollups, most recently practised first
+    topic_stats = request.user.topic_stats.order_by('-last_seen')[:TOPIC_STATS_SHOWN]
+
     context = {
-        'quizzes': user_quizzes,
-        'total_quizzes': total_quizzes,
-        'avg_score': round(avg_score, 1)
+        'quizzes': quizzes,
+        'next_cursor': next_cursor,
+        'topic_stats': topic_stats,
+        'total_quizzes': stats['total'],
+        'avg_score': round(stats['avg_score'] or 0, 1)
     }
     return render(request, 'users/dashboard.html', context)
 
+@login_required
+def dashboard_history(request):
+    """HTMX infinite scroll: the next page of quiz history cards."""
+    quizzes, next_cursor = _history_page(request.user, request.GET.get('cursor'))
+    return render(request, 'users/partials/quiz_history_page.html', {
+        'quizzes': quizzes,
+        'next_cursor': next_cursor,
+    })
+
+def _history_page(user, cursor=None):
+    """
+    One page of a user's quizzes, newest first, keyset-paginated on
+    (created_at, id) so deep pages cost the same as the first one.
+    Returns (quizzes, cursor for the next page or None).
+    """
+    quizzes = (
+        Quiz.objects.filter(user=user)
+        .only(*HISTORY_CARD_FIELDS)
+        .order_by('-created_at', '-id')
+    )
+
+    position = _parse_cursor(cursor)
+    if position:
+        created_at, quiz_id = position
+        quizzes = quizzes.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=quiz_id))
+
+    # One extra row tells us whether there is another page
+    page = list(quizzes[:HISTORY_PAGE_SIZE + 1])
+    if len(page) <= HISTORY_PAGE_SIZE:
+        return page, None
+
+    page = page[:HISTORY_PAGE_SIZE]
+    last = page[-1]
+    return page, f"{last.created_at.isoformat()}_{last.id}"
+
+def _parse_cursor(cursor):
+    try:
+        created_at, quiz_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(quiz_id)
+    except (AttributeError, ValueError):
+        return None
 
 
 @login_required
@@ -14,6 +14,29 @@ load_dotenv(os.path.join(BASE_DIR.parent, '.env'))
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# 'gemini' for the real API, 'stub' for canned offline responses (load tests),
+# 'record' to call Gemini and save every response, 'replay' to serve the saved responses offline
+AI_BACKEND = os.getenv("AI_BACKEND", "gemini")
+AI_STUB_LATENCY = float(os.getenv("AI_STUB_LATENCY", "1.0"))  # Seconds per stubbed call
+
+AI_REPLAY = {
+    'DIR': os.getenv("AI_REPLAY_DIR", "ai_recordings"),  # Relative to BASE_DIR
+    'VARIANTS': 3,           # Responses kept per prompt; replays pick one at random
+    'LATENCY': None,         # Fixed seconds per call; None replays each recorded latency...
+    'LATENCY_SCALE': float(os.getenv("AI_REPLAY_LATENCY_SCALE", "1.0")),  # ...scaled by this
+    'ON_MISS': 'stub',       # Unrecorded prompt: 'stub' (canned answer) or 'error'
+}
+
+# Offline backends only ('stub', 'replay'): share of calls that fail, or run SLOW_SECONDS longer
+AI_FAULT_INJECTION = {
+    'ERROR_RATE': float(os.getenv("AI_ERROR_RATE", "0")),
+    'SLOW_RATE': float(os.getenv("AI_SLOW_RATE", "0")),
+    'SLOW_SECONDS': 10.0,
+}
+
+# Route AI endpoints to their async views (run under uvicorn: config.asgi)
+AI_ASYNC_VIEWS = os.getenv("AI_ASYNC_VIEWS", "false").lower() == "true"
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-fallback-key-change-me')
 
@@ -34,9 +57,11 @@ INSTALLED_APPS = [
     'apps.users',
     'apps.quizzes',
     'apps.ai_agent',
+    'apps.jobs',
 ]
 
 MIDDLEWARE = [
+    'apps.core.middleware.RequestMetricsMiddleware',  # First, so its timings cover everything below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,7 +75,8 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing renders for RequestMetricsMiddleware
+        'BACKEND': 'apps.core.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -98,10 +124,201 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# --- CACHING ---
+# 'ai' is shared by every worker (create the table with `manage.py createcachetable`)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ai': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'ai_cache',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# --- AI GENERATION CACHE ---
+AI_QUIZ_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'ai',
+    'VARIANTS': 3,            # Distinct generations pooled per key before serving cached ones
+    'TTL': 60 * 60 * 6,       # Freshness of the shared pool (seconds)
+    'LOCAL_MAX_ENTRIES': 256, # In-process LRU tier
+    'LOCAL_TTL': 300,
+}
+
+# Chat intents like "hard python decorators, 7 questions" are parsed locally;
+# only messages scoring below MIN_CONFIDENCE are sent to Gemini.
+AI_LOCAL_INTENT = {
+    'ENABLED': True,
+    'MIN_CONFIDENCE': 0.75,
+    'SHARED_STATS': True,     # Sum local/Gemini parse counters over all workers
+}
+
+# Gemini intent parses memoized on the normalized message (case, punctuation, spacing ignored).
+# Set ALIAS to None to keep the memo per process.
+AI_INTENT_MEMO = {
+    'ENABLED': True,
+    'ALIAS': 'ai',
+    'TTL': 60 * 60 * 24,
+    'LOCAL_MAX_ENTRIES': 1024,
+    'LOCAL_TTL': 600,
+}
+
+# Mistake explanations shared across users, keyed on (question, chosen option).
+# Stored in the MistakeExplanation table; this is the in-process LRU in front of it.
+AI_EXPLANATION_CACHE = {
+    'ENABLED': True,
+    'LOCAL_MAX_ENTRIES': 2048,
+    'LOCAL_TTL': 60 * 60,
+}
+
 # Custom User Model (We will create this next!)
 AUTH_USER_MODEL = 'users.User'
 
 # --- AUTHENTICATION REDIRECTS ---
 LOGIN_URL = 'login'           # Redirect here if user isn't logged in
 LOGIN_REDIRECT_URL = 'home'   # Redirect here after successful login
-LOGOUT_REDIRECT_URL = 'login' # Redirect here after logout
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'login' # Redirect here after logout
+
+# --- STREAMING GENERATION ---
+# Redirect to the player as soon as the first question is parsed
+AI_STREAMING_GENERATION = True
+AI_FIRST_QUESTION_TIMEOUT = 30   # Seconds create_quiz waits for question 1
+AI_GENERATION_TIMEOUT = 180      # After this a quiz is no longer treated as generating
+
+# --- BACKGROUND JOBS ---
+# Queue quiz and explanation generation in the jobs table instead of running it in the request;
+# `manage.py run_workers` runs them (PROCESSES x THREADS claim loops, no broker needed).
+AI_BACKGROUND_JOBS = os.getenv("AI_BACKGROUND_JOBS", "false").lower() == "true"
+JOBS = {
+    'LEASE_SECONDS': 300,      # A running job is retried after this if its worker dies
+    'MAX_ATTEMPTS': 3,
+    'RETRY_BACKOFF': 5,        # Seconds before the first retry; doubles each attempt
+    'POLL_SECONDS': 1.0,       # Idle workers check for new jobs this often
+    'PROCESSES': 1,
+    'THREADS': 4,
+    'RETENTION_HOURS': 24,     # Finished jobs are then purged
+}
+
+# --- PROGRESS EVENTS (SSE) ---
+# Waiting players and "Explain All" get Server-Sent Events (progress plus rendered partials) instead of
+# polling or one long request. Serve with uvicorn (config.asgi) so an open stream holds no worker thread.
+AI_SSE_PROGRESS = os.getenv("AI_SSE_PROGRESS", "false").lower() == "true"
+SSE = {
+    'POLL_SECONDS': 0.5,            # How often a stream checks for new questions
+    'HEARTBEAT_SECONDS': 15,        # Keepalive comment when nothing else was sent
+    'MAX_SECONDS': AI_GENERATION_TIMEOUT,
+    'EXPLANATION_BATCH_SIZE': 3,    # Smaller than AI_EXPLANATION_BATCH_SIZE, so the first ones land sooner
+}
+
+# --- AI EXECUTION ---
+AI_EXECUTOR = {
+    'MAX_WORKERS': 8,   # Concurrent Gemini calls per process
+    'TIMEOUT': 60,      # Seconds to wait for a rate-limit slot or a fanned-out call
+    'INTERACTIVE_TIMEOUT': 2,  # ...for a slot while a user waits (then fall back to cache/bank)
+}
+
+# Per-process limits (divide the account quota by the number of workers)
+AI_RATE_LIMITS = {
+    'default': {'RPM': 15, 'TPM': 250000},
+    'gemini-flash-lite-latest': {'RPM': 30, 'TPM': 1000000},
+}
+
+AI_EXPLANATION_BATCH_SIZE = 10  # Mistakes explained per Gemini call
+
+# --- MODEL ROUTING ---
+# Models come from active AIModel rows (default first); this is the fallback when there are none.
+# Health is tracked per process over a rolling window; unhealthy models are only used to fail over.
+AI_MODEL_ROUTER = {
+    'DEFAULT_MODEL': 'gemini-flash-lite-latest',
+    'MODEL_LIST_TTL': 60,    # Seconds the active model list is cached in-process
+    'WINDOW': 50,            # Calls kept per model...
+    'WINDOW_SECONDS': 300,   # ...for at most this long
+    'MIN_SAMPLES': 5,        # Calls needed before health affects routing
+    'MAX_ERROR_RATE': 0.5,
+    'SLOW_P95': 20.0,        # Seconds
+}
+
+# --- RESILIENCE ---
+# Per-process circuit breaker for each model: trips when errors or slow calls reach FAILURE_RATE
+# of the recent calls, fails fast while open, then lets a probe through. Transitions are counted
+# in the METRICS_ALIAS cache (see `manage.py ai_breaker_status`).
+AI_CIRCUIT_BREAKER = {
+    'FAILURE_RATE': 0.5,
+    'MIN_CALLS': 5,            # Calls in the window before the breaker can trip
+    'WINDOW': 20,              # Recent calls considered
+    'SLOW_CALL_SECONDS': 30.0, # Slower successes count as failures
+    'OPEN_SECONDS': 30,        # Fail fast this long before probing
+    'HALF_OPEN_CALLS': 1,      # Concurrent probes allowed
+    'METRICS_ALIAS': 'ai',
+}
+
+# Retries use full-jitter exponential backoff; the budget caps them at BUDGET_RATIO of recent
+# requests (plus BUDGET_MIN_PER_SECOND) so retries can't multiply load during an outage.
+AI_RETRY = {
+    'MAX_ATTEMPTS': 3,         # Model calls per request, failovers included
+    'BASE_DELAY': 0.5,
+    'MAX_DELAY': 5.0,
+    'BUDGET_RATIO': 0.2,
+    'BUDGET_MIN_PER_SECOND': 1.0,
+    'BUDGET_WINDOW': 10,       # Seconds
+}
+
+# --- STARTUP BUDGET ---
+# Checked by `manage.py benchmark_startup` (a cold `manage.py check`, roughly a worker booting).
+# The Gemini SDK is imported on first use; keep it (and grpc) out of startup.
+STARTUP_BUDGET = {
+    'IMPORT_MS': 800,
+    'RSS_MB': 80,
+    'FORBIDDEN_MODULES': ('google.generativeai', 'grpc'),
+}
+
+# --- PERFORMANCE BUDGET ---
+# Per view (URL name), checked by `manage.py benchmark_quiz_lifecycle` against the offline AI backend.
+# Query counts are deterministic and should not grow with quiz length; latencies leave room for slow CI.
+PERF_BUDGET = {
+    'create_quiz': {'P95_MS': 150, 'QUERIES': 14},
+    'quiz_player': {'P95_MS': 100, 'QUERIES': 12},
+    'submit_answer': {'P95_MS': 100, 'QUERIES': 18},
+    'quiz_results': {'P95_MS': 100, 'QUERIES': 7},
+    'generate_all_explanations': {'P95_MS': 150, 'QUERIES': 9},
+    'dashboard': {'P95_MS': 100, 'QUERIES': 6},
+    'dashboard_history': {'P95_MS': 100, 'QUERIES': 4},
+}
+
+# --- REQUEST METRICS ---
+# RequestMetricsMiddleware: per-request queries, DB time, AI calls and template time as a
+# Server-Timing header and one JSON log line; per-view histograms are flushed with the METRICS
+# below (see `manage.py request_metrics`).
+REQUEST_METRICS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    'LOG': os.getenv("REQUEST_METRICS_LOG", "true").lower() == "true",
+}
+
+# --- METRICS ---
+# Prometheus text format at /metrics: Gemini calls, latency and tokens, quiz/answer counters and
+# DB connection gauges. A background thread in each worker adds its counters to the MetricTotal
+# table every FLUSH_SECONDS, so the endpoint sums all workers; gauges are published per worker
+# in ALIAS and expire after GAUGE_TTL. Scrape with
+# `Authorization: Bearer $METRICS_TOKEN` (staff sessions also work).
+METRICS = {
+    'ENABLED': True,
+    'ALIAS': 'ai',
+    'FLUSH_SECONDS': 30,
+    'GAUGE_TTL': 120,
+    'TOKEN': os.getenv("METRICS_TOKEN"),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'apps.core.middleware': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -0,0 +1,26 @@
+from .local import *
+
+# Offline load-testing profile: stubbed Gemini, isolated database.
+# Usage: DJANGO_SETTINGS_MODULE=config.settings.benchmark python manage.py benchmark_ai_servers
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'benchmark.sqlite3',
+        'OPTIONS': {'timeout': 30},  # Several server processes write concurrently
+    }
+}
+
+AI_BACKEND = 'stub'
+
+# Every request should reach the (stubbed) model
+AI_QUIZ_CACHE = {**AI_QUIZ_CACHE, 'ENABLED': False}
+AI_STREAMING_GENERATION = False
+
+# The stub has no quota
+AI_RATE_LIMITS = {'default': {'RPM': None, 'TPM': None}}
+
+# One log line per request would drown the benchmark reports
+REQUEST_METRICS = {**REQUEST_METRICS, 'LOG': False}
@@ -10,6 +10,7 @@ urlpatterns = [
     path('quiz/', include('apps.quizzes.urls')),
     path('auth/', include('apps.users.urls')),
     path('agent/', include('apps.ai_agent.urls')),
+    path('jobs/', include('apps.jobs.urls')),
 ]
 
 if settings.DEBUG: